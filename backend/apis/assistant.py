@@ -1,7 +1,8 @@
-from flask import Blueprint, request, jsonify
+import json
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from utils.logging_config import app_logger
 from core.dependencies import get_db_session_sync
-from services.assistant_service import AssistantService
+from services.assistant_service import AssistantService, get_assistant_runtime
 from schemas.requests import AssistantQueryRequest
 from schemas.responses import AssistantHealthResponse
 
@@ -9,9 +10,9 @@ from schemas.responses import AssistantHealthResponse
 assistant_bp = Blueprint('assistant', __name__, url_prefix='/api/assistant')
 
 def get_assistant_service():
-    """获取助手服务实例"""
+    """获取助手服务实例（复用进程级助手运行时，每个请求使用新的数据库会话）"""
     session = get_db_session_sync()
-    return AssistantService(session)
+    return AssistantService(session, runtime=get_assistant_runtime())
 
 def get_assistant():
     """获取助手实例（用于测试兼容性）"""
@@ -25,8 +26,11 @@ def query_with_sources(query: str) -> dict:
     """查询助手并返回结果（用于测试兼容性）"""
     try:
         assistant_service = get_assistant_service()
-        query_request = AssistantQueryRequest(query=query)
-        result = assistant_service.process_query(query_request)
+        try:
+            query_request = AssistantQueryRequest(query=query)
+            result = assistant_service.process_query(query_request)
+        finally:
+            assistant_service.close()
         return result.dict()
     except Exception as e:
         app_logger.error(f"Error in query_with_sources: {str(e)}")
@@ -49,7 +53,10 @@ def query_assistant():
         
         # 获取助手服务并处理查询
         assistant_service = get_assistant_service()
-        result = assistant_service.process_query(query_request)
+        try:
+            result = assistant_service.process_query(query_request)
+        finally:
+            assistant_service.close()
         
         # 返回结果
         return jsonify(result.dict())
@@ -58,13 +65,54 @@ def query_assistant():
         app_logger.error(f"POST /api/assistant/query - Error processing query: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+def format_sse_event(event: str, data: dict) -> str:
+    """将事件格式化为Server-Sent Events文本"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@assistant_bp.route('/query/stream', methods=['POST'])
+def query_assistant_stream():
+    """以Server-Sent Events流式返回查询结果：先返回来源，再逐段返回生成内容"""
+    try:
+        data = request.get_json()
+        if not data or 'query' not in data:
+            return jsonify({"error": "Missing required field: query"}), 400
+        
+        query = data['query']
+        app_logger.info(f"POST /api/assistant/query/stream - Query received: {query}")
+        
+        query_request = AssistantQueryRequest(query=query)
+        assistant_service = get_assistant_service()
+        
+        def generate():
+            try:
+                for event in assistant_service.stream_query(query_request):
+                    yield format_sse_event(event["event"], event["data"])
+            finally:
+                assistant_service.close()
+        
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'
+            }
+        )
+    
+    except Exception as e:
+        app_logger.error(f"POST /api/assistant/query/stream - Error processing query: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @assistant_bp.route('/health', methods=['GET'])
 def health_check():
     """健康检查端点"""
     try:
         # 获取助手服务并检查健康状态
         assistant_service = get_assistant_service()
-        health_response = assistant_service.health_check()
+        try:
+            health_response = assistant_service.health_check()
+        finally:
+            assistant_service.close()
         
         if health_response.status == "healthy":
             return jsonify(health_response.dict())
@@ -75,4 +123,18 @@ def health_check():
         return jsonify({
             "status": "unhealthy",
             "error": str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+@assistant_bp.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """获取答案缓存命中统计"""
+    try:
+        assistant_service = get_assistant_service()
+        try:
+            stats = assistant_service.get_cache_stats()
+        finally:
+            assistant_service.close()
+        return jsonify(stats)
+    except Exception as e:
+        app_logger.error(f"GET /api/assistant/cache/stats - Error getting cache stats: {str(e)}")
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,18 @@
+from flask import Blueprint, jsonify
+from core.service_registry import service_registry
+from services.assistant_service import get_assistant_runtime
+
+# 创建健康检查蓝图
+health_bp = Blueprint('health', __name__, url_prefix='/health')
+
+@health_bp.route('/live', methods=['GET'])
+def liveness():
+    """存活探针：进程能够处理请求即返回200，不等待模型加载"""
+    return jsonify({"status": "alive"})
+
+@health_bp.route('/ready', methods=['GET'])
+def readiness():
+    """就绪探针：所有需要预热的服务（模型、向量库）加载完成后返回200，否则返回503"""
+    status = service_registry.get_status()
+    status["assistant_runtime_ready"] = get_assistant_runtime().is_ready()
+    return jsonify(status), 200 if status["ready"] else 503
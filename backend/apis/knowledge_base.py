@@ -0,0 +1,160 @@
+from flask import Blueprint, jsonify, request
+from flask_cors import cross_origin
+from utils.logging_config import app_logger
+from config.settings import settings
+from services.knowledge_base.reindex_service import reindex_service
+from services.knowledge_base.search_filter import SearchFilter
+from services.knowledge_base.shard_index import ReadOnlyIndexError
+from services.knowledge_base.vector_store_service import vector_store_service
+
+# 创建知识库管理API蓝图
+knowledge_base_bp = Blueprint('knowledge_base', __name__, url_prefix='/api/knowledge_base')
+
+def _optional_int(data, key):
+    """读取可选的整数参数，未提供时返回None（交由检索服务取默认值），格式错误抛出ValueError"""
+    value = data.get(key)
+    return None if value is None else int(value)
+
+@knowledge_base_bp.route('/reindex', methods=['POST'])
+@cross_origin()
+def start_reindex():
+    """从文档表全量重建知识库索引（后台执行，完成后原子切换，期间检索不中断）"""
+    try:
+        data = request.get_json(silent=True) or {}
+        status = reindex_service.start(
+            model_name=data.get('model_name'),
+            page_size=data.get('page_size'),
+            workers=data.get('workers')
+        )
+        app_logger.info("Knowledge base re-index started via API")
+        return jsonify({
+            "success": True,
+            "message": "知识库重建已开始",
+            "data": status
+        }), 202
+    except (RuntimeError, ReadOnlyIndexError) as e:
+        # 已有重建任务在运行，或当前进程为只读进程
+        return jsonify({
+            "success": False,
+            "message": f"无法开始知识库重建: {str(e)}"
+        }), 409
+    except Exception as e:
+        app_logger.error(f"Error starting knowledge base re-index: {str(e)}")
+        return jsonify({
+            "success": False,
+            "message": f"开始知识库重建失败: {str(e)}"
+        }), 500
+
+@knowledge_base_bp.route('/reindex/status', methods=['GET'])
+@cross_origin()
+def get_reindex_status():
+    """获取知识库重建进度"""
+    try:
+        return jsonify({
+            "success": True,
+            "data": reindex_service.get_status()
+        })
+    except Exception as e:
+        app_logger.error(f"Error getting re-index status: {str(e)}")
+        return jsonify({
+            "success": False,
+            "message": f"获取知识库重建进度失败: {str(e)}"
+        }), 500
+
+@knowledge_base_bp.route('/stats', methods=['GET'])
+@cross_origin()
+def get_knowledge_base_stats():
+    """获取知识库指标（索引、嵌入、重排序，以及每次查询的重排序句对数）"""
+    try:
+        return jsonify({
+            "success": True,
+            "data": vector_store_service.get_stats()
+        })
+    except Exception as e:
+        app_logger.error(f"Error getting knowledge base stats: {str(e)}")
+        return jsonify({
+            "success": False,
+            "message": f"获取知识库指标失败: {str(e)}"
+        }), 500
+
+@knowledge_base_bp.route('/search', methods=['POST'])
+@cross_origin()
+def search_knowledge_base():
+    """检索知识库（mode: dense 向量检索、lexical 关键词BM25检索、hybrid 两者融合，默认取 SEARCH_MODE；nprobe/ef_search 调整ANN索引的召回与速度）"""
+    try:
+        data = request.get_json(silent=True) or {}
+        query = data.get('query')
+        if not query:
+            return jsonify({
+                "success": False,
+                "message": "缺少查询内容"
+            }), 400
+        results = vector_store_service.search(
+            query,
+            k=int(data.get('k', 3)),
+            rerank=bool(data.get('rerank', True)),
+            nprobe=_optional_int(data, 'nprobe'),
+            ef_search=_optional_int(data, 'ef_search'),
+            filters=SearchFilter.from_dict(data.get('filters')),
+            mode=data.get('mode')
+        )
+        return jsonify({
+            "success": True,
+            "data": results
+        })
+    except ValueError as e:
+        # 检索模式或过滤条件无效
+        return jsonify({
+            "success": False,
+            "message": f"检索参数无效: {str(e)}"
+        }), 400
+    except Exception as e:
+        app_logger.error(f"Error searching knowledge base: {str(e)}")
+        return jsonify({
+            "success": False,
+            "message": f"检索知识库失败: {str(e)}"
+        }), 500
+
+@knowledge_base_bp.route('/search/batch', methods=['POST'])
+@cross_origin()
+def search_knowledge_base_batch():
+    """批量检索知识库（一次请求多个查询，统一嵌入、检索与重排序，参数同单条检索）"""
+    try:
+        data = request.get_json(silent=True) or {}
+        queries = data.get('queries')
+        if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q for q in queries):
+            return jsonify({
+                "success": False,
+                "message": "queries 必须是非空的查询字符串列表"
+            }), 400
+        if len(queries) > settings.SEARCH_BATCH_MAX_QUERIES:
+            return jsonify({
+                "success": False,
+                "message": f"单次最多检索 {settings.SEARCH_BATCH_MAX_QUERIES} 个查询"
+            }), 400
+        results = vector_store_service.search_many(
+            queries,
+            k=int(data.get('k', 3)),
+            rerank=bool(data.get('rerank', True)),
+            nprobe=_optional_int(data, 'nprobe'),
+            ef_search=_optional_int(data, 'ef_search'),
+            filters=SearchFilter.from_dict(data.get('filters')),
+            mode=data.get('mode')
+        )
+        app_logger.info(f"Batch knowledge base search completed for {len(queries)} queries")
+        return jsonify({
+            "success": True,
+            "data": [{"query": query, "results": query_results} for query, query_results in zip(queries, results)]
+        })
+    except ValueError as e:
+        # 检索模式或过滤条件无效
+        return jsonify({
+            "success": False,
+            "message": f"检索参数无效: {str(e)}"
+        }), 400
+    except Exception as e:
+        app_logger.error(f"Error batch searching knowledge base: {str(e)}")
+        return jsonify({
+            "success": False,
+            "message": f"批量检索知识库失败: {str(e)}"
+        }), 500
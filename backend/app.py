@@ -1,3 +1,4 @@
+import threading
 from flask import Flask, jsonify
 from flask_cors import CORS
 from apis.source import source_bp
@@ -6,9 +7,13 @@ from apis.auth import auth_bp
 from apis.assistant import assistant_bp
 from apis.scheduler import scheduler_bp
 from apis.analytics import analytics_bp
+from apis.health import health_bp
+from apis.knowledge_base import knowledge_base_bp
 from utils.logging_config import app_logger
 from utils.init_sqlite import init_db
 from services.scheduler_service import scheduler_service
+from services.assistant_service import get_assistant_runtime
+from core.service_registry import service_registry
 from config.settings import settings
 
 def create_app():
@@ -42,6 +47,10 @@ def create_app():
     app.register_blueprint(scheduler_bp)
     # 注册分析API蓝图
     app.register_blueprint(analytics_bp)
+    # 注册健康检查蓝图（存活与就绪探针）
+    app.register_blueprint(health_bp)
+    # 注册知识库管理API蓝图（全量重建索引）
+    app.register_blueprint(knowledge_base_bp)
 
     @app.route('/')
     def hello_world():
@@ -59,6 +68,16 @@ if settings.AUTO_START_SCHEDULER:
 else:
     app_logger.info("RSS scheduler auto-start disabled")
 
+# 在后台线程中加载嵌入、重排序模型和向量库，应用无需等待模型加载即可开始监听
+if settings.SERVICE_WARMUP_ON_STARTUP:
+    app_logger.info("Loading models in background")
+    service_registry.start_warm_up()
+
+# 在后台线程中预热助手运行时（LLM客户端、工具和智能体），避免首个请求承担初始化开销
+if settings.ASSISTANT_WARMUP_ON_STARTUP:
+    app_logger.info("Warming up assistant runtime in background")
+    threading.Thread(target=lambda: get_assistant_runtime().warm_up(), daemon=True).start()
+
 
 if __name__ == '__main__':
     app_logger.info(f"Starting Flask app on {settings.APP_HOST}:{settings.APP_PORT} with debug={settings.APP_DEBUG}")
@@ -27,9 +27,142 @@ class Settings:
     # AI Models
     EMBEDDING_MODEL_NAME: str = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
     RERANK_MODEL_NAME: str = os.getenv("RERANK_MODEL_NAME", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    OLLAMA_MODEL_NAME: str = os.getenv("OLLAMA_MODEL_NAME", "qwen2.5:3b")
+    OLLAMA_BASE_URL: str = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+    OLLAMA_TIMEOUT: int = int(os.getenv("OLLAMA_TIMEOUT", "60"))
+    # Load embedding/rerank models and the vector store in a background thread at startup
+    # instead of on the first request that needs them
+    SERVICE_WARMUP_ON_STARTUP: bool = os.getenv("SERVICE_WARMUP_ON_STARTUP", "true").lower() == "true"
+    
+    # Assistant
+    ASSISTANT_WARMUP_ON_STARTUP: bool = os.getenv("ASSISTANT_WARMUP_ON_STARTUP", "true").lower() == "true"
+    ASSISTANT_PIPELINE_WORKERS: int = int(os.getenv("ASSISTANT_PIPELINE_WORKERS", "8"))
+    # Start the (paid) online search together with knowledge base retrieval instead of only after the
+    # knowledge base fails the relevance gate: lower fallback latency, but one search call per query
+    ASSISTANT_SPECULATIVE_ONLINE_SEARCH: bool = os.getenv("ASSISTANT_SPECULATIVE_ONLINE_SEARCH", "false").lower() == "true"
+    # Restrict knowledge base search to the publication window a query names ("this week", "最近3天")
+    ASSISTANT_TIME_WINDOW_FILTER: bool = os.getenv("ASSISTANT_TIME_WINDOW_FILTER", "true").lower() == "true"
+    
+    # Assistant answer cache
+    ANSWER_CACHE_ENABLED: bool = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.95"))
+    ANSWER_CACHE_TTL_SECONDS: int = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "600"))
+    ANSWER_CACHE_MAX_ENTRIES: int = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512"))
+    
+    # Embedding backend: "torch" (HuggingFace/PyTorch) or "onnx" (ONNX Runtime, falls back to torch)
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+    EMBEDDING_ONNX_DIR: str = os.getenv("EMBEDDING_ONNX_DIR", "./models_cache/onnx")
+    EMBEDDING_ONNX_QUANTIZE: bool = os.getenv("EMBEDDING_ONNX_QUANTIZE", "true").lower() == "true"
+    EMBEDDING_ONNX_PARITY_THRESHOLD: float = float(os.getenv("EMBEDDING_ONNX_PARITY_THRESHOLD", "0.99"))
+    
+    # Embedding micro-batching across concurrent callers
+    EMBEDDING_MICRO_BATCHING: bool = os.getenv("EMBEDDING_MICRO_BATCHING", "true").lower() == "true"
+    EMBEDDING_BATCH_MAX_SIZE: int = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "64"))
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))
+    
+    # Persistent embedding cache keyed by (model, sha256(text))
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_PATH: str = os.getenv("EMBEDDING_CACHE_PATH", "./data/embedding_cache.db")
+    EMBEDDING_CACHE_MAX_ENTRIES: int = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+    
+    # Platt scaling coefficients mapping cross-encoder logits to relevance probabilities
+    RERANK_CALIBRATION_A: float = float(os.getenv("RERANK_CALIBRATION_A", "1.0"))
+    RERANK_CALIBRATION_B: float = float(os.getenv("RERANK_CALIBRATION_B", "0.0"))
+    # Cross-encoder pairs of concurrent queries scored in shared forward passes
+    RERANK_MICRO_BATCHING: bool = os.getenv("RERANK_MICRO_BATCHING", "true").lower() == "true"
+    RERANK_BATCH_MAX_SIZE: int = int(os.getenv("RERANK_BATCH_MAX_SIZE", "64"))
+    RERANK_BATCH_MAX_WAIT_MS: float = float(os.getenv("RERANK_BATCH_MAX_WAIT_MS", "5"))
+    # In-memory cache of (query, chunk) scores (0 disables it)
+    RERANK_CACHE_MAX_ENTRIES: int = int(os.getenv("RERANK_CACHE_MAX_ENTRIES", "50000"))
+    # Chunk text is cut to the model's max tokens times this many characters before tokenising
+    RERANK_CHARS_PER_TOKEN: int = int(os.getenv("RERANK_CHARS_PER_TOKEN", "4"))
+    # Adaptive rerank depth: up to k * RERANK_CANDIDATE_FACTOR candidates are fetched and scored in
+    # ANN order, RERANK_CASCADE_BATCH_SIZE at a time after the first k; scoring stops once a batch's best
+    # score is RERANK_STABLE_MARGIN (cross-encoder logits) below the current k-th (0 = score all)
+    RERANK_CANDIDATE_FACTOR: int = int(os.getenv("RERANK_CANDIDATE_FACTOR", "3"))
+    RERANK_CASCADE_BATCH_SIZE: int = int(os.getenv("RERANK_CASCADE_BATCH_SIZE", "4"))
+    RERANK_STABLE_MARGIN: float = float(os.getenv("RERANK_STABLE_MARGIN", "3.0"))
+    # Skip reranking when the k-th hit's cosine similarity leads the next candidate's by this much (0 = never)
+    RERANK_SKIP_SIMILARITY_GAP: float = float(os.getenv("RERANK_SKIP_SIMILARITY_GAP", "0.2"))
+    
+    # Retrieval mode: dense (vectors), lexical (BM25 over the full-text index) or hybrid (both, fused
+    # by reciprocal rank with constant SEARCH_RRF_K); callers may choose per request
+    SEARCH_MODE: str = os.getenv("SEARCH_MODE", "hybrid").lower()
+    SEARCH_RRF_K: int = int(os.getenv("SEARCH_RRF_K", "60"))
+    # Most queries accepted by one batch search request
+    SEARCH_BATCH_MAX_QUERIES: int = int(os.getenv("SEARCH_BATCH_MAX_QUERIES", "1000"))
     
     # Vector Store
     FAISS_INDEX_PATH: str = os.getenv("FAISS_INDEX_PATH", "./data/index.faiss")
+    # Index type: flat (exact), ivf_flat, ivf_pq or hnsw. Approximate indexes are built
+    # from the flat index once it holds FAISS_ANN_MIN_VECTORS vectors.
+    FAISS_INDEX_TYPE: str = os.getenv("FAISS_INDEX_TYPE", "flat").lower()
+    FAISS_ANN_MIN_VECTORS: int = int(os.getenv("FAISS_ANN_MIN_VECTORS", "50000"))
+    FAISS_IVF_NLIST: int = int(os.getenv("FAISS_IVF_NLIST", "0"))  # 0 = ~4*sqrt(n)
+    FAISS_IVF_NPROBE: int = int(os.getenv("FAISS_IVF_NPROBE", "16"))
+    FAISS_PQ_M: int = int(os.getenv("FAISS_PQ_M", "16"))
+    FAISS_HNSW_M: int = int(os.getenv("FAISS_HNSW_M", "32"))
+    FAISS_HNSW_EF_CONSTRUCTION: int = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "40"))
+    FAISS_HNSW_EF_SEARCH: int = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+    # Vector storage of flat, IVF-flat and HNSW indexes: float32, fp16 (1/2 memory) or sq8 (1/4).
+    # Quantised searches fetch FAISS_RESCORE_FACTOR x k candidates and re-rank them with the
+    # full-precision vectors kept in the docstore. Existing shards keep their storage until re-indexed.
+    FAISS_VECTOR_STORAGE: str = os.getenv("FAISS_VECTOR_STORAGE", "float32").lower()
+    FAISS_RESCORE_FACTOR: int = int(os.getenv("FAISS_RESCORE_FACTOR", "4"))
+    # Vectors sampled from the newest shard for the recall report in the stats (0 = no report)
+    FAISS_RECALL_SAMPLE_VECTORS: int = int(os.getenv("FAISS_RECALL_SAMPLE_VECTORS", "2000"))
+    # Number of metadata filters whose FAISS id selectors are kept between searches
+    SEARCH_FILTER_CACHE_SIZE: int = int(os.getenv("SEARCH_FILTER_CACHE_SIZE", "64"))
+    # Query embeddings, and formatted results per (query, parameters, index generation), kept between
+    # searches for repeated queries (0 disables either cache)
+    SEARCH_EMBEDDING_CACHE_SIZE: int = int(os.getenv("SEARCH_EMBEDDING_CACHE_SIZE", "1024"))
+    SEARCH_RESULT_CACHE_SIZE: int = int(os.getenv("SEARCH_RESULT_CACHE_SIZE", "1024"))
+    # Segmented persistence: the write-ahead log is sealed into a segment at this size,
+    # and segments are merged into a new base snapshot in the background once this many exist
+    FAISS_WAL_MAX_BYTES: int = int(os.getenv("FAISS_WAL_MAX_BYTES", str(16 * 1024 * 1024)))
+    FAISS_MERGE_MIN_SEGMENTS: int = int(os.getenv("FAISS_MERGE_MIN_SEGMENTS", "4"))
+    
+    # Time-partitioned index: one shard per publication month/week ("none" keeps one shard).
+    # Changing the granularity of an existing store requires a re-index.
+    FAISS_SHARD_GRANULARITY: str = os.getenv("FAISS_SHARD_GRANULARITY", "month")
+    # Newest shards kept in memory; older ones are loaded on demand up to FAISS_SHARD_MAX_LOADED
+    FAISS_SHARD_HOT_COUNT: int = int(os.getenv("FAISS_SHARD_HOT_COUNT", "3"))
+    FAISS_SHARD_MAX_LOADED: int = int(os.getenv("FAISS_SHARD_MAX_LOADED", "24"))
+    # Memory-map older shards read-only instead of reading them into memory
+    FAISS_SHARD_MMAP_COLD: bool = os.getenv("FAISS_SHARD_MMAP_COLD", "true").lower() == "true"
+    # Stop visiting older shards once k results reach this cosine similarity (0 = search all shards)
+    FAISS_SHARD_STOP_SIMILARITY: float = float(os.getenv("FAISS_SHARD_STOP_SIMILARITY", "0.8"))
+    
+    # Multi-process serving: "standalone" (one process searches and writes), "writer" (the single
+    # ingestion process; publishes index generations) or "reader" (request workers: memory-map the
+    # published index read-only and hand their writes to the writer). Run the scheduler in the writer only.
+    VECTOR_STORE_MODE: str = os.getenv("VECTOR_STORE_MODE", "standalone").lower()
+    # Writer: minimum seconds between publications; reader: seconds between checks for a new one
+    VECTOR_STORE_PUBLISH_INTERVAL: float = float(os.getenv("VECTOR_STORE_PUBLISH_INTERVAL", "5"))
+    VECTOR_STORE_REFRESH_INTERVAL: float = float(os.getenv("VECTOR_STORE_REFRESH_INTERVAL", "2"))
+    # Writer: seconds between polls of the writes handed over by readers
+    VECTOR_STORE_SPOOL_POLL_INTERVAL: float = float(os.getenv("VECTOR_STORE_SPOOL_POLL_INTERVAL", "1"))
+    # Writer: failed attempts after which a spooled write is set aside as failed
+    VECTOR_STORE_SPOOL_MAX_ATTEMPTS: int = int(os.getenv("VECTOR_STORE_SPOOL_MAX_ATTEMPTS", "5"))
+    
+    # Ingestion queue: all vector store writes go through one writer thread.
+    # Producers block once INGESTION_QUEUE_MAX_DOCUMENTS documents are waiting
+    INGESTION_QUEUE_MAX_DOCUMENTS: int = int(os.getenv("INGESTION_QUEUE_MAX_DOCUMENTS", "5000"))
+    INGESTION_BATCH_MAX_DOCUMENTS: int = int(os.getenv("INGESTION_BATCH_MAX_DOCUMENTS", "500"))
+    INGESTION_COALESCE_MS: float = float(os.getenv("INGESTION_COALESCE_MS", "200"))
+    INGESTION_SHUTDOWN_TIMEOUT: float = float(os.getenv("INGESTION_SHUTDOWN_TIMEOUT", "60"))
+    # Chunking of document descriptions (changing it takes effect for new documents; re-index for the rest)
+    CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE", "1000"))
+    CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", "200"))
+    
+    # Full re-index from the documents table into a shadow store swapped in when complete
+    REINDEX_PAGE_SIZE: int = int(os.getenv("REINDEX_PAGE_SIZE", "200"))
+    REINDEX_WORKERS: int = int(os.getenv("REINDEX_WORKERS", "4"))
+    
+    # Knowledge base relevance gate (decides knowledge base vs online search)
+    KB_RERANK_RELEVANCE_THRESHOLD: float = float(os.getenv("KB_RERANK_RELEVANCE_THRESHOLD", "0.3"))
+    KB_VECTOR_SIMILARITY_THRESHOLD: float = float(os.getenv("KB_VECTOR_SIMILARITY_THRESHOLD", "0.3"))
+    ASSISTANT_LLM_RELEVANCE_CHECK: bool = os.getenv("ASSISTANT_LLM_RELEVANCE_CHECK", "false").lower() == "true"
     
     # External APIs
     TAVILY_API_KEY: Optional[str] = os.getenv("TAVILY_API_KEY")
@@ -0,0 +1,149 @@
+"""
+Lazy service registry: heavy services are built on first use or by a background warm-up.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from utils.logging_config import app_logger
+
+
+class LazyService:
+    """
+    Proxy that constructs a service on first attribute access.
+
+    Module-level service names (``embedding_service``, ``vector_store_service``
+    ...) are bound to these proxies so importing a module no longer loads
+    models. Attribute reads, writes and deletes are forwarded to the real
+    instance, which is built exactly once even under concurrent access.
+
+    Args:
+        name: Service name used in logs and status reports
+        factory: Zero-argument callable returning the service instance
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        object.__setattr__(self, "_lazy_name", name)
+        object.__setattr__(self, "_lazy_factory", factory)
+        object.__setattr__(self, "_lazy_instance", None)
+        object.__setattr__(self, "_lazy_lock", threading.Lock())
+        object.__setattr__(self, "_lazy_error", None)
+        object.__setattr__(self, "_lazy_load_seconds", None)
+
+    def get_instance(self) -> Any:
+        """Return the service, constructing it on the first call."""
+        instance = object.__getattribute__(self, "_lazy_instance")
+        if instance is not None:
+            return instance
+        with object.__getattribute__(self, "_lazy_lock"):
+            instance = object.__getattribute__(self, "_lazy_instance")
+            if instance is not None:
+                return instance
+            name = object.__getattribute__(self, "_lazy_name")
+            app_logger.info(f"Loading service: {name}")
+            started = time.perf_counter()
+            try:
+                instance = object.__getattribute__(self, "_lazy_factory")()
+            except Exception as e:
+                object.__setattr__(self, "_lazy_error", str(e))
+                app_logger.error(f"Failed to load service {name}: {str(e)}")
+                raise
+            elapsed = time.perf_counter() - started
+            object.__setattr__(self, "_lazy_instance", instance)
+            object.__setattr__(self, "_lazy_error", None)
+            object.__setattr__(self, "_lazy_load_seconds", elapsed)
+            app_logger.info(f"Service {name} loaded in {elapsed:.2f}s")
+            return instance
+
+    def is_loaded(self) -> bool:
+        return object.__getattribute__(self, "_lazy_instance") is not None
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.is_loaded(),
+            "load_seconds": object.__getattribute__(self, "_lazy_load_seconds"),
+            "error": object.__getattribute__(self, "_lazy_error")
+        }
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.get_instance(), attr)
+
+    def __setattr__(self, attr: str, value: Any):
+        setattr(self.get_instance(), attr, value)
+
+    def __delattr__(self, attr: str):
+        delattr(self.get_instance(), attr)
+
+    def __repr__(self) -> str:
+        name = object.__getattribute__(self, "_lazy_name")
+        state = "loaded" if self.is_loaded() else "not loaded"
+        return f"<LazyService {name} ({state})>"
+
+
+class ServiceRegistry:
+    """
+    Registry of lazily constructed services with background warm-up.
+
+    Liveness only means the process is serving requests. Readiness means
+    every service registered with ``warm=True`` has loaded successfully.
+    """
+
+    def __init__(self):
+        self._services: Dict[str, LazyService] = {}
+        self._warm_names: List[str] = []
+        self._warm_up_thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any], warm: bool = True) -> LazyService:
+        """
+        Register a service factory.
+
+        Args:
+            name: Unique service name
+            factory: Zero-argument callable building the service
+            warm: Whether the background warm-up loads it and readiness waits for it
+
+        Returns:
+            The lazy proxy to bind to the module-level service name
+        """
+        with self._lock:
+            service = LazyService(name, factory)
+            self._services[name] = service
+            if warm and name not in self._warm_names:
+                self._warm_names.append(name)
+            return service
+
+    def get(self, name: str) -> Any:
+        """Get a service instance by name, loading it if needed."""
+        return self._services[name].get_instance()
+
+    def warm_up(self):
+        """Load every warm service in registration order, continuing past failures."""
+        for name in list(self._warm_names):
+            try:
+                self._services[name].get_instance()
+            except Exception:
+                # Already logged by the proxy; readiness reports the error
+                continue
+
+    def start_warm_up(self) -> threading.Thread:
+        """Start the warm-up in a daemon thread (once)."""
+        with self._lock:
+            if self._warm_up_thread is None:
+                self._warm_up_thread = threading.Thread(target=self.warm_up, name="service-warm-up", daemon=True)
+                self._warm_up_thread.start()
+            return self._warm_up_thread
+
+    def is_ready(self) -> bool:
+        """Whether every warm service is loaded."""
+        return all(self._services[name].is_loaded() for name in self._warm_names)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Per-service load status."""
+        return {
+            "ready": self.is_ready(),
+            "services": {name: service.get_status() for name, service in self._services.items()}
+        }
+
+
+# Global registry instance
+service_registry = ServiceRegistry()
@@ -515,6 +515,24 @@ def create_docs_app():
             """
             pass
     
+    @assistant_ns.route('/query/stream')
+    class AssistantQueryStream(Resource):
+        @assistant_ns.expect(assistant_query)
+        @assistant_ns.doc('query_assistant_stream', description='以SSE流式提交查询到AI助手')
+        def post(self):
+            """
+            以Server-Sent Events流式提交查询
+            
+            检索完成后立即返回来源，随后逐段返回生成内容。
+            
+            **事件类型：**
+            - sources: 检索到的来源及来源类型
+            - token: 生成的文本片段
+            - done: 完整回答
+            - error: 错误信息
+            """
+            pass
+    
     @assistant_ns.route('/health')
     class AssistantHealth(Resource):
         @assistant_ns.doc('assistant_health', description='检查助手服务健康状态')
@@ -5,22 +5,22 @@ import os
 import json
 from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
-from sklearn.cluster import KMeans
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics import silhouette_score
 from collections import Counter
+from core.service_registry import service_registry
 from services.knowledge_base.vector_store_service import vector_store_service
 from services.analytics.text_processing import text_processing_service
 from utils.logging_config import app_logger
 
-# Try to import advanced clustering libraries
-try:
-    import umap
-    import hdbscan
-    ADVANCED_CLUSTERING_AVAILABLE = True
-except ImportError:
-    ADVANCED_CLUSTERING_AVAILABLE = False
-    app_logger.warning("Advanced clustering libraries (UMAP, HDBSCAN) not available, using K-means")
+
+def _advanced_clustering_available() -> bool:
+    """Check for the optional UMAP/HDBSCAN libraries (imported on first use, they are slow to load)."""
+    try:
+        import umap  # noqa: F401
+        import hdbscan  # noqa: F401
+        return True
+    except ImportError:
+        app_logger.warning("Advanced clustering libraries (UMAP, HDBSCAN) not available, using K-means")
+        return False
 
 
 class ClusteringService:
@@ -28,10 +28,13 @@ class ClusteringService:
     
     def __init__(self):
         self.vectorizer = None
+        self.advanced_clustering_available = _advanced_clustering_available()
         self._initialize_vectorizer()
     
     def _initialize_vectorizer(self):
         """Initialize TF-IDF vectorizer."""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        
         self.vectorizer = TfidfVectorizer(
             max_features=2000,
             stop_words=text_processing_service.custom_stop_words,
@@ -74,12 +77,12 @@ class ClusteringService:
                 "top_clusters": cluster_info[:10],  # Top 10 clusters
                 "cluster_distribution": self._get_cluster_distribution(cluster_labels),
                 "silhouette_score": silhouette_avg,
-                "clustering_method": "HDBSCAN with UMAP" if ADVANCED_CLUSTERING_AVAILABLE else "K-means",
+                "clustering_method": "HDBSCAN with UMAP" if self.advanced_clustering_available else "K-means",
                 "optimization_info": {
                     "original_clusters": optimal_clusters,
                     "optimal_clusters": optimal_clusters,
                     "merged_clusters": 0,
-                    "noise_points": sum(1 for label in cluster_labels if label == -1) if ADVANCED_CLUSTERING_AVAILABLE else 0
+                    "noise_points": sum(1 for label in cluster_labels if label == -1) if self.advanced_clustering_available else 0
                 }
             }
             
@@ -93,30 +96,14 @@ class ClusteringService:
     def _extract_documents_from_vectorstore(self) -> List[Dict[str, Any]]:
         """Extract all documents from the vector store."""
         try:
-            # This is a simplified approach - in practice, you might want to store
-            # document metadata separately for easier access
-            documents = []
-            
-            # Get all document IDs from vector store
-            docstore = vector_store_service.vectorstore.docstore
-            index_to_docstore_id = vector_store_service.vectorstore.index_to_docstore_id
-            
-            for idx, doc_id in enumerate(index_to_docstore_id.values()):
-                try:
-                    doc = docstore.search(doc_id)
-                    if doc is not None:
-                        if hasattr(doc, 'page_content'):
-                            documents.append({
-                                "content": doc.page_content,
-                                "metadata": doc.metadata if hasattr(doc, 'metadata') else {}
-                            })
-                        else:
-                            documents.append({
-                                "content": str(doc),
-                                "metadata": {}
-                            })
-                except (KeyError, AttributeError):
-                    continue
+            # Stream chunks from the SQLite docstore in batches
+            documents = [
+                {
+                    "content": doc.page_content,
+                    "metadata": doc.metadata or {}
+                }
+                for doc in vector_store_service.iter_documents()
+            ]
             
             app_logger.info(f"Extracted {len(documents)} documents from vector store")
             return documents
@@ -141,7 +128,7 @@ class ClusteringService:
         # Create TF-IDF matrix
         tfidf_matrix = self.vectorizer.fit_transform(processed_contents)
         
-        if ADVANCED_CLUSTERING_AVAILABLE and len(processed_contents) > 10:
+        if self.advanced_clustering_available and len(processed_contents) > 10:
             return self._perform_advanced_clustering(tfidf_matrix, processed_contents)
         else:
             return self._perform_kmeans_clustering(tfidf_matrix)
@@ -149,6 +136,10 @@ class ClusteringService:
     def _perform_advanced_clustering(self, tfidf_matrix, processed_contents: List[str]) -> Tuple[List[int], int, float]:
         """Perform advanced clustering using UMAP + HDBSCAN."""
         try:
+            import umap
+            import hdbscan
+            from sklearn.metrics import silhouette_score
+            
             # UMAP dimensionality reduction
             n_neighbors = min(15, max(5, int(len(processed_contents) * 0.3)))
             n_components = min(50, len(processed_contents) - 1, len(processed_contents) // 2)
@@ -211,6 +202,9 @@ class ClusteringService:
     
     def _perform_kmeans_clustering(self, tfidf_matrix) -> Tuple[List[int], int, float]:
         """Perform K-means clustering."""
+        from sklearn.cluster import KMeans
+        from sklearn.metrics import silhouette_score
+        
         max_possible_clusters = min(15, len(tfidf_matrix) // 2) if len(tfidf_matrix) > 20 else 10
         if max_possible_clusters < 2:
             max_possible_clusters = 2
@@ -313,4 +307,4 @@ class ClusteringService:
 
 
 # Global service instance
-clustering_service = ClusteringService()
+clustering_service = service_registry.register("clustering", ClusteringService, warm=False)
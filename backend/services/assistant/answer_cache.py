@@ -0,0 +1,162 @@
+"""
+Semantic answer cache for the assistant.
+"""
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+import faiss
+from utils.lru_cache import LRUCache
+from utils.logging_config import app_logger
+
+
+def normalize_query(query: str) -> str:
+    """Normalise query text for exact-match cache keys."""
+    text = re.sub(r"\s+", " ", str(query or "")).strip().lower()
+    return text.rstrip("?？。.!！ ")
+
+
+class SemanticAnswerCache:
+    """
+    Answer cache keyed on normalised query text with a semantic fallback.
+
+    Exact matches on the normalised text are served directly. Otherwise the
+    query embedding is compared against the embeddings of cached queries with
+    an inner-product FAISS index; the closest entry is served when its cosine
+    similarity reaches ``similarity_threshold``. Entries expire after
+    ``ttl_seconds``, are evicted LRU-first beyond ``max_entries``, and the
+    whole cache is dropped when the knowledge base index generation changes.
+
+    Args:
+        embed_func: Function returning the embedding of a query string
+        generation_func: Function returning the current index generation
+        similarity_threshold: Minimum cosine similarity for a semantic hit
+        ttl_seconds: Entry time-to-live
+        max_entries: Maximum number of cached answers
+    """
+
+    def __init__(self, embed_func: Callable[[str], List[float]], generation_func: Callable[[], int],
+                 similarity_threshold: float = 0.95, ttl_seconds: float = 600, max_entries: int = 512):
+        self.embed_func = embed_func
+        self.generation_func = generation_func
+        self.similarity_threshold = similarity_threshold
+        self._entries = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds, on_evict=self._on_evict)
+        self._index = None
+        self._keys_by_id: Dict[int, str] = {}
+        self._next_id = 0
+        self._generation = None
+        self._lock = threading.RLock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, query: str) -> Optional[Any]:
+        """
+        Look up a cached answer.
+
+        Returns:
+            The cached value, or None on a miss
+        """
+        key = normalize_query(query)
+        with self._lock:
+            self._check_generation()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.exact_hits += 1
+                return entry["value"]
+            if self._index is None or self._index.ntotal == 0:
+                self.misses += 1
+                return None
+
+        try:
+            vector = self._to_vector(self.embed_func(query))
+        except Exception as e:
+            app_logger.warning(f"Answer cache lookup embedding failed: {str(e)}")
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self._check_generation()
+            if self._index is None or self._index.ntotal == 0 or self._index.d != vector.shape[1]:
+                self.misses += 1
+                return None
+            scores, ids = self._index.search(vector, 1)
+            cached_key = self._keys_by_id.get(int(ids[0][0]))
+            if cached_key is not None and float(scores[0][0]) >= self.similarity_threshold:
+                entry = self._entries.get(cached_key)
+                if entry is not None:
+                    self.semantic_hits += 1
+                    app_logger.info(f"Semantic answer cache hit (similarity {float(scores[0][0]):.4f})")
+                    return entry["value"]
+            self.misses += 1
+            return None
+
+    def put(self, query: str, value: Any):
+        """Cache an answer for a query."""
+        key = normalize_query(query)
+        try:
+            vector = self._to_vector(self.embed_func(query))
+        except Exception as e:
+            app_logger.warning(f"Answer cache store embedding failed: {str(e)}")
+            return
+
+        with self._lock:
+            self._check_generation()
+            if self._index is None or self._index.d != vector.shape[1]:
+                self._entries.clear()
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+            entry_id = self._next_id
+            self._next_id += 1
+            # Insert first so replacing an existing key removes the old vector via on_evict
+            self._entries.put(key, {"id": entry_id, "value": value})
+            self._index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._keys_by_id[entry_id] = key
+
+    def clear(self):
+        """Drop every cached answer."""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache hit/miss counters."""
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            hits = self.exact_hits + self.semantic_hits
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "evictions": self._entries.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "similarity_threshold": self.similarity_threshold,
+                "index_generation": self._generation
+            }
+
+    def _check_generation(self):
+        """Invalidate everything if the knowledge base changed since caching."""
+        generation = self.generation_func()
+        if self._generation is None:
+            self._generation = generation
+        elif generation != self._generation:
+            app_logger.info(f"Knowledge base generation changed ({self._generation} -> {generation}), clearing answer cache")
+            self._entries.clear()
+            self._generation = generation
+            self.invalidations += 1
+
+    def _on_evict(self, key: str, entry: Dict[str, Any]):
+        """Remove an evicted entry's vector from the index."""
+        entry_id = entry["id"]
+        self._keys_by_id.pop(entry_id, None)
+        if self._index is not None:
+            self._index.remove_ids(np.array([entry_id], dtype=np.int64))
+
+    @staticmethod
+    def _to_vector(embedding: List[float]) -> np.ndarray:
+        """Convert an embedding to a normalised float32 row vector."""
+        vector = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(vector)
+        return vector
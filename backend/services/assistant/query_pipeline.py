@@ -0,0 +1,204 @@
+"""
+Small dependency-aware executor for the assistant query pipeline.
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from utils.logging_config import app_logger
+
+
+class PipelineStage:
+    """
+    A named unit of work in a query pipeline.
+    
+    Args:
+        name: Unique stage name, also the key of its output
+        func: Callable receiving the PipelineRun and returning the stage output
+        requires: Stages whose outputs must be ready before this stage starts
+        optional: Stages this stage may pull with ``run.get`` while running
+        speculative: Start this stage at the beginning of every run, before
+            anybody asks for it, so it overlaps with the other branches
+    """
+    
+    def __init__(self, name: str, func: Callable[["PipelineRun"], Any],
+                 requires: Iterable[str] = (), optional: Iterable[str] = (),
+                 speculative: bool = False):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+        self.optional = tuple(optional)
+        self.speculative = speculative
+
+
+class PipelineRun:
+    """A single execution of a QueryPipeline."""
+    
+    def __init__(self, pipeline: "QueryPipeline", inputs: Dict[str, Any]):
+        self.pipeline = pipeline
+        self.inputs = inputs
+        self._results: Dict[str, Future] = {}
+        self._tasks: Dict[str, Future] = {}
+        self._cancelled: Dict[str, threading.Event] = {}
+        self._consumed = set()
+        self._lock = threading.RLock()
+    
+    def get(self, name: str) -> Any:
+        """
+        Get the output of a stage, launching it if it has not started yet.
+        
+        If the stage is still queued in the executor it is run inline in the
+        calling thread, so a stage pulling an optional dependency never waits
+        on a pool slot it may itself be occupying.
+        """
+        if name in self.inputs:
+            return self.inputs[name]
+        
+        with self._lock:
+            self._consumed.add(name)
+            result = self._launch(name)
+            task = self._tasks.get(name)
+        
+        if task is not None and task.cancel():
+            app_logger.debug(f"Running queued pipeline stage '{name}' inline")
+            self._execute(name)
+        return result.result()
+    
+    def is_cancelled(self, name: str) -> bool:
+        """Check whether a stage was cancelled because its output lost."""
+        event = self._cancelled.get(name)
+        return event is not None and event.is_set()
+    
+    def cancel(self, name: str):
+        """Cancel a stage whose output is no longer needed."""
+        with self._lock:
+            if name in self._consumed:
+                return
+            event = self._cancelled.setdefault(name, threading.Event())
+            event.set()
+            task = self._tasks.get(name)
+            result = self._results.get(name)
+        
+        if task is not None and task.cancel() and result is not None and not result.done():
+            result.cancel()
+        app_logger.info(f"Cancelled pipeline stage '{name}'")
+    
+    def start(self, outputs: Iterable[str]):
+        """Launch the stages needed for ``outputs`` plus speculative stages."""
+        with self._lock:
+            for stage in self.pipeline.stages.values():
+                if stage.speculative:
+                    self._launch(stage.name)
+            for name in outputs:
+                self._consumed.add(name)
+                self._launch(name)
+    
+    def finish(self):
+        """Cancel every launched stage whose output nobody consumed."""
+        with self._lock:
+            unconsumed = [name for name in self._results if name not in self._consumed]
+        for name in unconsumed:
+            if not self._results[name].done():
+                self.cancel(name)
+    
+    def _launch(self, name: str) -> Future:
+        """Schedule a stage once all of its required stages are done."""
+        if name in self._results:
+            return self._results[name]
+        if name not in self.pipeline.stages:
+            raise KeyError(f"Unknown pipeline stage: {name}")
+        
+        stage = self.pipeline.stages[name]
+        result = Future()
+        self._results[name] = result
+        self._cancelled.setdefault(name, threading.Event())
+        
+        dependencies = [self._launch(dep) for dep in stage.requires if dep not in self.inputs]
+        remaining = [len(dependencies)]
+        
+        def on_dependency_done(_):
+            with self._lock:
+                remaining[0] -= 1
+                ready = remaining[0] == 0
+            if ready:
+                self._submit(name)
+        
+        if not dependencies:
+            self._submit(name)
+        for dependency in dependencies:
+            dependency.add_done_callback(on_dependency_done)
+        return result
+    
+    def _submit(self, name: str):
+        """Submit a ready stage to the executor."""
+        with self._lock:
+            if self.is_cancelled(name):
+                self._results[name].cancel()
+                return
+            self._tasks[name] = self.pipeline.executor.submit(self._execute, name)
+    
+    def _execute(self, name: str):
+        """Run a stage and publish its output."""
+        result = self._results[name]
+        if result.done() or not result.set_running_or_notify_cancel():
+            return
+        
+        stage = self.pipeline.stages[name]
+        try:
+            for dependency in stage.requires:
+                self.get(dependency)
+            result.set_result(stage.func(self))
+        except BaseException as e:
+            result.set_exception(e)
+
+
+class QueryPipeline:
+    """
+    Executes a DAG of PipelineStage objects on a shared thread pool.
+    
+    Only the stages reachable from the requested outputs (plus speculative
+    ones) are run; independent stages run concurrently.
+    """
+    
+    def __init__(self, stages: List[PipelineStage], executor: Optional[ThreadPoolExecutor] = None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.executor = executor or ThreadPoolExecutor(max_workers=4, thread_name_prefix="query-pipeline")
+        self._validate()
+    
+    def _validate(self):
+        """Ensure every dependency exists and the graph has no cycles."""
+        visiting, visited = set(), set()
+        
+        def visit(name: str):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Pipeline has a dependency cycle at stage: {name}")
+            visiting.add(name)
+            for dep in self.stages[name].requires + self.stages[name].optional:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+                visit(dep)
+            visiting.discard(name)
+            visited.add(name)
+        
+        for name in self.stages:
+            visit(name)
+    
+    def run(self, inputs: Dict[str, Any], outputs: Iterable[str]) -> Dict[str, Any]:
+        """
+        Run the pipeline and return the requested outputs.
+        
+        Args:
+            inputs: Values available to every stage through ``run.inputs``
+            outputs: Names of the stages whose outputs are wanted
+            
+        Returns:
+            Mapping of output name to stage output
+        """
+        outputs = list(outputs)
+        run = PipelineRun(self, inputs)
+        run.start(outputs)
+        try:
+            return {name: run.get(name) for name in outputs}
+        finally:
+            run.finish()
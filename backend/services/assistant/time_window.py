@@ -0,0 +1,76 @@
+"""
+Publication time windows implied by assistant queries ("this week", "最近3天", ...).
+"""
+import re
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+# Chinese numerals used in relative expressions such as 最近三天
+_CHINESE_NUMBERS = {"一": 1, "两": 2, "二": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9, "十": 10}
+
+_DAY_UNITS = {"天": 1, "日": 1, "周": 7, "星期": 7, "个月": 30, "月": 30, "day": 1, "week": 7, "month": 30}
+
+_RECENT_PATTERNS = [
+    re.compile(r"(?:最近|近|过去)\s*(\d+|[一两二三四五六七八九十])\s*(天|日|周|星期|个月|月)"),
+    re.compile(r"(?:last|past)\s+(\d+)\s+(day|week|month)s?", re.IGNORECASE),
+]
+
+
+def _start_of_day(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _start_of_month(moment: datetime) -> datetime:
+    return _start_of_day(moment).replace(day=1)
+
+
+def _previous_month(moment: datetime) -> datetime:
+    start = _start_of_month(moment)
+    return _start_of_month(start - timedelta(days=1))
+
+
+def parse_time_window(query: str, now: Optional[datetime] = None) -> Optional[Tuple[datetime, datetime]]:
+    """
+    Publication date range a query asks about.
+
+    Recognises relative expressions in Chinese and English: today /
+    yesterday, this / last week, this / last month, this / last year and
+    "last N days / weeks / months". Weeks start on Monday.
+
+    Args:
+        query: User query
+        now: Reference time (defaults to the current local time)
+
+    Returns:
+        (start inclusive, end exclusive) in local time, or None when the
+        query names no time window
+    """
+    now = now or datetime.now()
+    today = _start_of_day(now)
+    text = query.lower()
+
+    for pattern in _RECENT_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            amount, unit = match.groups()
+            count = int(amount) if amount.isdigit() else _CHINESE_NUMBERS[amount]
+            return today - timedelta(days=count * _DAY_UNITS[unit.lower()] - 1), today + timedelta(days=1)
+
+    if re.search(r"今天|今日|today", text):
+        return today, today + timedelta(days=1)
+    if re.search(r"昨天|昨日|yesterday", text):
+        return today - timedelta(days=1), today
+    week_start = today - timedelta(days=today.weekday())
+    if re.search(r"上周|上个?星期|上礼拜|last week", text):
+        return week_start - timedelta(days=7), week_start
+    if re.search(r"本周|这周|这个?星期|这礼拜|this week", text):
+        return week_start, today + timedelta(days=1)
+    if re.search(r"上个?月|last month", text):
+        return _previous_month(now), _start_of_month(now)
+    if re.search(r"本月|这个?月|this month", text):
+        return _start_of_month(now), today + timedelta(days=1)
+    if re.search(r"去年|last year", text):
+        return today.replace(year=now.year - 1, month=1, day=1), today.replace(month=1, day=1)
+    if re.search(r"今年|this year", text):
+        return today.replace(month=1, day=1), today + timedelta(days=1)
+    return None
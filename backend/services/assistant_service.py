@@ -1,13 +1,21 @@
 """
 Assistant service for AI query processing.
 """
-from typing import Dict, Any, List, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional
 from sqlmodel import Session
 from langchain_community.llms import Ollama
 from langchain.agents import initialize_agent, AgentType
 from langchain.agents import Tool
+from services.knowledge_base.embedding_service import embedding_service
 from services.knowledge_base.vector_store_service import vector_store_service
+from services.knowledge_base.ingestion_queue import ingestion_queue
 from services.search.online_search_service import online_search_service
+from services.assistant.query_pipeline import PipelineStage, QueryPipeline
+from services.assistant.answer_cache import SemanticAnswerCache
+from services.assistant.time_window import parse_time_window
+from services.knowledge_base.search_filter import SearchFilter
 from schemas.requests import (
     AssistantQueryRequest, KnowledgeBaseStoreRequest
 )
@@ -18,47 +26,74 @@ from utils.logging_config import app_logger
 from config.settings import settings
 
 
-class AssistantService:
-    """Service for AI assistant operations."""
+class AssistantRuntime:
+    """
+    Long-lived assistant runtime shared by all requests in a worker.
     
-    def __init__(self, session: Session):
-        self.session = session
-        self.assistant = None
-        self._initialize_assistant()
+    Holds the Ollama client, the tools and the ReAct agent so they are built
+    once per process instead of once per query.
+    """
     
-    def _initialize_assistant(self):
-        """Initialize the AI assistant."""
-        try:
-            # Initialize LLM
-            model_name = "qwen2.5:3b"
-            llm = Ollama(model=model_name, temperature=0)
-            
-            # Create tools
-            knowledge_base_tool = self._create_knowledge_base_tool()
-            online_search_tool = online_search_service.create_search_tool()
-            
-            # Define tools list
-            tools = [
-                Tool(
-                    name="KnowledgeBase",
-                    func=lambda query: knowledge_base_tool.invoke({
-                        "action": "retrieve", 
-                        "query": query, 
-                        "k": 3, 
-                        "rerank": True
-                    }),
-                    description="本地新闻知识库工具：包含完整的新闻数据、历史事件、实时信息等。这是主要的信息来源，应该优先使用。适用于所有类型的查询，包括最新新闻、历史事件、人物信息等。如果返回的结果与问题不相关、为空或包含'Placeholder text'，则必须使用OnlineSearch工具。"
-                ),
-                Tool(
-                    name="OnlineSearch",
-                    func=online_search_tool.invoke,
-                    description="在线搜索工具：当本地知识库无法提供相关信息时必须使用此工具。使用条件：1)本地知识库返回空结果 2)返回内容与问题不相关 3)返回内容包含'Placeholder text' 4)返回内容无法回答用户问题。"
+    def __init__(self):
+        self.llm = None
+        self.agent = None
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.ASSISTANT_PIPELINE_WORKERS,
+            thread_name_prefix="assistant-pipeline"
+        )
+        self.answer_cache = None
+        if settings.ANSWER_CACHE_ENABLED:
+            self.answer_cache = SemanticAnswerCache(
+                # Defer the attribute lookup so building the runtime does not load the model
+                embed_func=lambda query: embedding_service.embed_query(query),
+                generation_func=lambda: vector_store_service.index_generation,
+                similarity_threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+                ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+                max_entries=settings.ANSWER_CACHE_MAX_ENTRIES
+            )
+        self._lock = threading.Lock()
+    
+    def initialize(self):
+        """Build the LLM client, tools and agent if not built yet."""
+        if self.agent is not None:
+            return
+        with self._lock:
+            if self.agent is not None:
+                return
+            try:
+                llm = Ollama(
+                    model=settings.OLLAMA_MODEL_NAME,
+                    base_url=settings.OLLAMA_BASE_URL,
+                    timeout=settings.OLLAMA_TIMEOUT,
+                    temperature=0
                 )
-            ]
+                
+                # Create tools
+                knowledge_base_tool = _create_knowledge_base_tool()
+                online_search_tool = online_search_service.create_search_tool()
+                
+                # Define tools list
+                tools = [
+                    Tool(
+                        name="KnowledgeBase",
+                        func=lambda query: knowledge_base_tool.invoke({
+                            "action": "retrieve", 
+                            "query": query, 
+                            "k": 3, 
+                            "rerank": True
+                        }),
+                        description="本地新闻知识库工具：包含完整的新闻数据、历史事件、实时信息等。这是主要的信息来源，应该优先使用。适用于所有类型的查询，包括最新新闻、历史事件、人物信息等。如果返回的结果与问题不相关、为空或包含'Placeholder text'，则必须使用OnlineSearch工具。"
+                    ),
+                    Tool(
+                        name="OnlineSearch",
+                        func=online_search_tool.invoke,
+                        description="在线搜索工具：当本地知识库无法提供相关信息时必须使用此工具。使用条件：1)本地知识库返回空结果 2)返回内容与问题不相关 3)返回内容包含'Placeholder text' 4)返回内容无法回答用户问题。"
+                    )
+                ]
             
-            # Set agent parameters
-            agent_kwargs = {
-                "system_message": """
+                # Set agent parameters
+                agent_kwargs = {
+                    "system_message": """
                 你是一个智能助手，专门为新闻知识库系统服务。请严格按以下步骤工作：
 
                 1. **默认策略**：始终优先使用本地新闻知识库工具
@@ -87,24 +122,97 @@ class AssistantService:
                    - 如果本地知识库信息不足，必须使用在线搜索补充
                    - 明确标注信息来源（本地知识库 vs 在线搜索）
                 """
-            }
-            
-            # Initialize agent
-            self.assistant = initialize_agent(
-                tools=tools,
-                llm=llm,
-                agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-                verbose=True,
-                handle_parsing_errors=True,
-                max_iterations=5,
-                max_execution_time=180,
-                agent_kwargs=agent_kwargs
-            )
+                }
             
-            app_logger.info("Assistant initialized successfully")
+                # Initialize agent
+                agent = initialize_agent(
+                    tools=tools,
+                    llm=llm,
+                    agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+                    verbose=True,
+                    handle_parsing_errors=True,
+                    max_iterations=5,
+                    max_execution_time=180,
+                    agent_kwargs=agent_kwargs
+                )
+                
+                self.llm = llm
+                self.agent = agent
+                app_logger.info("Assistant runtime initialized successfully")
+            except Exception as e:
+                app_logger.error(f"Failed to initialize assistant runtime: {str(e)}")
+                raise
+    
+    def warm_up(self):
+        """Initialize the runtime and load the model into Ollama ahead of the first query."""
+        try:
+            self.initialize()
+            self.llm.invoke("你好")
+            app_logger.info(f"Assistant runtime warmed up with model: {settings.OLLAMA_MODEL_NAME}")
         except Exception as e:
-            app_logger.error(f"Failed to initialize assistant: {str(e)}")
-            raise
+            app_logger.warning(f"Assistant warm-up failed: {str(e)}")
+    
+    def is_ready(self) -> bool:
+        """Check whether the runtime has been initialized."""
+        return self.agent is not None
+
+
+_assistant_runtime: Optional[AssistantRuntime] = None
+_assistant_runtime_lock = threading.Lock()
+
+
+def get_assistant_runtime() -> AssistantRuntime:
+    """Get the process-wide assistant runtime, creating it on first use."""
+    global _assistant_runtime
+    if _assistant_runtime is None:
+        with _assistant_runtime_lock:
+            if _assistant_runtime is None:
+                _assistant_runtime = AssistantRuntime()
+    return _assistant_runtime
+
+
+def _create_knowledge_base_tool():
+    """Create knowledge base tool."""
+    from langchain_core.tools import StructuredTool
+    
+    def knowledge_base_func(action: str, documents: List[dict] = None, 
+                          query: str = None, k: int = 3, rerank: bool = True, filters: dict = None,
+                          mode: str = None):
+        """Knowledge base tool function (filters: source_id, start_date, end_date, tags; mode: dense, lexical or hybrid)."""
+        if action == "store":
+            if documents:
+                return ingestion_queue.submit(documents).result()
+            return "No documents provided"
+        elif action == "retrieve":
+            if query:
+                results = vector_store_service.search(query, k, rerank, filters=SearchFilter.from_dict(filters), mode=mode)
+                return results
+            return []
+        else:
+            return f"Unsupported action: {action}"
+    
+    return StructuredTool.from_function(
+        func=knowledge_base_func,
+        name="KnowledgeBase",
+        description="用于处理和检索向量数据库中的知识，支持存储文档(store)和检索信息(retrieve)两种操作"
+    )
+
+
+class AssistantService:
+    """Service for AI assistant operations."""
+    
+    def __init__(self, session: Session, runtime: Optional[AssistantRuntime] = None):
+        self.session = session
+        self.runtime = runtime or get_assistant_runtime()
+        self.assistant = None
+        self.llm = None
+        self._initialize_assistant()
+    
+    def _initialize_assistant(self):
+        """Attach to the shared assistant runtime."""
+        self.runtime.initialize()
+        self.assistant = self.runtime.agent
+        self.llm = self.runtime.llm
     
     def _initialize_agent(self):
         """Initialize the agent (alias for compatibility)."""
@@ -112,35 +220,22 @@ class AssistantService:
     
     def _create_knowledge_base_tool(self):
         """Create knowledge base tool."""
-        from langchain_core.tools import StructuredTool
-        
-        def knowledge_base_func(action: str, documents: List[dict] = None, 
-                              query: str = None, k: int = 3, rerank: bool = True):
-            """Knowledge base tool function."""
-            if action == "store":
-                if documents:
-                    result = vector_store_service.add_documents(documents)
-                    return result
-                return "No documents provided"
-            elif action == "retrieve":
-                if query:
-                    results = vector_store_service.search(query, k, rerank)
-                    return results
-                return []
-            else:
-                return f"Unsupported action: {action}"
-        
-        return StructuredTool.from_function(
-            func=knowledge_base_func,
-            name="KnowledgeBase",
-            description="用于处理和检索向量数据库中的知识，支持存储文档(store)和检索信息(retrieve)两种操作"
-        )
+        return _create_knowledge_base_tool()
+    
+    def close(self):
+        """Release the per-request database session."""
+        if self.session is not None:
+            self.session.close()
     
     def process_query(self, request: AssistantQueryRequest) -> AssistantQueryResponse:
         """Process a user query."""
         try:
             app_logger.info(f"Processing query: {request.query}")
             
+            cached = self._get_cached_answer(request.query)
+            if cached is not None:
+                return AssistantQueryResponse(**{**cached, "query": request.query})
+            
             # Use the new query function with sources
             result = self._query_with_sources(request.query)
             
@@ -152,7 +247,7 @@ class AssistantService:
             # Format sources
             sources = self._format_sources(raw_sources)
             
-            return AssistantQueryResponse(
+            response = AssistantQueryResponse(
                 query=request.query,
                 response=final_answer,
                 answer=final_answer,
@@ -161,6 +256,8 @@ class AssistantService:
                 origin=origin,
                 status="success"
             )
+            self._cache_answer(request.query, response.dict())
+            return response
         except Exception as e:
             app_logger.error(f"Error processing query: {str(e)}")
             return AssistantQueryResponse(
@@ -173,59 +270,176 @@ class AssistantService:
                 status="error"
             )
     
-    def _query_with_sources(self, query: str) -> Dict[str, Any]:
-        """Query with source tracking."""
+    def stream_query(self, request: AssistantQueryRequest) -> Iterator[Dict[str, Any]]:
+        """
+        Process a user query as a stream of events.
+        
+        Yields a ``sources`` event as soon as retrieval finishes, one ``token``
+        event per generated chunk, and a final ``done`` event with the full
+        answer (or an ``error`` event).
+        """
+        query = request.query
         try:
-            # Initialize LLM for keyword extraction
-            llm = Ollama(model="qwen2.5:3b", temperature=0)
-            
-            # Extract keywords
-            keyword_prompt = f"""
-            分析以下用户问题，提取最适合在新闻知识库中搜索的关键词：
+            app_logger.info(f"Streaming query: {query}")
             
-            用户问题：{query}
-            
-            请提取2-4个关键词，用于在本地新闻知识库中搜索相关信息。
-            关键词应该简洁、准确，能够匹配新闻内容。
-            
-            请回答格式：
-            搜索关键词：[关键词1, 关键词2, 关键词3]
-            """
-            
-            keyword_analysis = llm.invoke(keyword_prompt)
-            app_logger.info(f"Keyword analysis: {keyword_analysis}")
+            cached = self._get_cached_answer(query)
+            if cached is not None:
+                yield {
+                    "event": "sources",
+                    "data": {"query": query, "origin": cached["origin"], "sources": cached["sources"]}
+                }
+                yield {"event": "token", "data": {"text": cached["answer"]}}
+                yield {
+                    "event": "done",
+                    "data": {"query": query, "answer": cached["answer"], "origin": cached["origin"], "status": "success"}
+                }
+                return
             
-            # Query knowledge base first
-            app_logger.info("Querying knowledge base...")
-            raw_sources = vector_store_service.search(query, k=5, rerank=True)
-            origin = "knowledge_base"
+            selected = self._build_query_pipeline().run({"query": query}, ["sources"])["sources"]
+            raw_sources = selected["raw_sources"]
+            origin = selected["origin"]
             
-            # Check if knowledge base results are valid
-            if self._is_knowledge_base_result_invalid(raw_sources, query):
-                app_logger.info("Knowledge base results invalid, using online search...")
-                origin = "online_search"
-                raw_sources = online_search_service.search(query, max_results=3)
-                if not isinstance(raw_sources, list):
-                    raw_sources = []
-            else:
-                app_logger.info("Using knowledge base results")
+            yield {
+                "event": "sources",
+                "data": {
+                    "query": query,
+                    "origin": origin,
+                    "sources": [source.dict() for source in self._format_sources(raw_sources)]
+                }
+            }
             
-            # Filter relevant sources
-            relevant_sources = self._filter_relevant_sources(query, raw_sources)
-            sources_for_prompt = relevant_sources if relevant_sources else raw_sources
+            prompt = self._build_answer_prompt(query, self._select_prompt_sources(query, raw_sources))
+            answer_parts = []
+            for chunk in self.llm.stream(prompt):
+                if not chunk:
+                    continue
+                answer_parts.append(chunk)
+                yield {"event": "token", "data": {"text": chunk}}
             
-            # Generate answer
-            answer = self._generate_answer(query, sources_for_prompt, llm)
+            answer = "".join(answer_parts)
+            self._cache_answer(query, AssistantQueryResponse(
+                query=query,
+                response=answer,
+                answer=answer,
+                sources=self._format_sources(raw_sources),
+                raw_answer=raw_sources,
+                origin=origin,
+                status="success"
+            ).dict())
             
+            yield {
+                "event": "done",
+                "data": {
+                    "query": query,
+                    "answer": answer,
+                    "origin": origin,
+                    "status": "success"
+                }
+            }
+        except Exception as e:
+            app_logger.error(f"Error streaming query: {str(e)}")
+            yield {
+                "event": "error",
+                "data": {
+                    "query": query,
+                    "error": f"Sorry, an error occurred: {str(e)}",
+                    "origin": "error",
+                    "status": "error"
+                }
+            }
+    
+    def _get_cached_answer(self, query: str) -> Optional[Dict[str, Any]]:
+        """Get a cached answer payload for a query, if any."""
+        if self.runtime.answer_cache is None:
+            return None
+        cached = self.runtime.answer_cache.get(query)
+        if cached is not None:
+            app_logger.info(f"Answer cache hit for query: {query}")
+        return cached
+    
+    def _cache_answer(self, query: str, payload: Dict[str, Any]):
+        """Store a successful answer payload in the answer cache."""
+        if self.runtime.answer_cache is not None:
+            self.runtime.answer_cache.put(query, payload)
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get answer cache counters."""
+        if self.runtime.answer_cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.runtime.answer_cache.get_stats()}
+    
+    def _query_with_sources(self, query: str) -> Dict[str, Any]:
+        """Query with source tracking."""
+        try:
+            outputs = self._build_query_pipeline().run({"query": query}, ["answer", "sources"])
+            sources = outputs["sources"]
             return {
-                "answer": answer,
-                "raw_sources": raw_sources,
-                "origin": origin
+                "answer": outputs["answer"],
+                "raw_sources": sources["raw_sources"],
+                "origin": sources["origin"]
             }
         except Exception as e:
             app_logger.error(f"Error in query with sources: {str(e)}")
             raise
     
+    def _build_query_pipeline(self) -> QueryPipeline:
+        """
+        Build the retrieval/generation DAG for a query.
+        
+        Online search runs only when the knowledge base results fail the
+        relevance gate. With ASSISTANT_SPECULATIVE_ONLINE_SEARCH it starts
+        together with knowledge base retrieval instead, and is cancelled if
+        the knowledge base results are used.
+        """
+        def kb_search(run):
+            app_logger.info("Querying knowledge base...")
+            return vector_store_service.search(run.inputs["query"], k=5, rerank=True,
+                                               filters=self._time_filter(run.inputs["query"]))
+        
+        def online_search(run):
+            if run.is_cancelled("online_search"):
+                return []
+            app_logger.info("Querying online search...")
+            results = online_search_service.search(run.inputs["query"], max_results=3)
+            return results if isinstance(results, list) else []
+        
+        def kb_valid(run):
+            return not self._is_knowledge_base_result_invalid(run.get("kb_search"), run.inputs["query"])
+        
+        def select_sources(run):
+            if run.get("kb_valid"):
+                app_logger.info("Using knowledge base results")
+                run.cancel("online_search")
+                return {"raw_sources": run.get("kb_search"), "origin": "knowledge_base"}
+            app_logger.info("Knowledge base results invalid, using online search...")
+            return {"raw_sources": run.get("online_search"), "origin": "online_search"}
+        
+        def generate_answer(run):
+            query = run.inputs["query"]
+            sources_for_prompt = self._select_prompt_sources(query, run.get("sources")["raw_sources"])
+            return self._generate_answer(query, sources_for_prompt, self.llm)
+        
+        return QueryPipeline([
+            PipelineStage("kb_search", kb_search),
+            PipelineStage("online_search", online_search,
+                          speculative=settings.ASSISTANT_SPECULATIVE_ONLINE_SEARCH),
+            PipelineStage("kb_valid", kb_valid, requires=("kb_search",)),
+            PipelineStage("sources", select_sources, requires=("kb_search", "kb_valid"),
+                          optional=("online_search",)),
+            PipelineStage("answer", generate_answer, requires=("sources",)),
+        ], executor=self.runtime.executor)
+    
+    @staticmethod
+    def _time_filter(query: str) -> Optional[SearchFilter]:
+        """Publication date filter for queries naming a time window ("本周", "last 3 days")."""
+        if not settings.ASSISTANT_TIME_WINDOW_FILTER:
+            return None
+        window = parse_time_window(query)
+        if window is None:
+            return None
+        app_logger.info(f"Restricting knowledge base search to {window[0]:%Y-%m-%d} .. {window[1]:%Y-%m-%d}")
+        return SearchFilter(start=window[0], end=window[1])
+    
     def _is_knowledge_base_result_invalid(self, sources: List[dict], query: str) -> bool:
         """Check if knowledge base results are invalid."""
         if not isinstance(sources, list) or len(sources) == 0:
@@ -242,9 +456,36 @@ class AssistantService:
         if all_placeholder:
             return True
         
-        # Use LLM to check relevance
+        if settings.ASSISTANT_LLM_RELEVANCE_CHECK:
+            return self._is_irrelevant_by_llm(sources, query)
+        return not self._passes_relevance_gate(sources)
+    
+    def _passes_relevance_gate(self, sources: List[dict]) -> bool:
+        """
+        Decide knowledge base relevance from retrieval scores, without an LLM call.
+        
+        Reranked results are compared against KB_RERANK_RELEVANCE_THRESHOLD,
+        plain vector hits against KB_VECTOR_SIMILARITY_THRESHOLD. Results
+        without any score are accepted.
+        """
+        scored = False
+        for source in sources:
+            relevance = source.get("relevance")
+            if relevance is None:
+                continue
+            scored = True
+            threshold = (settings.KB_RERANK_RELEVANCE_THRESHOLD if "rerank_score" in source
+                         else settings.KB_VECTOR_SIMILARITY_THRESHOLD)
+            if relevance >= threshold:
+                return True
+        
+        if scored:
+            app_logger.info("Knowledge base results below relevance threshold")
+        return not scored
+    
+    def _is_irrelevant_by_llm(self, sources: List[dict], query: str) -> bool:
+        """Slow path: ask the LLM whether the results are relevant."""
         try:
-            llm = Ollama(model="qwen2.5:3b", temperature=0)
             relevance_prompt = f"""
             判断以下搜索结果是否与用户问题相关：
             
@@ -256,7 +497,7 @@ class AssistantService:
             请回答：相关/不相关
             """
             
-            relevance_check = llm.invoke(relevance_prompt)
+            relevance_check = self.llm.invoke(relevance_prompt)
             return "不相关" in relevance_check
         except Exception:
             return False
@@ -285,8 +526,17 @@ class AssistantService:
         
         return filtered
     
+    def _select_prompt_sources(self, query: str, raw_sources: List[dict]) -> List[dict]:
+        """Pick the sources to put in the answer prompt."""
+        relevant_sources = self._filter_relevant_sources(query, raw_sources)
+        return relevant_sources if relevant_sources else raw_sources
+    
     def _generate_answer(self, query: str, sources: List[dict], llm) -> str:
         """Generate answer based on sources."""
+        return llm.invoke(self._build_answer_prompt(query, sources))
+    
+    def _build_answer_prompt(self, query: str, sources: List[dict]) -> str:
+        """Build the answer generation prompt from sources."""
         def format_sources(sources):
             lines = []
             for i, source in enumerate(sources[:3], 1):
@@ -312,7 +562,7 @@ class AssistantService:
             "基于以上资料，给出直接答案："
         )
         
-        return llm.invoke(prompt)
+        return prompt
     
     def _format_sources(self, raw_sources: List[dict]) -> List[SearchResult]:
         """Format sources for response."""
@@ -325,10 +575,10 @@ class AssistantService:
                         title=source.get("metadata", {}).get("title", f"文档片段 {i + 1}"),
                         content=source.get("content", ""),
                         url="",
-                        score=1.0 - (i * 0.1),
+                        score=source.get("rerank_score", source.get("relevance", 1.0 - (i * 0.1))),
                         type="document",
                         source=source.get("metadata", {}).get("source", "知识库"),
-                        relevance=1.0 - (i * 0.1),
+                        relevance=source.get("relevance", 1.0 - (i * 0.1)),
                         timestamp=source.get("metadata", {}).get("pub_date", "")
                     ))
         return sources
@@ -355,7 +605,7 @@ class AssistantService:
     def store_documents_in_knowledge_base(self, documents: List[Dict[str, Any]]) -> KnowledgeBaseResponse:
         """Store documents in knowledge base."""
         try:
-            result = vector_store_service.add_documents(documents)
+            result = ingestion_queue.submit(documents).result()
             return KnowledgeBaseResponse(
                 result=result,
                 success=True,
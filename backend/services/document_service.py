@@ -1,7 +1,6 @@
 """
 Document service for document fetching and knowledge base operations.
 """
-import threading
 import datetime
 import time
 import re
@@ -11,7 +10,7 @@ from sqlmodel import Session, select, func, and_, or_, desc
 from bs4 import BeautifulSoup
 from models.source import Source, SourceType
 from models.document import Document
-from services.knowledge_base.vector_store_service import vector_store_service
+from services.knowledge_base.ingestion_queue import ingestion_queue
 from utils.logging_config import app_logger
 from utils.email_sender import send_notification_email
 from config.settings import settings
@@ -121,14 +120,13 @@ class DocumentService:
 
     def store_documents_in_knowledge_base(self, document_list: List[Dict[str, Any]]):
         """
-        Store documents in knowledge base (for execution in thread).
+        Queue documents for the knowledge base writer; returns without waiting for the write.
         """
         try:
-            # Execute write operation
-            result = vector_store_service.add_documents(document_list)
-            app_logger.info(f"Knowledge Base Tool Result: {result}")
+            ingestion_queue.submit(document_list)
+            app_logger.info(f"Queued {len(document_list)} documents for the knowledge base")
         except Exception as e:
-            app_logger.error(f"Failed to process documents for knowledge base: {str(e)}")
+            app_logger.error(f"Failed to queue documents for knowledge base: {str(e)}")
             # Continue with other tasks even if knowledge base storage fails
             pass
 
@@ -223,8 +221,8 @@ class DocumentService:
                 app_logger.warning(f"No entries found in RSS feed from {rss_source.url}")
                 return False
             
-            # Execute knowledge base storage in new thread
-            if document_list:  # Only create thread if there are documents to store
+            # Hand documents to the knowledge base writer
+            if document_list:
                 # Send email notification
                 try:
                     to_emails = settings.NOTIFICATION_EMAILS
@@ -238,13 +236,7 @@ class DocumentService:
                     # Continue with knowledge base storage even if email fails
                     pass
                 
-                kb_thread = threading.Thread(
-                    target=self.store_documents_in_knowledge_base, 
-                    args=(document_list,)
-                )
-                kb_thread.daemon = True  # Set as daemon thread, auto-end when main thread exits
-                kb_thread.start()
-                app_logger.info(f"Started background thread to store {len(document_list)} documents in knowledge base")
+                self.store_documents_in_knowledge_base(document_list)
             
             # Main process can continue with other tasks without blocking
             return True
@@ -459,15 +451,9 @@ class DocumentService:
                     "source_id": document.source_id
                 })
             
-            # Store in knowledge base in background thread
+            # Store in knowledge base through the ingestion queue
             if document_list:
-                kb_thread = threading.Thread(
-                    target=self.store_documents_in_knowledge_base, 
-                    args=(document_list,)
-                )
-                kb_thread.daemon = True
-                kb_thread.start()
-                app_logger.info(f"Started background thread to store {len(document_list)} Excel documents in knowledge base")
+                self.store_documents_in_knowledge_base(document_list)
             
             return {
                 "success": True,
@@ -495,26 +481,30 @@ class DocumentService:
         """
         try:
             deleted_count = 0
+            documents = []
             
             for doc_id in document_ids:
                 # Find the document
                 document = self.session.get(Document, doc_id)
                 if document:
-                    # Delete from knowledge base first (if exists)
-                    try:
-                        vector_store_service.delete_document(doc_id)
-                        app_logger.info(f"Deleted document {doc_id} from knowledge base")
-                    except Exception as e:
-                        app_logger.warning(f"Failed to delete document {doc_id} from knowledge base: {str(e)}")
-                    
-                    # Delete from database
-                    self.session.delete(document)
-                    self.session.commit()
-                    deleted_count += 1
-                    app_logger.info(f"Deleted document with ID: {doc_id}")
+                    documents.append(document)
                 else:
                     app_logger.warning(f"Document with ID {doc_id} not found")
             
+            # Delete all their chunks from the knowledge base in one batch, after any of their queued adds
+            if documents:
+                try:
+                    ingestion_queue.submit_delete([document.id for document in documents]).result()
+                except Exception as e:
+                    app_logger.warning(f"Failed to delete documents from knowledge base: {str(e)}")
+            
+            for document in documents:
+                # Delete from database
+                self.session.delete(document)
+                deleted_count += 1
+                app_logger.info(f"Deleted document with ID: {document.id}")
+            self.session.commit()
+            
             return {
                 "success": True,
                 "message": f"Successfully deleted {deleted_count} documents",
@@ -768,6 +758,12 @@ class DocumentService:
             if not document:
                 return False
             
+            # Delete chunks from the knowledge base first (after any queued add), in the same order as batch delete
+            try:
+                ingestion_queue.submit_delete([document_id]).result()
+            except Exception as e:
+                app_logger.warning(f"Failed to delete document {document_id} from knowledge base: {str(e)}")
+            
             self.session.delete(document)
             self.session.commit()
             app_logger.info(f"Deleted document with ID: {document_id}")
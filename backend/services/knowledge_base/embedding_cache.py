@@ -0,0 +1,154 @@
+"""
+Persistent embedding cache keyed by model and chunk content hash.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from utils.logging_config import app_logger
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed cache of embeddings keyed by (model_name, sha256(text)).
+
+    Vectors are stored as float32 blobs. Every hit refreshes the entry's
+    access time, and once the table grows past ``max_entries`` the least
+    recently used rows are deleted.
+
+    Args:
+        path: SQLite database file
+        max_entries: Maximum number of cached vectors
+    """
+
+    def __init__(self, path: str, max_entries: int = 500000):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._connection = None
+        self._count = 0
+        self.hits = 0
+        self.misses = 0
+        self._initialize()
+
+    def _initialize(self):
+        """Open the database and create the table if needed."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model_name TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (model_name, text_hash)
+            )
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)")
+        self._connection.commit()
+        self._count = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        app_logger.info(f"Embedding cache opened at {self.path} with {self._count} entries")
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """Content hash used as the cache key."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, model_name: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Look up cached vectors.
+
+        Returns:
+            One entry per text: the cached vector, or None on a miss
+        """
+        hashes = [self.hash_text(text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        unique_hashes = list(dict.fromkeys(hashes))
+
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(unique_hashes), 500):
+                chunk = unique_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._connection.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model_name = ? AND text_hash IN ({placeholders})",
+                    [model_name, *chunk]
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+            if found:
+                now = time.time()
+                self._connection.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE model_name = ? AND text_hash = ?",
+                    [(now, model_name, text_hash) for text_hash in found]
+                )
+                self._connection.commit()
+
+            results = [found.get(text_hash) for text_hash in hashes]
+            hit_count = sum(1 for result in results if result is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+            return results
+
+    def put_many(self, model_name: str, texts: List[str], vectors: List[List[float]]):
+        """Store vectors for texts, evicting least recently used rows beyond the bound."""
+        if not texts:
+            return
+        now = time.time()
+        rows = [
+            (model_name, self.hash_text(text), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            # Same model and content hash means the same vector, so existing rows are kept
+            cursor = self._connection.executemany(
+                "INSERT OR IGNORE INTO embeddings (model_name, text_hash, vector, last_access) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._connection.commit()
+            self._count += max(0, cursor.rowcount)
+            if self._count > self.max_entries:
+                self._evict(self._count - self.max_entries)
+
+    def _evict(self, count: int):
+        """Delete the ``count`` least recently used rows."""
+        self._connection.execute(
+            """
+            DELETE FROM embeddings WHERE rowid IN (
+                SELECT rowid FROM embeddings ORDER BY last_access ASC LIMIT ?
+            )
+            """,
+            (count,)
+        )
+        self._connection.commit()
+        self._count -= count
+        app_logger.info(f"Evicted {count} entries from embedding cache")
+
+    def get_stats(self) -> dict:
+        """Get cache size and hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": self._count,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
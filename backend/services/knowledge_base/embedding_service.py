@@ -4,7 +4,12 @@ Embedding service for text vectorization.
 import os
 import warnings
 from typing import List, Optional
-from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
+from services.knowledge_base.micro_batcher import MicroBatcher
+from services.knowledge_base.embedding_cache import EmbeddingCache
+from services.knowledge_base.onnx_embeddings import OnnxEmbeddings, ONNX_AVAILABLE
+from services.knowledge_base.model_metadata import ModelMetadata, describe_sentence_transformer
+from core.service_registry import service_registry
 from utils.logging_config import app_logger
 from config.settings import settings
 
@@ -13,15 +18,121 @@ warnings.filterwarnings("ignore", category=FutureWarning, module="huggingface_hu
 
 
 class EmbeddingService:
-    """Service for text embedding operations."""
+    """
+    Service for text embedding operations.
     
-    def __init__(self):
+    Args:
+        model_name: Model to load (defaults to EMBEDDING_MODEL_NAME)
+    """
+    
+    def __init__(self, model_name: Optional[str] = None):
         self.embeddings = None
-        self.model_name = settings.EMBEDDING_MODEL_NAME
+        self.model_name = model_name or settings.EMBEDDING_MODEL_NAME
+        self.backend = "torch"
+        self.metadata: Optional[ModelMetadata] = None
+        self._batcher = None
+        self._cache = None
         self._initialize_embeddings()
+        self._record_metadata()
+        if settings.EMBEDDING_CACHE_ENABLED:
+            try:
+                self._cache = EmbeddingCache(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MAX_ENTRIES)
+            except Exception as e:
+                app_logger.warning(f"Embedding cache unavailable, embedding without it: {str(e)}")
+        if settings.EMBEDDING_MICRO_BATCHING:
+            self._batcher = MicroBatcher(
+                self._embed_batch,
+                max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+                max_wait_ms=settings.EMBEDDING_BATCH_MAX_WAIT_MS,
+                name="embedding-batcher"
+            )
+        # LangChain-compatible view used by FAISS so its calls are batched too
+        self.langchain_embeddings = ServiceEmbeddings(self)
     
     def _initialize_embeddings(self):
-        """Initialize embedding model."""
+        """Initialize embedding model on the configured backend."""
+        if settings.EMBEDDING_BACKEND == "onnx" and self._load_onnx_backend():
+            return
+        self._initialize_torch_embeddings()
+        if settings.EMBEDDING_BACKEND == "onnx":
+            self._export_onnx_backend()
+    
+    def _load_onnx_backend(self) -> bool:
+        """Load an ONNX export that already passed its parity check, without loading torch."""
+        if not ONNX_AVAILABLE:
+            app_logger.warning("EMBEDDING_BACKEND=onnx but onnxruntime is not installed, using torch")
+            return False
+        try:
+            backend = OnnxEmbeddings.load(
+                settings.EMBEDDING_ONNX_DIR,
+                self.model_name,
+                quantized=settings.EMBEDDING_ONNX_QUANTIZE,
+                min_cosine=settings.EMBEDDING_ONNX_PARITY_THRESHOLD
+            )
+        except Exception as e:
+            app_logger.warning(f"Failed to load ONNX embedding backend: {str(e)}")
+            return False
+        if backend is None:
+            return False
+        self.embeddings = backend
+        self.backend = backend.backend_name
+        app_logger.info(f"Loaded {self.backend} embedding backend for model: {self.model_name}")
+        return True
+    
+    def _export_onnx_backend(self):
+        """
+        Export the loaded model to ONNX and switch to it if it matches torch.
+        
+        The torch model stays in use when the export fails or the minimum
+        cosine similarity on the parity corpus is below
+        EMBEDDING_ONNX_PARITY_THRESHOLD. A failed parity check is recorded,
+        and the export is not retried until the model or threshold changes.
+        """
+        if not ONNX_AVAILABLE:
+            return
+        try:
+            if OnnxEmbeddings.parity_failed(
+                settings.EMBEDDING_ONNX_DIR,
+                self.model_name,
+                quantized=settings.EMBEDDING_ONNX_QUANTIZE,
+                min_cosine=settings.EMBEDDING_ONNX_PARITY_THRESHOLD,
+                model_hash=self._torch_model_hash()
+            ):
+                app_logger.info("ONNX export of this model already failed its parity check, keeping torch embedding backend")
+                return
+            backend = OnnxEmbeddings.export(
+                settings.EMBEDDING_ONNX_DIR,
+                self.model_name,
+                cache_folder="./models_cache",
+                quantized=settings.EMBEDDING_ONNX_QUANTIZE
+            )
+            min_cosine = backend.verify_parity(self.embeddings, threshold=settings.EMBEDDING_ONNX_PARITY_THRESHOLD)
+        except Exception as e:
+            app_logger.warning(f"ONNX export failed, keeping torch embedding backend: {str(e)}")
+            return
+        
+        if min_cosine < settings.EMBEDDING_ONNX_PARITY_THRESHOLD:
+            app_logger.warning(
+                f"ONNX parity check failed (min cosine {min_cosine:.4f} < "
+                f"{settings.EMBEDDING_ONNX_PARITY_THRESHOLD}), keeping torch embedding backend"
+            )
+            return
+        
+        self.embeddings = backend
+        self.backend = backend.backend_name
+        app_logger.info(f"Switched to {self.backend} embedding backend (min cosine {min_cosine:.4f})")
+    
+    def _torch_model_hash(self) -> Optional[str]:
+        """Fingerprint of the loaded sentence-transformers model (as recorded with its ONNX export)."""
+        client = getattr(self.embeddings, "_client", None)
+        if client is None or not hasattr(client, "get_sentence_embedding_dimension"):
+            return None
+        return describe_sentence_transformer(client)["model_hash"]
+    
+    def _initialize_torch_embeddings(self):
+        """Initialize PyTorch embedding model."""
+        from langchain_huggingface import HuggingFaceEmbeddings
+        
         # List of fallback models
         embedding_models = [
             self.model_name,
@@ -50,10 +161,38 @@ class EmbeddingService:
             app_logger.error("All embedding models failed to load")
             raise Exception("Unable to load any embedding model")
     
+    def _record_metadata(self):
+        """Record dimension, sequence length, normalisation and model hash of the loaded model."""
+        if isinstance(self.embeddings, OnnxEmbeddings):
+            self.metadata = self.embeddings.get_metadata()
+        else:
+            client = getattr(self.embeddings, "_client", None)
+            if client is not None and hasattr(client, "get_sentence_embedding_dimension"):
+                self.metadata = ModelMetadata(
+                    model_name=self.model_name,
+                    backend=self.backend,
+                    **{key: value for key, value in describe_sentence_transformer(client).items()
+                       if key != "pooling_mode"}
+                )
+            else:
+                # Unknown model wrapper: measure the dimension once
+                self.metadata = ModelMetadata(
+                    model_name=self.model_name,
+                    dimension=len(self.embeddings.embed_query("test")),
+                    backend=self.backend
+                )
+        app_logger.info(
+            f"Embedding model metadata: dimension={self.metadata.dimension}, "
+            f"max_seq_length={self.metadata.max_seq_length}, normalize={self.metadata.normalize}"
+        )
+    
     def embed_texts(self, texts: List[str]) -> List[List[float]]:
         """
         Embed a list of texts.
         
+        With micro-batching enabled the texts are merged with concurrent
+        callers' requests into shared forward passes.
+        
         Args:
             texts: List of text strings to embed
             
@@ -62,8 +201,21 @@ class EmbeddingService:
         """
         try:
             app_logger.info(f"Embedding {len(texts)} texts using model: {self.model_name}")
-            embeddings = self.embeddings.embed_documents(texts)
-            app_logger.info(f"Successfully embedded {len(embeddings)} texts")
+            embeddings = self._cache.get_many(self.cache_key, texts) if self._cache else [None] * len(texts)
+            missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+            
+            if missing:
+                missing_texts = [texts[i] for i in missing]
+                if self._batcher is not None:
+                    computed = self._batcher.submit(missing_texts).result()
+                else:
+                    computed = self._embed_batch(missing_texts)
+                for i, embedding in zip(missing, computed):
+                    embeddings[i] = embedding
+                if self._cache:
+                    self._cache.put_many(self.cache_key, missing_texts, computed)
+            
+            app_logger.info(f"Successfully embedded {len(embeddings)} texts ({len(texts) - len(missing)} from cache)")
             return embeddings
         except Exception as e:
             app_logger.error(f"Error embedding texts: {str(e)}")
@@ -81,27 +233,80 @@ class EmbeddingService:
         """
         try:
             app_logger.info(f"Embedding query: '{query[:50]}...'")
-            embedding = self.embeddings.embed_query(query)
+            if self._batcher is not None:
+                embedding = self._batcher.submit_one(query).result()
+            else:
+                embedding = self.embeddings.embed_query(query)
             app_logger.info("Query embedding successful")
             return embedding
         except Exception as e:
             app_logger.error(f"Error embedding query: {str(e)}")
             raise
     
-    def get_embedding_dimension(self) -> int:
-        """Get the dimension of the embedding vectors."""
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed several query strings in one forward pass.
+        
+        Unlike embed_texts, queries bypass the persistent cache of
+        document embeddings.
+        
+        Args:
+            queries: Query strings to embed
+            
+        Returns:
+            Embedding vectors, in the order of ``queries``
+        """
         try:
-            # Test with a simple query to get dimension
-            test_embedding = self.embed_query("test")
-            return len(test_embedding)
+            app_logger.info(f"Embedding {len(queries)} queries")
+            if self._batcher is not None:
+                return self._batcher.submit(queries).result()
+            return self._embed_batch(queries)
         except Exception as e:
-            app_logger.error(f"Error getting embedding dimension: {str(e)}")
-            return 384  # Default dimension for most models
+            app_logger.error(f"Error embedding queries: {str(e)}")
+            raise
+    
+    @property
+    def cache_key(self) -> str:
+        """Embedding cache namespace; quantised backends do not share vectors with torch."""
+        return self.model_name if self.backend == "torch" else f"{self.model_name}@{self.backend}"
+    
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Run one forward pass over a batch of texts."""
+        return self.embeddings.embed_documents(texts)
+    
+    def get_cache_stats(self) -> dict:
+        """Get persistent embedding cache counters."""
+        if self._cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self._cache.get_stats()}
+    
+    def get_batching_stats(self) -> dict:
+        """Get micro-batching counters."""
+        if self._batcher is None:
+            return {"enabled": False}
+        return {"enabled": True, **self._batcher.get_stats()}
+    
+    def get_embedding_dimension(self) -> int:
+        """Get the dimension of the embedding vectors recorded when the model was loaded."""
+        return self.metadata.dimension
     
     def is_available(self) -> bool:
         """Check if embedding service is available."""
         return self.embeddings is not None
 
 
-# Global service instance
-embedding_service = EmbeddingService()
+class ServiceEmbeddings(Embeddings):
+    """LangChain Embeddings interface backed by an EmbeddingService."""
+    
+    def __init__(self, service: EmbeddingService):
+        self.service = service
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.service.embed_texts(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.service.embed_query(text)
+
+
+# Global service instance, loaded on first use
+embedding_service = service_registry.register("embedding", EmbeddingService)
@@ -0,0 +1,461 @@
+"""
+FAISS index factory: exact and approximate nearest-neighbour index types.
+
+Every index is ID-mapped: vectors are added with explicit int64 ids (IVF
+indexes store them natively, flat and HNSW indexes are wrapped in
+IndexIDMap2), so ids survive rebuilds and can be removed.
+
+Vectors of flat, IVF-flat and HNSW indexes can be stored as float32, as
+float16 ("fp16", half the memory) or scalar-quantised to 8 bits per
+dimension ("sq8", a quarter). IVF-PQ indexes always store PQ codes.
+"""
+import math
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+import numpy as np
+import faiss
+from utils.logging_config import app_logger
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+VECTOR_STORAGES = ("float32", "fp16", "sq8")
+
+_QUANTIZER_TYPES = {"fp16": faiss.ScalarQuantizer.QT_fp16, "sq8": faiss.ScalarQuantizer.QT_8bit}
+
+# FAISS needs roughly this many training points per IVF list
+MIN_POINTS_PER_LIST = 39
+
+
+def default_nlist(num_vectors: int) -> int:
+    """Number of IVF lists for a corpus size: ~4*sqrt(n), bounded by the training set size."""
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // MIN_POINTS_PER_LIST))
+
+
+def _pq_subquantizers(dimension: int, requested: int) -> int:
+    """Largest number of PQ sub-quantizers <= requested that divides the dimension."""
+    for m in range(min(requested, dimension), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+def build_index(index_type: str, dimension: int, num_vectors: int = 0, nlist: int = 0,
+                pq_m: int = 16, hnsw_m: int = 32, ef_construction: int = 40, storage: str = "float32") -> faiss.Index:
+    """
+    Create an empty ID-mapped L2 index of the requested type.
+
+    Args:
+        index_type: One of INDEX_TYPES
+        dimension: Vector dimension
+        num_vectors: Expected corpus size, used to pick nlist when it is 0
+        nlist: Number of IVF lists (0 = derive from num_vectors)
+        pq_m: Requested number of PQ sub-quantizers (IVF-PQ)
+        hnsw_m: Graph degree (HNSW)
+        ef_construction: Construction-time candidate list size (HNSW)
+        storage: One of VECTOR_STORAGES (ignored by IVF-PQ)
+
+    Returns:
+        The index; IVF and sq8 indexes still need ``train``
+    """
+    if storage not in VECTOR_STORAGES:
+        raise ValueError(f"Unknown vector storage: {storage} (expected one of {', '.join(VECTOR_STORAGES)})")
+    qtype = _QUANTIZER_TYPES.get(storage)
+    if index_type == "flat":
+        if qtype is None:
+            return faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+        return faiss.IndexIDMap2(faiss.IndexScalarQuantizer(dimension, qtype, faiss.METRIC_L2))
+    if index_type in ("ivf_flat", "ivf_pq"):
+        nlist = nlist or default_nlist(num_vectors)
+        quantizer = faiss.IndexFlatL2(dimension)
+        if index_type == "ivf_flat" and qtype is not None:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, qtype, faiss.METRIC_L2)
+        elif index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_L2)
+        else:
+            # 8-bit codebooks need 256 * 39 training points; use smaller ones on small corpora
+            nbits = max(4, min(8, int(math.log2(max(2, num_vectors // MIN_POINTS_PER_LIST)))))
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, _pq_subquantizers(dimension, pq_m), nbits)
+        # Keep the quantizer alive with the index (the Python wrapper does not own it)
+        index.own_fields = True
+        quantizer.this.disown()
+        # Id lookup for reconstruct and remove_ids
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return index
+    if index_type == "hnsw":
+        if qtype is None:
+            index = faiss.IndexHNSWFlat(dimension, hnsw_m)
+        else:
+            index = faiss.IndexHNSWSQ(dimension, qtype, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+        return faiss.IndexIDMap2(index)
+    raise ValueError(f"Unknown FAISS index type: {index_type} (expected one of {', '.join(INDEX_TYPES)})")
+
+
+def new_flat_index(dimension: int, storage: str = "float32") -> faiss.Index:
+    """
+    Empty flat index that accepts incremental adds.
+
+    An sq8 index needs its per-dimension value range before the first add;
+    without data to train on it uses [-1, 1], which holds every component
+    of a unit-length embedding. Indexes built from data by
+    build_trained_index are trained on it instead, with tighter ranges.
+    """
+    index = build_index("flat", dimension, storage=storage)
+    if not index.is_trained:
+        index.train(np.vstack([-np.ones(dimension), np.ones(dimension)]).astype(np.float32))
+    return index
+
+
+def _unwrap(index: faiss.Index) -> faiss.Index:
+    """The index doing the search, below any IndexIDMap wrapper."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def is_id_mapped(index: faiss.Index) -> bool:
+    """Whether vectors in the index are addressed by explicit ids."""
+    index = faiss.downcast_index(index)
+    return isinstance(index, (faiss.IndexIDMap2, faiss.IndexIVF))
+
+
+def index_type_of(index: faiss.Index) -> str:
+    """Name of an index's type as used by build_index."""
+    index = _unwrap(index)
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, (faiss.IndexIVFFlat, faiss.IndexIVFScalarQuantizer)):
+        return "ivf_flat"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, (faiss.IndexFlat, faiss.IndexScalarQuantizer)):
+        return "flat"
+    return type(index).__name__
+
+
+def storage_of(index: faiss.Index) -> str:
+    """How an index stores its vectors: one of VECTOR_STORAGES, or "pq"."""
+    index = _unwrap(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "pq"
+    if isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return "fp16" if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "float32"
+
+
+def code_size_of(index: faiss.Index) -> int:
+    """Bytes stored per vector by an index, excluding ids and graph links."""
+    inner = _unwrap(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner = faiss.downcast_index(inner.storage)
+    if isinstance(inner, faiss.IndexIVF) or hasattr(inner, "code_size"):
+        return int(inner.code_size)
+    return inner.d * 4
+
+
+def build_trained_index(index_type: str, vectors: np.ndarray, ids: Optional[np.ndarray] = None,
+                        **params) -> faiss.Index:
+    """
+    Build an index of the given type over ``vectors`` (trained when needed).
+
+    Args:
+        index_type: One of INDEX_TYPES
+        vectors: Vectors to index
+        ids: Id of each vector (defaults to its row number)
+        **params: Passed to build_index
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    ids = np.arange(len(vectors), dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+    started = time.perf_counter()
+    index = build_index(index_type, vectors.shape[1], num_vectors=len(vectors), **params)
+    if not index.is_trained:
+        index.train(vectors)
+    if len(vectors):
+        index.add_with_ids(vectors, ids)
+    app_logger.info(f"Built {index_type} index over {len(vectors)} vectors in {time.perf_counter() - started:.2f}s")
+    return index
+
+
+def stored_ids(index: faiss.Index) -> np.ndarray:
+    """Ids of the stored vectors, without reading the vectors (row numbers for plain indexes)."""
+    if index.ntotal == 0:
+        return np.zeros(0, dtype=np.int64)
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.vector_to_array(index.id_map).astype(np.int64)
+    if isinstance(index, faiss.IndexIVF):
+        lists = index.invlists
+        return np.concatenate([
+            faiss.rev_swig_ptr(lists.get_ids(list_no), lists.list_size(list_no)).copy()
+            for list_no in range(index.nlist) if lists.list_size(list_no)
+        ]).astype(np.int64)
+    return np.arange(index.ntotal, dtype=np.int64)
+
+
+def export_vectors(index: faiss.Index) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Read every stored vector back out of an index.
+
+    Quantised indexes return their decoded (approximate) vectors.
+
+    Returns:
+        (ids, vectors); plain indexes without ids report row numbers
+    """
+    if index.ntotal == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, index.d), dtype=np.float32)
+    ids = stored_ids(index)
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIDMap):
+        return ids, index.index.reconstruct_n(0, index.ntotal)
+    if isinstance(index, faiss.IndexIVF):
+        return ids, index.reconstruct_batch(ids)
+    return ids, index.reconstruct_n(0, index.ntotal)
+
+
+def remove_ids(index: faiss.Index, ids: np.ndarray, **params) -> faiss.Index:
+    """
+    Remove vectors by id.
+
+    HNSW graphs cannot delete nodes, so those indexes are rebuilt from the
+    remaining vectors; callers deleting repeatedly tombstone the rows
+    instead (tombstone_rows) and compact once.
+
+    Returns:
+        The index to use from now on (the same object unless rebuilt)
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    if not len(ids):
+        return index
+    if index_type_of(index) != "hnsw":
+        index.remove_ids(ids)
+        return index
+    return compact(index, set(tombstone_rows(index, ids, set())), **params)
+
+
+def tombstone_rows(index: faiss.Index, ids: np.ndarray, dead: Set[int]) -> List[int]:
+    """
+    Rows of an ID-mapped HNSW index holding the given ids that are not tombstoned yet.
+
+    Rows rather than ids are tombstoned: a re-ingested chunk is added back
+    under the id of its deleted row.
+    """
+    id_map = faiss.vector_to_array(faiss.downcast_index(index).id_map)
+    rows = np.flatnonzero(np.isin(id_map, np.asarray(ids, dtype=np.int64)))
+    return [int(row) for row in rows if int(row) not in dead]
+
+
+def compact(index: faiss.Index, dead: Set[int], **params) -> faiss.Index:
+    """Rebuild an HNSW index without its tombstoned rows."""
+    ids, vectors = export_vectors(index)
+    keep = np.ones(len(ids), dtype=bool)
+    keep[sorted(dead)] = False
+    return build_trained_index("hnsw", vectors[keep], ids[keep], **params)
+
+
+def search_live(index: faiss.Index, vectors: np.ndarray, k: int, params: Optional[faiss.SearchParameters],
+                dead: Set[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Search an index, skipping the tombstoned rows of an ID-mapped HNSW index.
+
+    With tombstones the HNSW index below the id map is searched with a
+    selector rejecting them (and accepting only the ids a caller selector
+    accepts), and the rows found are mapped back to ids.
+
+    Returns:
+        (distances, ids) as returned by ``index.search``
+    """
+    if not dead:
+        return index.search(vectors, k, params=params) if params else index.search(vectors, k)
+    mapped = faiss.downcast_index(index)
+    inner = faiss.downcast_index(mapped.index)
+    # References kept until the search returns: selectors only point at each other
+    tombstoned = faiss.IDSelectorBatch(np.asarray(sorted(dead), dtype=np.int64))
+    selector = live = faiss.IDSelectorNot(tombstoned)
+    requested = params.sel if params is not None else None
+    if requested is not None:
+        translated = faiss.IDSelectorTranslated(mapped.id_map, requested)
+        selector = faiss.IDSelectorAnd(translated, live)
+    inner_params = faiss.SearchParametersHNSW()
+    inner_params.efSearch = int(params.efSearch) if isinstance(params, faiss.SearchParametersHNSW) \
+        else int(inner.hnsw.efSearch)
+    inner_params.sel = selector
+    distances, rows = inner.search(np.ascontiguousarray(vectors, dtype=np.float32), k, params=inner_params)
+    id_map = faiss.vector_to_array(mapped.id_map)
+    return distances, np.where(rows >= 0, id_map[np.maximum(rows, 0)], -1)
+
+
+def search_parameters(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                      selector: Optional[faiss.IDSelector] = None) -> Optional[faiss.SearchParameters]:
+    """
+    Per-query search parameters for an index, or None when there are none.
+
+    Passing parameters per call (instead of setting ``index.nprobe``) keeps
+    concurrent queries with different settings independent. A ``selector``
+    restricts the search to the ids it accepts; the index skips every other
+    vector while scanning, so the k results all pass the filter. Ids are the
+    index's external ids (IndexIDMap translates them).
+    """
+    inner = _unwrap(index)
+    if isinstance(inner, faiss.IndexIVF) and (nprobe or selector is not None):
+        params = faiss.SearchParametersIVF()
+        params.nprobe = min(int(nprobe or inner.nprobe), inner.nlist)
+    elif isinstance(inner, faiss.IndexHNSW) and (ef_search or selector is not None):
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = int(ef_search or inner.hnsw.efSearch)
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+    if selector is not None:
+        params.sel = selector
+    return params
+
+
+def recall_at_k(reference: faiss.Index, candidate: faiss.Index, queries: np.ndarray, k: int = 10,
+                nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Measure recall@k of an approximate index against an exact one.
+
+    Recall is the fraction of the reference top-k ids that the candidate also
+    returns in its top-k, averaged over the queries.
+
+    Returns:
+        Dict with recall, mean latency per query (ms) and the parameters used
+    """
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    _, expected = reference.search(queries, k)
+    params = search_parameters(candidate, nprobe=nprobe, ef_search=ef_search)
+    started = time.perf_counter()
+    _, found = candidate.search(queries, k, params=params) if params else candidate.search(queries, k)
+    elapsed = time.perf_counter() - started
+    return {
+        "index_type": index_type_of(candidate),
+        "storage": storage_of(candidate),
+        "k": k,
+        "nprobe": nprobe,
+        "ef_search": ef_search,
+        "recall": _recall(expected, found),
+        "latency_ms": round(elapsed * 1000.0 / max(1, len(queries)), 4)
+    }
+
+
+def _recall(expected: np.ndarray, found: np.ndarray) -> float:
+    """Fraction of the expected ids (per row) that were found, over all rows."""
+    hits = 0
+    total = 0
+    for expected_ids, found_ids in zip(expected, found):
+        truth = {int(i) for i in expected_ids if i >= 0}
+        hits += len(truth & {int(i) for i in found_ids if i >= 0})
+        total += len(truth)
+    return round(hits / total, 4) if total else 0.0
+
+
+def rescore(query: np.ndarray, hits: List[Tuple[float, int]], vectors: Dict[int, np.ndarray],
+            k: int) -> List[Tuple[float, int]]:
+    """
+    Re-rank candidates of a quantised index by their full-precision distance.
+
+    Args:
+        query: Query vector, shape (dimension,)
+        hits: (approximate distance, id) candidates
+        vectors: Full-precision vector by id; candidates without one keep their distance
+        k: Number of results
+
+    Returns:
+        The k closest (distance, id) pairs
+    """
+    query = np.asarray(query, dtype=np.float32).reshape(-1)
+    exact = [
+        (float(np.sum((vectors[chunk_id] - query) ** 2)) if chunk_id in vectors else distance, chunk_id)
+        for distance, chunk_id in hits
+    ]
+    return sorted(exact)[:k]
+
+
+def quantization_recall(index: faiss.Index, ids: np.ndarray, vectors: np.ndarray, k: int = 10,
+                        num_queries: int = 100, rescore_factor: int = 4, nprobe: Optional[int] = None,
+                        ef_search: Optional[int] = None, seed: int = 42) -> Dict[str, Any]:
+    """
+    Recall@k of a quantised index against exact search over the full-precision vectors.
+
+    Queries are stored vectors with small Gaussian noise (as in benchmark).
+    When ``ids`` is a sample of the index, both searches are restricted to
+    it, so the index's own codes are evaluated without reading every
+    full-precision vector.
+
+    Args:
+        index: Index to evaluate
+        ids: Ids of (a sample of) the vectors in the index
+        vectors: Their full-precision vectors
+        rescore_factor: Candidates fetched per result before re-scoring
+        nprobe: IVF lists to visit
+        ef_search: HNSW candidate list size
+
+    Returns:
+        Dict with recall of the index alone and after re-scoring
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    ids = np.asarray(ids, dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)
+    queries = vectors[sample] + rng.normal(0, 0.01, size=(len(sample), vectors.shape[1])).astype(np.float32)
+
+    reference = build_index("flat", vectors.shape[1])
+    reference.add_with_ids(vectors, ids)
+    _, expected = reference.search(queries, k)
+    selector = faiss.IDSelectorBatch(ids) if len(ids) < index.ntotal else None
+    params = search_parameters(index, nprobe=nprobe, ef_search=ef_search, selector=selector)
+    _, found = index.search(queries, k, params=params) if params else index.search(queries, k)
+    distances, candidates = (
+        index.search(queries, k * max(1, rescore_factor), params=params) if params
+        else index.search(queries, k * max(1, rescore_factor))
+    )
+    by_id = dict(zip(ids.tolist(), vectors))
+    rescored = [
+        [chunk_id for _, chunk_id in rescore(query, [
+            (float(distance), int(chunk_id)) for distance, chunk_id in zip(row_distances, row_ids) if chunk_id >= 0
+        ], by_id, k)]
+        for query, row_distances, row_ids in zip(queries, distances, candidates)
+    ]
+    return {
+        "k": k,
+        "queries": len(queries),
+        "storage": storage_of(index),
+        "recall": _recall(expected, found),
+        "rescored_recall": _recall(expected, rescored),
+        "rescore_factor": rescore_factor
+    }
+
+
+def benchmark(vectors: np.ndarray, index_types: List[str], k: int = 10, num_queries: int = 200,
+              nprobe_values: List[int] = None, ef_search_values: List[int] = None,
+              seed: int = 42, **params) -> List[Dict[str, Any]]:
+    """
+    Compare index types against the flat index on a sample of the corpus.
+
+    Queries are stored vectors with small Gaussian noise, so each has a
+    known neighbourhood in the corpus.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)
+    queries = vectors[sample] + rng.normal(0, 0.01, size=(len(sample), vectors.shape[1])).astype(np.float32)
+
+    reference = build_trained_index("flat", vectors)
+    reports = [recall_at_k(reference, reference, queries, k)]
+    for index_type in index_types:
+        if index_type == "flat" and params.get("storage", "float32") == "float32":
+            continue
+        candidate = build_trained_index(index_type, vectors, **params)
+        if index_type == "flat":
+            sweep = [{}]
+        elif index_type == "hnsw":
+            sweep = [{"ef_search": value} for value in (ef_search_values or [16, 32, 64, 128])]
+        else:
+            sweep = [{"nprobe": value} for value in (nprobe_values or [1, 4, 16, 64])]
+        for setting in sweep:
+            reports.append(recall_at_k(reference, candidate, queries, k, **setting))
+    return reports
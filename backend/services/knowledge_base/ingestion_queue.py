@@ -0,0 +1,293 @@
+"""
+Single-writer ingestion queue for the vector store.
+"""
+import atexit
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List, Optional
+from config.settings import settings
+from utils.logging_config import app_logger
+
+
+class _IngestionBatch:
+    """Documents (or document ids to delete) submitted by one producer and the future resolving to the result."""
+
+    def __init__(self, documents: List[Any], operation: str = "add"):
+        self.documents = documents
+        self.operation = operation
+        self.future = Future()
+
+
+class IngestionQueue:
+    """
+    Bounded queue feeding every vector store write through one thread.
+
+    Producers (RSS fetches, Excel uploads, source collection) submit batches
+    and return immediately. The writer thread takes the oldest batch, then
+    coalesces whatever else is pending (up to ``max_batch_documents``,
+    waiting at most ``coalesce_ms`` for more) into a single write, so the
+    embed + add + persist cycle runs once per group instead of once per
+    producer. A document submitted twice in one group is written once, with
+    its latest content.
+
+    Deletes go through the same queue (``submit_delete``) so they apply in
+    submission order: a document deleted while its add is still queued is
+    removed after the add is written instead of before. Consecutive deletes
+    are merged into one call; adds are never coalesced across a delete.
+
+    The queue holds at most ``max_pending_documents`` documents; ``submit``
+    blocks while it is full, which slows producers down to the write rate.
+
+    Args:
+        write: Function storing a list of documents (``add_documents``)
+        delete: Function removing documents by id (``delete_documents``)
+        max_pending_documents: Queue capacity in documents
+        max_batch_documents: Maximum number of documents per write
+        coalesce_ms: Time to wait for more batches after the first one
+        name: Writer thread name, used in logs
+    """
+
+    def __init__(self, write: Callable[[List[Dict[str, Any]]], Any],
+                 delete: Optional[Callable[[List[int]], Any]] = None, max_pending_documents: int = 5000,
+                 max_batch_documents: int = 500, coalesce_ms: float = 200.0, name: str = "ingestion-writer"):
+        self.write = write
+        self.delete = delete
+        self.max_pending_documents = max(1, max_pending_documents)
+        self.max_batch_documents = max(1, max_batch_documents)
+        self.coalesce = max(0.0, coalesce_ms) / 1000.0
+        self.name = name
+        self._batches: Deque[_IngestionBatch] = deque()
+        self._pending_documents = 0
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self._closed = False
+        self.writes = 0
+        self.documents_written = 0
+        self.failed_writes = 0
+
+    def submit(self, documents: List[Dict[str, Any]], timeout: Optional[float] = None) -> Future:
+        """
+        Queue documents for writing, blocking while the queue is full.
+
+        Args:
+            documents: Document dictionaries as accepted by ``add_documents``
+            timeout: Maximum time to wait for space (None = wait indefinitely)
+
+        Returns:
+            Future resolving to the result of the write that included them
+
+        Raises:
+            RuntimeError: If the queue is shut down
+            TimeoutError: If no space became available within ``timeout``
+        """
+        batch = _IngestionBatch(list(documents))
+        if not batch.documents:
+            batch.future.set_result("No documents provided")
+            return batch.future
+        return self._enqueue(batch, timeout)
+
+    def submit_delete(self, document_ids: List[int], timeout: Optional[float] = None) -> Future:
+        """
+        Queue a deletion, ordered after every add submitted before it.
+
+        Args:
+            document_ids: Database ids of the documents to remove
+            timeout: Maximum time to wait for space (None = wait indefinitely)
+
+        Returns:
+            Future resolving to the result of the delete (number of chunks removed)
+
+        Raises:
+            RuntimeError: If the queue is shut down or has no delete function
+            TimeoutError: If no space became available within ``timeout``
+        """
+        if self.delete is None:
+            raise RuntimeError(f"{self.name} has no delete function")
+        batch = _IngestionBatch([int(document_id) for document_id in document_ids], operation="delete")
+        if not batch.documents:
+            batch.future.set_result(0)
+            return batch.future
+        return self._enqueue(batch, timeout)
+
+    def _enqueue(self, batch: _IngestionBatch, timeout: Optional[float]) -> Future:
+        """Append a batch, blocking while the queue is full."""
+        # A batch larger than the whole queue is admitted once the queue is empty
+        needed = min(len(batch.documents), self.max_pending_documents)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while not self._closed and self._pending_documents + needed > self.max_pending_documents:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"{self.name}: queue full ({self._pending_documents} documents pending)")
+                self._condition.wait(remaining)
+            if self._closed:
+                raise RuntimeError(f"{self.name} is shut down")
+            self._batches.append(batch)
+            self._pending_documents += len(batch.documents)
+            self._ensure_worker()
+            self._condition.notify_all()
+        return batch.future
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every queued document has been written.
+
+        Returns:
+            True if the queue drained within ``timeout``
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._batches or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def shutdown(self, timeout: Optional[float] = None):
+        """Stop accepting documents and write out everything already queued."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            pending = self._pending_documents
+            self._condition.notify_all()
+            worker = self._worker
+        if worker is not None:
+            if pending:
+                app_logger.info(f"{self.name}: flushing {pending} queued documents before shutdown")
+            worker.join(timeout=timeout)
+            if worker.is_alive():
+                app_logger.warning(f"{self.name}: shutdown timed out with {self._pending_documents} documents pending")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth and write counters."""
+        with self._condition:
+            return {
+                "pending_batches": len(self._batches),
+                "pending_documents": self._pending_documents,
+                "max_pending_documents": self.max_pending_documents,
+                "writes": self.writes,
+                "documents_written": self.documents_written,
+                "failed_writes": self.failed_writes,
+                "average_write_size": round(self.documents_written / self.writes, 2) if self.writes else 0.0
+            }
+
+    def _ensure_worker(self):
+        """Start the writer thread (caller holds the condition)."""
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._worker.start()
+
+    def _take_group(self) -> List[_IngestionBatch]:
+        """Wait for work and take the next group of batches; empty when shut down and drained."""
+        with self._condition:
+            while not self._batches and not self._closed:
+                self._condition.wait()
+            if not self._batches:
+                return []
+            # Give concurrent producers a moment to add to this write
+            deadline = time.monotonic() + self.coalesce
+            while not self._closed and self._pending_documents < self.max_batch_documents:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            group = [self._batches.popleft()]
+            size = len(group[0].documents)
+            # Only batches of the same operation are merged, so adds and deletes keep their order
+            while self._batches and self._batches[0].operation == group[0].operation \
+                    and size + len(self._batches[0].documents) <= self.max_batch_documents:
+                batch = self._batches.popleft()
+                group.append(batch)
+                size += len(batch.documents)
+            self._pending_documents -= size
+            self._in_flight += 1
+            # Space was freed for blocked producers
+            self._condition.notify_all()
+            return group
+
+    def _run(self):
+        while True:
+            group = self._take_group()
+            if not group:
+                return
+            try:
+                if group[0].operation == "delete":
+                    self._delete_group(group)
+                else:
+                    self._write_group(group)
+            finally:
+                with self._condition:
+                    self._in_flight -= 1
+                    self._condition.notify_all()
+
+    def _write_group(self, group: List[_IngestionBatch]):
+        # Later submissions of the same document win
+        documents: Dict[Any, Dict[str, Any]] = {}
+        for batch in group:
+            for document in batch.documents:
+                key = document.get("id", id(document))
+                documents.pop(key, None)
+                documents[key] = document
+        try:
+            result = self.write(list(documents.values()))
+        except Exception as e:
+            if len(group) > 1:
+                # Retry each batch alone (in submission order) so only the failing one reports the error
+                app_logger.warning(f"{self.name}: merged write of {len(group)} batches failed, "
+                                   f"retrying them one by one: {str(e)}")
+                for batch in group:
+                    self._write_group([batch])
+                return
+            self.failed_writes += 1
+            app_logger.error(f"{self.name}: failed to write {len(documents)} documents: {str(e)}")
+            group[0].future.set_exception(e)
+            return
+
+        self.writes += 1
+        self.documents_written += len(documents)
+        app_logger.info(f"{self.name}: wrote {len(documents)} documents from {len(group)} batches")
+        for batch in group:
+            batch.future.set_result(result)
+
+    def _delete_group(self, group: List[_IngestionBatch]):
+        document_ids = sorted({document_id for batch in group for document_id in batch.documents})
+        try:
+            result = self.delete(document_ids)
+        except Exception as e:
+            self.failed_writes += 1
+            app_logger.error(f"{self.name}: failed to delete {len(document_ids)} documents: {str(e)}")
+            for batch in group:
+                batch.future.set_exception(e)
+            return
+
+        app_logger.info(f"{self.name}: deleted {len(document_ids)} documents from {len(group)} batches")
+        for batch in group:
+            batch.future.set_result(result)
+
+
+def _write_to_vector_store(documents: List[Dict[str, Any]]) -> str:
+    # Imported here so the vector store (and its model) load on the first write
+    from services.knowledge_base.vector_store_service import vector_store_service
+    return vector_store_service.add_documents(documents)
+
+
+def _delete_from_vector_store(document_ids: List[int]) -> int:
+    from services.knowledge_base.vector_store_service import vector_store_service
+    return vector_store_service.delete_documents(document_ids)
+
+
+# Global ingestion queue; queued documents are written out on interpreter exit
+ingestion_queue = IngestionQueue(
+    _write_to_vector_store,
+    _delete_from_vector_store,
+    max_pending_documents=settings.INGESTION_QUEUE_MAX_DOCUMENTS,
+    max_batch_documents=settings.INGESTION_BATCH_MAX_DOCUMENTS,
+    coalesce_ms=settings.INGESTION_COALESCE_MS
+)
+atexit.register(ingestion_queue.shutdown, settings.INGESTION_SHUTDOWN_TIMEOUT)
@@ -0,0 +1,52 @@
+"""
+Tokenisation and rank fusion for lexical (BM25) retrieval.
+"""
+import re
+from typing import Dict, Hashable, List, Sequence, Tuple
+
+# Scripts written without spaces between words
+_CJK_CHARACTERS = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_CJK_RUN = re.compile(f"[{_CJK_CHARACTERS}]+")
+_TOKEN = re.compile(f"[{_CJK_CHARACTERS}]+|[^\\W_{_CJK_CHARACTERS}]+")
+# Terms of a query beyond this are ignored
+MAX_QUERY_TERMS = 64
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into index terms.
+
+    Words of space-separated scripts are lower-cased; runs of CJK
+    characters become overlapping character bigrams ("央行降息" -> 央行,
+    行降, 降息), which match Chinese words without a dictionary. A lone
+    CJK character is kept as is.
+    """
+    tokens = []
+    for run in _TOKEN.findall((text or "").lower()):
+        if _CJK_RUN.fullmatch(run) and len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def match_expression(query: str) -> str:
+    """FTS5 query matching chunks that contain any term of the query (empty when it has none)."""
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int = 60) -> List[Tuple[Hashable, float]]:
+    """
+    Merge rankings by reciprocal rank: each item scores the sum of 1 / (k + rank) over the rankings listing it.
+
+    Ties keep the order in which items first appear, so the first ranking wins them.
+
+    Returns:
+        (item, fused score) pairs, best first
+    """
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda entry: entry[1], reverse=True)
@@ -0,0 +1,202 @@
+"""
+Micro-batching of model calls from many threads into one forward pass.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+from utils.logging_config import app_logger
+
+
+class _BatchRequest:
+    """Items submitted by one caller and the future resolving to their outputs."""
+
+    def __init__(self, items: List[Any]):
+        self.items = items
+        self.future = Future()
+        # Items before this offset are taken into batches; outputs of the batches done so far
+        self.offset = 0
+        self.outputs: List[Any] = []
+
+    def remaining(self) -> int:
+        return len(self.items) - self.offset
+
+    def take(self, limit: int) -> List[Any]:
+        """Take the next ``limit`` items for a batch."""
+        items = self.items[self.offset:self.offset + limit]
+        self.offset += len(items)
+        return items
+
+
+class MicroBatcher:
+    """
+    Collects calls from many threads and runs them as batched model calls.
+
+    A dedicated worker thread takes the first pending request, then keeps
+    collecting requests until ``max_batch_size`` items are gathered or
+    ``max_wait_ms`` has passed, runs ``process_batch`` once on all the items
+    and hands each caller its slice of the outputs through a future.
+
+    A request larger than ``max_batch_size`` is processed one slice of that
+    size at a time, going back to the end of the queue after each slice, so
+    requests arriving meanwhile (single queries behind a large ingestion
+    batch) are not held up until all of it is done.
+
+    Args:
+        process_batch: Function mapping a list of items to a list of outputs
+            of the same length and order
+        max_batch_size: Maximum number of items per batched call
+        max_wait_ms: Maximum time to wait for more requests after the first one
+        name: Worker thread name, used in logs
+    """
+
+    def __init__(self, process_batch: Callable[[List[Any]], List[Any]], max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0, name: str = "micro-batcher"):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+        self._queue: "queue.Queue[Optional[_BatchRequest]]" = queue.Queue()
+        self._pending: Optional[_BatchRequest] = None
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._running = False
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, items: List[Any]) -> Future:
+        """
+        Submit items for batched processing.
+
+        Returns:
+            Future resolving to the outputs for ``items``, in order
+        """
+        request = _BatchRequest(list(items))
+        if not request.items:
+            request.future.set_result([])
+            return request.future
+        self._ensure_worker()
+        self._queue.put(request)
+        return request.future
+
+    def submit_one(self, item: Any) -> Future:
+        """Submit a single item; the future resolves to its output."""
+        result = Future()
+
+        def unwrap(batch_future: Future):
+            error = batch_future.exception()
+            if error is not None:
+                result.set_exception(error)
+            else:
+                result.set_result(batch_future.result()[0])
+
+        self.submit([item]).add_done_callback(unwrap)
+        return result
+
+    def shutdown(self, timeout: Optional[float] = None):
+        """Stop the worker after the requests already queued are processed."""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            self._queue.put(None)
+            worker = self._worker
+        if worker is not None:
+            worker.join(timeout=timeout)
+
+    def get_stats(self) -> dict:
+        """Get batching counters."""
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "average_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0
+        }
+
+    def _ensure_worker(self):
+        if self._running:
+            return
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            first = self._pending or self._queue.get()
+            self._pending = None
+            if first is None:
+                self._drain()
+                return
+            part = first.take(self.max_batch_size)
+            batch = [(first, part)]
+            size = len(part)
+            deadline = time.monotonic() + self.max_wait
+            stop = False
+
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                if size + request.remaining() > self.max_batch_size:
+                    # Keep it for the next batch rather than exceeding the limit
+                    self._pending = request
+                    break
+                part = request.take(request.remaining())
+                batch.append((request, part))
+                size += len(part)
+
+            self._process(batch, size)
+            if first.remaining() and not first.future.done():
+                # Rest of an oversized request: behind the requests that arrived meanwhile
+                self._queue.put(first)
+            if stop:
+                self._drain()
+                return
+
+    def _drain(self):
+        """Process whatever is still queued after a shutdown request."""
+        leftovers = [self._pending] if self._pending else []
+        self._pending = None
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                leftovers.append(request)
+        for request in leftovers:
+            while not request.future.done():
+                part = request.take(self.max_batch_size)
+                self._process([(request, part)], len(part))
+
+    def _process(self, batch: List[Tuple[_BatchRequest, List[Any]]], size: int):
+        items = [item for _, part in batch for item in part]
+        try:
+            outputs = self.process_batch(items)
+            if len(outputs) != len(items):
+                raise ValueError(f"Batch function returned {len(outputs)} outputs for {len(items)} items")
+        except Exception as e:
+            app_logger.error(f"{self.name}: batch of {size} items failed: {str(e)}")
+            for request, _ in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.items += size
+        offset = 0
+        for request, part in batch:
+            request.outputs.extend(outputs[offset:offset + len(part)])
+            offset += len(part)
+            if not request.remaining():
+                request.future.set_result(request.outputs)
@@ -0,0 +1,165 @@
+"""
+Embedding model metadata recorded at load time and persisted with the index.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+from utils.logging_config import app_logger
+
+
+class ModelMetadataMismatchError(RuntimeError):
+    """Raised when an index was built with a different embedding model."""
+
+
+class ModelMetadata:
+    """
+    Properties of an embedding model that an index depends on.
+
+    ``model_hash`` fingerprints the model architecture and configuration so
+    two models with the same name and dimension but different weights
+    revisions or pooling are told apart. The backend is informational only:
+    ONNX and PyTorch vectors of the same model share an index.
+
+    Args:
+        model_name: Model identifier
+        dimension: Embedding vector dimension
+        max_seq_length: Maximum number of tokens per input
+        normalize: Whether vectors are L2-normalised
+        model_hash: Fingerprint of the model configuration, if known
+        backend: Inference backend the vectors came from
+    """
+
+    # Fields that must match between the loaded model and the index
+    COMPATIBILITY_FIELDS = ("model_name", "dimension", "normalize", "model_hash")
+
+    def __init__(self, model_name: str, dimension: int, max_seq_length: Optional[int] = None,
+                 normalize: Optional[bool] = None, model_hash: Optional[str] = None,
+                 backend: str = "torch"):
+        self.model_name = model_name
+        self.dimension = int(dimension)
+        self.max_seq_length = max_seq_length
+        self.normalize = normalize
+        self.model_hash = model_hash
+        self.backend = backend
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "model_name": self.model_name,
+            "dimension": self.dimension,
+            "max_seq_length": self.max_seq_length,
+            "normalize": self.normalize,
+            "model_hash": self.model_hash,
+            "backend": self.backend
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ModelMetadata":
+        return cls(
+            model_name=data["model_name"],
+            dimension=data["dimension"],
+            max_seq_length=data.get("max_seq_length"),
+            normalize=data.get("normalize"),
+            model_hash=data.get("model_hash"),
+            backend=data.get("backend", "torch")
+        )
+
+    def mismatches(self, other: "ModelMetadata") -> List[str]:
+        """
+        Compare against another model's metadata.
+
+        Fields unknown on either side (None) are not compared.
+
+        Returns:
+            Descriptions of the incompatible fields, empty if compatible
+        """
+        differences = []
+        for field in self.COMPATIBILITY_FIELDS:
+            ours, theirs = getattr(self, field), getattr(other, field)
+            if ours is None or theirs is None:
+                continue
+            if ours != theirs:
+                differences.append(f"{field}: {theirs!r} != {ours!r}")
+        return differences
+
+    def save(self, path: str):
+        """Write the metadata atomically to a JSON file."""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["ModelMetadata"]:
+        """Read metadata from a JSON file, or None if it does not exist."""
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def describe_sentence_transformer(model) -> Dict[str, Any]:
+    """
+    Read the metadata of a loaded SentenceTransformer without running inference.
+
+    Returns:
+        Dict with dimension, max_seq_length, normalize, pooling_mode and model_hash
+    """
+    pooling_mode = "mean"
+    normalize = False
+    for module in model:
+        if type(module).__name__ == "Pooling":
+            pooling_config = module.get_config_dict()
+            if pooling_config.get("pooling_mode_cls_token"):
+                pooling_mode = "cls"
+            elif pooling_config.get("pooling_mode_max_tokens"):
+                pooling_mode = "max"
+        elif type(module).__name__ == "Normalize":
+            normalize = True
+
+    transformer = model._first_module()
+    fingerprint = hashlib.sha256()
+    fingerprint.update(repr(model).encode("utf-8"))
+    auto_model = getattr(transformer, "auto_model", None)
+    if auto_model is not None:
+        fingerprint.update(auto_model.config.to_json_string(use_diff=False).encode("utf-8"))
+        # Hub snapshot revision, when the model came from the hub cache
+        revision = getattr(auto_model.config, "_commit_hash", None)
+        if revision:
+            fingerprint.update(revision.encode("utf-8"))
+
+    return {
+        "dimension": model.get_sentence_embedding_dimension(),
+        "max_seq_length": model.max_seq_length,
+        "normalize": normalize,
+        "pooling_mode": pooling_mode,
+        "model_hash": fingerprint.hexdigest()
+    }
+
+
+def validate_index_metadata(index_metadata: Optional[ModelMetadata], model_metadata: ModelMetadata,
+                            index_dimension: int, source: str):
+    """
+    Fail fast if an index cannot be searched with the loaded model.
+
+    Args:
+        index_metadata: Metadata stored with the index, None for legacy indexes
+        model_metadata: Metadata of the loaded embedding model
+        index_dimension: Dimension of the FAISS index itself
+        source: Index location, used in the error message
+
+    Raises:
+        ModelMetadataMismatchError: If the model and index are incompatible
+    """
+    problems = []
+    if index_dimension != model_metadata.dimension:
+        problems.append(f"dimension: index has {index_dimension}, model produces {model_metadata.dimension}")
+    if index_metadata is not None:
+        problems.extend(model_metadata.mismatches(index_metadata))
+    if problems:
+        message = (
+            f"Vector store at {source} was built with a different embedding model "
+            f"({'; '.join(dict.fromkeys(problems))}). Rebuild the index or configure the original model."
+        )
+        app_logger.error(message)
+        raise ModelMetadataMismatchError(message)
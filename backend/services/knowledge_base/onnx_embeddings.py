@@ -0,0 +1,260 @@
+"""
+Quantised ONNX Runtime backend for sentence-transformers embedding models.
+"""
+import json
+import os
+import re
+from typing import List, Optional
+import numpy as np
+from services.knowledge_base.model_metadata import ModelMetadata, describe_sentence_transformer
+from utils.logging_config import app_logger
+
+# onnxruntime is optional; the torch backend is used when it is missing
+try:
+    import onnxruntime as ort
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+# Sentences used to compare ONNX vectors against the PyTorch reference
+PARITY_CORPUS = [
+    "人工智能在医疗领域的应用越来越广泛，包括医学影像诊断、药物发现等。",
+    "最新的股市行情显示，科技股表现强劲，投资者信心增强。",
+    "国家统计局发布上月居民消费价格指数，同比上涨0.4%。",
+    "暴雨导致多地航班延误，气象部门发布橙色预警。",
+    "The central bank kept interest rates unchanged at its latest policy meeting.",
+    "Researchers released an open-source language model trained on multilingual news.",
+    "The football club announced the signing of a new striker on a three-year contract.",
+    "Electric vehicle sales rose sharply in the third quarter, led by compact models.",
+    "新能源汽车出口量再创新高 New energy vehicle exports hit a record high",
+    "test",
+]
+
+
+def _safe_name(model_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+
+
+class OnnxEmbeddings:
+    """
+    Embeds texts with an ONNX export of a sentence-transformers model.
+
+    The transformer is exported once to ONNX, optionally quantised with
+    dynamic int8 weights, and run on onnxruntime's CPU provider. Pooling and
+    normalisation follow the original sentence-transformers pipeline, so
+    vectors stay interchangeable with the PyTorch backend within the
+    recorded parity.
+    """
+
+    MODEL_FILE = "model.onnx"
+    QUANTIZED_MODEL_FILE = "model.int8.onnx"
+    CONFIG_FILE = "embedding_config.json"
+    PARITY_FILE = "parity.json"
+
+    def __init__(self, model_dir: str, quantized: bool = True):
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, self.CONFIG_FILE), "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.model_dir = model_dir
+        self.quantized = quantized
+        self.model_path = os.path.join(model_dir, self.QUANTIZED_MODEL_FILE if quantized else self.MODEL_FILE)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.max_seq_length = self.config["max_seq_length"]
+        self.batch_size = 32
+
+    @property
+    def backend_name(self) -> str:
+        return "onnx-int8" if self.quantized else "onnx"
+
+    @classmethod
+    def model_dir_for(cls, export_root: str, model_name: str) -> str:
+        return os.path.join(export_root, _safe_name(model_name))
+
+    @classmethod
+    def load(cls, export_root: str, model_name: str, quantized: bool = True,
+             min_cosine: float = 0.99) -> Optional["OnnxEmbeddings"]:
+        """
+        Load a previously exported model whose parity check passed.
+
+        Returns:
+            The backend, or None if there is no export with a passing parity record
+        """
+        if not ONNX_AVAILABLE:
+            return None
+        model_dir = cls.model_dir_for(export_root, model_name)
+        parity = cls._read_parity(model_dir)
+        if not parity or parity.get("quantized") != quantized or parity.get("min_cosine", 0.0) < min_cosine:
+            return None
+        model_path = os.path.join(model_dir, cls.QUANTIZED_MODEL_FILE if quantized else cls.MODEL_FILE)
+        if not os.path.exists(model_path) or parity.get("model_size") != os.path.getsize(model_path):
+            app_logger.warning("ONNX model changed since its parity check, re-exporting")
+            return None
+        return cls(model_dir, quantized=quantized)
+
+    @classmethod
+    def parity_failed(cls, export_root: str, model_name: str, quantized: bool, min_cosine: float,
+                      model_hash: Optional[str]) -> bool:
+        """
+        Whether the export of this model already failed its parity check against this threshold.
+
+        Exporting again would give the same vectors, so the export is only
+        retried once the model (its hash) or the threshold changes.
+        """
+        parity = cls._read_parity(cls.model_dir_for(export_root, model_name))
+        return bool(parity) and parity.get("quantized") == quantized \
+            and parity.get("min_cosine", 0.0) < min_cosine \
+            and parity.get("threshold") == min_cosine \
+            and parity.get("model_hash") == model_hash
+
+    @classmethod
+    def export(cls, export_root: str, model_name: str, cache_folder: str,
+               quantized: bool = True) -> "OnnxEmbeddings":
+        """Export a sentence-transformers model to ONNX and optionally quantise it."""
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if not ONNX_AVAILABLE:
+            raise RuntimeError("onnxruntime is not installed")
+
+        model_dir = cls.model_dir_for(export_root, model_name)
+        os.makedirs(model_dir, exist_ok=True)
+        app_logger.info(f"Exporting embedding model {model_name} to ONNX in {model_dir}")
+
+        st_model = SentenceTransformer(model_name, device="cpu", cache_folder=cache_folder)
+        transformer = st_model._first_module()
+        description = describe_sentence_transformer(st_model)
+
+        transformer.tokenizer.save_pretrained(model_dir)
+        auto_model = transformer.auto_model.eval()
+        sample = transformer.tokenizer(["export sample"], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+        model_path = os.path.join(model_dir, cls.MODEL_FILE)
+        with torch.no_grad():
+            torch.onnx.export(
+                auto_model,
+                tuple(sample[name] for name in input_names),
+                model_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+                do_constant_folding=True
+            )
+
+        if quantized:
+            quantize_dynamic(model_path, os.path.join(model_dir, cls.QUANTIZED_MODEL_FILE), weight_type=QuantType.QInt8)
+
+        with open(os.path.join(model_dir, cls.CONFIG_FILE), "w", encoding="utf-8") as f:
+            json.dump({"model_name": model_name, **description}, f, indent=2)
+
+        # Invalidate any earlier parity record for this directory
+        parity_path = os.path.join(model_dir, cls.PARITY_FILE)
+        if os.path.exists(parity_path):
+            os.remove(parity_path)
+
+        app_logger.info(
+            f"ONNX export of {model_name} completed "
+            f"(pooling={description['pooling_mode']}, normalize={description['normalize']})"
+        )
+        return cls(model_dir, quantized=quantized)
+
+    def get_metadata(self) -> ModelMetadata:
+        """Model metadata recorded at export time."""
+        dimension = self.config.get("dimension")
+        if dimension is None:
+            # Exports made before the dimension was recorded: read the hidden size from the graph
+            dimension = self.session.get_outputs()[0].shape[-1]
+        return ModelMetadata(
+            model_name=self.config["model_name"],
+            dimension=dimension,
+            max_seq_length=self.max_seq_length,
+            normalize=self.config["normalize"],
+            model_hash=self.config.get("model_hash"),
+            backend=self.backend_name
+        )
+
+    def verify_parity(self, reference, corpus: List[str] = None, threshold: Optional[float] = None) -> float:
+        """
+        Compare this backend's vectors against a reference Embeddings object.
+
+        The minimum per-sentence cosine similarity is recorded next to the
+        model, with the threshold it was checked against, so later startups
+        can skip loading the reference model when it passed and skip the
+        export when it failed.
+
+        Returns:
+            Minimum cosine similarity over the corpus
+        """
+        corpus = corpus or PARITY_CORPUS
+        ours = np.asarray(self.embed_documents(corpus), dtype=np.float32)
+        theirs = np.asarray(reference.embed_documents(corpus), dtype=np.float32)
+        ours /= np.linalg.norm(ours, axis=1, keepdims=True) + 1e-12
+        theirs /= np.linalg.norm(theirs, axis=1, keepdims=True) + 1e-12
+        min_cosine = float(np.min(np.sum(ours * theirs, axis=1)))
+
+        with open(os.path.join(self.model_dir, self.PARITY_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "min_cosine": min_cosine,
+                "threshold": threshold,
+                "model_hash": self.config.get("model_hash"),
+                "quantized": self.quantized,
+                "corpus_size": len(corpus),
+                "model_size": os.path.getsize(self.model_path)
+            }, f, indent=2)
+        return min_cosine
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of texts."""
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.append(self._encode(texts[start:start + self.batch_size]))
+        if not vectors:
+            return []
+        return np.concatenate(vectors).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query string."""
+        return self.embed_documents([text])[0]
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            list(texts),
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors="np"
+        )
+        inputs = {name: encoded[name].astype(np.int64) for name in self.input_names if name in encoded}
+        hidden = self.session.run(["last_hidden_state"], inputs)[0]
+        mask = encoded["attention_mask"].astype(np.float32)[..., None]
+
+        if self.config["pooling_mode"] == "cls":
+            pooled = hidden[:, 0]
+        elif self.config["pooling_mode"] == "max":
+            pooled = np.where(mask > 0, hidden, -1e9).max(axis=1)
+        else:
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        if self.config["normalize"]:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+    @classmethod
+    def _read_parity(cls, model_dir: str) -> Optional[dict]:
+        path = os.path.join(model_dir, cls.PARITY_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
@@ -0,0 +1,221 @@
+"""
+Full re-index of the knowledge base from the documents table.
+"""
+import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+from sqlmodel import func, select
+from models.document import Document
+from core.database import db_manager
+from services.knowledge_base.embedding_service import EmbeddingService
+from services.knowledge_base.shard_index import ReadOnlyIndexError
+from services.knowledge_base.vector_store_service import VectorStoreService, vector_store_service
+from utils.logging_config import app_logger
+from config.settings import settings
+
+# Documents read per query when replaying writes made during a re-index
+_LOAD_BATCH_SIZE = 500
+
+
+def document_to_dict(document: Document) -> Dict[str, Any]:
+    """Document row in the form ``add_documents`` takes."""
+    return {
+        "id": document.id,
+        "title": document.title,
+        "link": document.link,
+        "description": document.description,
+        "tags": document.tags,
+        "pub_date": document.pub_date.isoformat() if document.pub_date else None,
+        "author": document.author,
+        "source_id": document.source_id
+    }
+
+
+class ReindexService:
+    """
+    Rebuild the vector store from the documents table without interrupting search.
+
+    Documents are read in pages ordered by id (each page continues after
+    the last id of the previous one), then chunked with the current
+    CHUNK_SIZE/CHUNK_OVERLAP and embedded by a pool of workers into a new
+    store directory, optionally with another embedding model. Searches
+    and ingestion keep using the live store meanwhile; documents written
+    to it during the run are replayed into the new store, which is then
+    swapped in atomically.
+
+    Args:
+        store: Live vector store (defaults to the global one)
+        session_factory: Context manager yielding database sessions
+    """
+
+    def __init__(self, store: Optional[VectorStoreService] = None,
+                 session_factory: Optional[Callable[[], Any]] = None):
+        self.store = store if store is not None else vector_store_service
+        self.session_factory = session_factory or db_manager.get_session
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._status: Dict[str, Any] = {"state": "idle"}
+
+    def start(self, model_name: Optional[str] = None, page_size: Optional[int] = None,
+              workers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Start a re-index in a background thread.
+
+        Args:
+            model_name: Embedding model of the new store (defaults to the live store's)
+            page_size: Documents read per page (defaults to REINDEX_PAGE_SIZE)
+            workers: Pages chunked and embedded concurrently (defaults to REINDEX_WORKERS)
+
+        Returns:
+            Status of the started job
+
+        Raises:
+            RuntimeError: If a re-index is already running
+            ReadOnlyIndexError: In reader processes
+        """
+        page_size = max(1, page_size or settings.REINDEX_PAGE_SIZE)
+        workers = max(1, workers or settings.REINDEX_WORKERS)
+        with self._lock:
+            if self._status["state"] == "running":
+                raise RuntimeError("A re-index is already running")
+            if self.store.read_only:
+                raise ReadOnlyIndexError("Re-index runs in the writer process")
+            self._status = {
+                "state": "running",
+                "model": model_name or self.store.embedding.model_name,
+                "store_path": None,
+                "total_documents": None,
+                "processed_documents": 0,
+                "chunks": 0,
+                "started_at": time.time(),
+                "finished_at": None,
+                "error": None
+            }
+            self._thread = threading.Thread(
+                target=self._run, args=(model_name, page_size, workers), name="vector-store-reindex", daemon=True
+            )
+            self._thread.start()
+        app_logger.info(f"Started re-index: model={model_name or 'current'}, page_size={page_size}, workers={workers}")
+        return self.get_status()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the running re-index; True once none is running."""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return self._status["state"] != "running"
+
+    def get_status(self) -> Dict[str, Any]:
+        """State and progress of the current or last re-index."""
+        with self._lock:
+            status = dict(self._status)
+        if status["state"] == "idle":
+            return status
+        elapsed = (status["finished_at"] or time.time()) - status["started_at"]
+        processed, total = status["processed_documents"], status["total_documents"]
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        status["elapsed_seconds"] = round(elapsed, 1)
+        status["documents_per_second"] = round(rate, 1)
+        status["progress"] = round(processed / total, 4) if total else None
+        status["eta_seconds"] = (
+            round((total - processed) / rate, 1) if status["state"] == "running" and total and rate > 0 else None
+        )
+        return status
+
+    def _update(self, **changes):
+        with self._lock:
+            self._status.update(changes)
+
+    def _run(self, model_name: Optional[str], page_size: int, workers: int):
+        """Build the new store, replay concurrent writes and swap it in."""
+        shadow = None
+        try:
+            # Writes from here on are replayed, so no page can miss a later change
+            self.store.begin_reindex()
+            embedding = self._embedding_for(model_name)
+            shadow = VectorStoreService(store_path=self.store.new_store_path(), embedding=embedding, mode="standalone")
+            self._update(store_path=shadow.store_path, total_documents=self._count_documents())
+            app_logger.info(f"Re-indexing documents into {shadow.store_path} with model {embedding.model_name}")
+
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reindex") as executor:
+                # Pages read ahead of the workers are bounded so memory stays flat on large tables
+                in_flight = deque()
+                for page in self._document_pages(page_size):
+                    in_flight.append(executor.submit(self._index_page, shadow, page))
+                    while len(in_flight) >= 2 * workers:
+                        in_flight.popleft().result()
+                while in_flight:
+                    in_flight.popleft().result()
+
+            self.store.swap_store(shadow, lambda document_ids: self._catch_up(shadow, document_ids))
+            # Live from here on: never removed below
+            live, shadow = shadow, None
+            self._update(state="completed", chunks=live.docstore.count(), finished_at=time.time())
+            app_logger.info(f"Re-index completed: {self.get_status()}")
+        except Exception as e:
+            app_logger.error(f"Re-index failed: {str(e)}")
+            self.store.abandon_reindex()
+            if shadow is not None:
+                shadow.index.close()
+                shadow.docstore.close()
+                shutil.rmtree(shadow.store_path, ignore_errors=True)
+            self._update(state="failed", error=str(e), finished_at=time.time())
+
+    def _embedding_for(self, model_name: Optional[str]):
+        """Embedding service of the new store: the live one, or the requested model."""
+        current = self.store.embedding
+        if not model_name or model_name == current.model_name:
+            return current
+        embedding = EmbeddingService(model_name)
+        if embedding.model_name != model_name:
+            # The service falls back to other models when one fails to load
+            raise ValueError(f"Embedding model {model_name} could not be loaded")
+        return embedding
+
+    def _index_page(self, shadow: VectorStoreService, page: List[Dict[str, Any]]):
+        """Chunk, embed and store one page of documents in the new store."""
+        shadow.add_documents(page)
+        with self._lock:
+            self._status["processed_documents"] += len(page)
+
+    def _catch_up(self, shadow: VectorStoreService, document_ids: Iterable[int]):
+        """Bring documents written during the re-index up to date in the new store (deleted ones are removed)."""
+        document_ids = sorted(document_ids)
+        shadow.delete_documents(document_ids)
+        documents = self._load_documents(document_ids)
+        if documents:
+            shadow.add_documents(documents)
+
+    def _count_documents(self) -> int:
+        with self.session_factory() as session:
+            return session.exec(select(func.count()).select_from(Document)).one()
+
+    def _document_pages(self, page_size: int) -> Iterator[List[Dict[str, Any]]]:
+        """Documents in id order, one page per query."""
+        last_id = 0
+        while True:
+            with self.session_factory() as session:
+                rows = session.exec(
+                    select(Document).where(Document.id > last_id).order_by(Document.id).limit(page_size)
+                ).all()
+                page = [document_to_dict(row) for row in rows]
+            if not page:
+                return
+            last_id = page[-1]["id"]
+            yield page
+
+    def _load_documents(self, document_ids: List[int]) -> List[Dict[str, Any]]:
+        documents = []
+        for start in range(0, len(document_ids), _LOAD_BATCH_SIZE):
+            batch = document_ids[start:start + _LOAD_BATCH_SIZE]
+            with self.session_factory() as session:
+                rows = session.exec(select(Document).where(Document.id.in_(batch))).all()
+                documents.extend(document_to_dict(row) for row in rows)
+        return documents
+
+
+# Global re-index job of this process's vector store
+reindex_service = ReindexService()
@@ -1,27 +1,59 @@
 """
 Reranking service for search result optimization.
 """
+import hashlib
+import math
 import warnings
-from typing import List, Tuple, Optional
-from sentence_transformers import CrossEncoder
+from typing import Any, Dict, Hashable, List, Tuple, Optional
+from services.knowledge_base.micro_batcher import MicroBatcher
+from core.service_registry import service_registry
+from utils.lru_cache import LRUCache
 from utils.logging_config import app_logger
 from config.settings import settings
 
 # Suppress warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
 
+# Token limit assumed when the model does not declare one
+DEFAULT_MAX_LENGTH = 512
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
 
 class RerankService:
-    """Service for reranking search results."""
+    """
+    Service for reranking search results.
+    
+    (query, chunk) pairs of concurrent callers are scored in shared
+    cross-encoder forward passes, and scores are kept in an LRU cache keyed
+    by the query and the chunk (its id and a digest of its text), so
+    repeated queries over the same chunks skip the model.
+    """
     
     def __init__(self):
         self.reranker = None
         self.model_name = settings.RERANK_MODEL_NAME
+        self.max_length = DEFAULT_MAX_LENGTH
+        self._batcher = None
+        self._cache = LRUCache(max_entries=settings.RERANK_CACHE_MAX_ENTRIES) if settings.RERANK_CACHE_MAX_ENTRIES > 0 else None
         self._initialize_reranker()
+        if self.reranker is not None:
+            self.max_length = getattr(self.reranker, "max_length", None) or DEFAULT_MAX_LENGTH
+            if settings.RERANK_MICRO_BATCHING:
+                self._batcher = MicroBatcher(
+                    self._predict_batch,
+                    max_batch_size=settings.RERANK_BATCH_MAX_SIZE,
+                    max_wait_ms=settings.RERANK_BATCH_MAX_WAIT_MS,
+                    name="rerank-batcher"
+                )
     
     def _initialize_reranker(self):
         """Initialize reranking model."""
         try:
+            from sentence_transformers import CrossEncoder
+            
             app_logger.info(f"Initializing reranker with model: {self.model_name}")
             self.reranker = CrossEncoder(self.model_name, device='cpu')
             app_logger.info("Reranker initialized successfully")
@@ -34,6 +66,9 @@ class RerankService:
         """
         Rerank search results based on query relevance.
         
+        Each returned result carries the raw cross-encoder score in
+        ``rerank_score`` and its calibrated probability in ``relevance``.
+        
         Args:
             query: Search query
             results: List of search results
@@ -49,19 +84,12 @@ class RerankService:
         try:
             app_logger.info(f"Reranking {len(results)} results for query: '{query[:50]}...'")
             
-            # Prepare sentence pairs for reranking
-            sentence_pairs = [[query, result.get("content", "")] for result in results]
-            
-            # Get reranking scores
-            scores = self.reranker.predict(sentence_pairs)
-            app_logger.info(f"Reranking scores calculated: {scores}")
-            
             # Combine results with scores and sort
-            results_with_scores = list(zip(results, scores))
-            results_with_scores.sort(key=lambda x: x[1], reverse=True)
+            results_with_scores = self.score_results(query, results)
+            results_with_scores.sort(key=lambda x: x["rerank_score"], reverse=True)
             
             # Return top-k results
-            reranked_results = [result for result, _ in results_with_scores[:top_k]]
+            reranked_results = results_with_scores[:top_k]
             app_logger.info(f"Reranking completed, returning top {len(reranked_results)} results")
             
             return reranked_results
@@ -70,6 +98,128 @@ class RerankService:
             app_logger.warning(f"Reranking failed: {str(e)}, using original results")
             return results[:top_k]
     
+    def score_results(self, query: str, results: List[dict]) -> List[dict]:
+        """
+        Score search results against a query, keeping their order.
+        
+        Returns:
+            Copies of the results with ``rerank_score`` and ``relevance``
+        """
+        return self.score_results_many([query], [results])[0]
+    
+    def score_results_many(self, queries: List[str], results: List[List[dict]]) -> List[List[dict]]:
+        """
+        Score the results of several queries, their uncached pairs in one forward pass.
+        
+        Args:
+            queries: Search queries
+            results: Results to score against each query
+            
+        Returns:
+            Copies of each query's results with ``rerank_score`` and ``relevance``, in their order
+        """
+        pair_queries = [query for query, query_results in zip(queries, results) for _ in query_results]
+        flat = [result for query_results in results for result in query_results]
+        scores = self._score_pairs(
+            pair_queries,
+            [result.get("content", "") for result in flat],
+            [self._chunk_key(result) for result in flat]
+        )
+        if scores:
+            app_logger.debug(f"Rerank scores: min={min(scores):.3f}, max={max(scores):.3f}")
+        scored = [
+            {**result, "rerank_score": float(score), "relevance": self.calibrate_score(float(score))}
+            for result, score in zip(flat, scores)
+        ]
+        grouped, start = [], 0
+        for query_results in results:
+            grouped.append(scored[start:start + len(query_results)])
+            start += len(query_results)
+        return grouped
+    
+    def score(self, query: str, texts: List[str], keys: Optional[List[Hashable]] = None) -> List[float]:
+        """
+        Cross-encoder scores of (query, text) pairs.
+        
+        Cached scores are reused; the remaining pairs are scored together
+        with concurrent callers' pairs when micro-batching is enabled.
+        
+        Args:
+            query: Search query
+            texts: Texts to score against the query
+            keys: Cache key of each text (defaults to a digest of the text)
+            
+        Returns:
+            Raw scores, in the order of ``texts``
+        """
+        return self._score_pairs([query] * len(texts), texts, keys)
+    
+    def _score_pairs(self, queries: List[str], texts: List[str], keys: Optional[List[Hashable]] = None) -> List[float]:
+        """Cross-encoder scores of (queries[i], texts[i]) pairs, reusing cached scores."""
+        keys = keys or [_digest(text) for text in texts]
+        query_hashes = {query: _digest(query) for query in set(queries)}
+        cache_keys = [(query_hashes[query], key) for query, key in zip(queries, keys)]
+        scores: List[Optional[float]] = (
+            [self._cache.get(cache_key) for cache_key in cache_keys] if self._cache is not None else [None] * len(texts)
+        )
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            pairs = [(queries[i], self._truncate(texts[i])) for i in missing]
+            if self._batcher is not None:
+                computed = self._batcher.submit(pairs).result()
+            else:
+                computed = self._predict_batch(pairs)
+            for i, score in zip(missing, computed):
+                scores[i] = score
+                if self._cache is not None:
+                    self._cache.put(cache_keys[i], score)
+        return scores
+    
+    def _predict_batch(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        """Score pairs in forward passes of at most RERANK_BATCH_MAX_SIZE pairs."""
+        scores = self.reranker.predict([list(pair) for pair in pairs], batch_size=settings.RERANK_BATCH_MAX_SIZE,
+                                       show_progress_bar=False)
+        return [float(score) for score in scores]
+    
+    def _truncate(self, text: str) -> str:
+        """
+        Cut text the model would truncate anyway, so tokenising does not run over the rest.
+        
+        RERANK_CHARS_PER_TOKEN characters per token keeps the cut beyond
+        the token limit for any script (CJK text is about one character per
+        token).
+        """
+        limit = self.max_length * settings.RERANK_CHARS_PER_TOKEN
+        return text if len(text) <= limit else text[:limit]
+    
+    @staticmethod
+    def _chunk_key(result: Dict[str, Any]) -> Hashable:
+        """Cache key of a search result: chunk id and text digest (re-ingested chunks are scored again)."""
+        metadata = result.get("metadata") or {}
+        return (metadata.get("document_id"), metadata.get("chunk"), _digest(result.get("content", "")))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get batching and score cache counters."""
+        return {
+            "available": self.is_available(),
+            "max_length": self.max_length,
+            "batching": {"enabled": True, **self._batcher.get_stats()} if self._batcher is not None else {"enabled": False},
+            "cache": {"enabled": True, **self._cache.get_stats()} if self._cache is not None else {"enabled": False}
+        }
+    
+    @staticmethod
+    def calibrate_score(score: float) -> float:
+        """
+        Map a raw cross-encoder logit to a relevance probability.
+        
+        Uses Platt scaling, sigmoid(a * score + b), with the coefficients from
+        RERANK_CALIBRATION_A / RERANK_CALIBRATION_B.
+        """
+        logit = settings.RERANK_CALIBRATION_A * score + settings.RERANK_CALIBRATION_B
+        # Clamp to keep math.exp in range for extreme logits
+        logit = max(-50.0, min(50.0, logit))
+        return 1.0 / (1.0 + math.exp(-logit))
+    
     def is_available(self) -> bool:
         """Check if reranking service is available."""
         return self.reranker is not None
@@ -80,4 +230,4 @@ class RerankService:
 
 
 # Global service instance
-rerank_service = RerankService()
+rerank_service = service_registry.register("rerank", RerankService)
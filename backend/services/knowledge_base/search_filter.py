@@ -0,0 +1,108 @@
+"""
+Metadata filters for vector store searches.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+
+def to_timestamp(value: Union[str, datetime, None]) -> Optional[float]:
+    """
+    Epoch seconds of a publication date (datetime or ISO 8601 string).
+
+    Naive values are taken as local time, on both the stored and the query
+    side, so they compare consistently.
+
+    Returns:
+        The timestamp, or None when the value is missing or unparsable
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    try:
+        return value.timestamp()
+    except (AttributeError, OverflowError, OSError, ValueError):
+        return None
+
+
+@dataclass
+class SearchFilter:
+    """
+    Restricts a vector search to chunks whose document matches every given field.
+
+    Attributes:
+        source_ids: Allowed source ids
+        start: Earliest publication date (inclusive)
+        end: Latest publication date (exclusive)
+        tags: Chunks must carry at least one of these tags
+    """
+
+    source_ids: List[int] = field(default_factory=list)
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    tags: List[str] = field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        return not (self.source_ids or self.start or self.end or self.tags)
+
+    def cache_key(self) -> Tuple:
+        """Hashable key identifying the filtered id set."""
+        return (
+            tuple(sorted(set(self.source_ids))),
+            to_timestamp(self.start),
+            to_timestamp(self.end),
+            tuple(sorted({normalize_tag(tag) for tag in self.tags}))
+        )
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> Optional["SearchFilter"]:
+        """
+        Build a filter from request/tool arguments.
+
+        Accepts ``source_id`` or ``source_ids``, ``start_date``/``end_date``
+        (ISO 8601) and ``tags`` (list or comma-separated string).
+
+        Raises:
+            ValueError: If a date cannot be parsed
+        """
+        if not data:
+            return None
+        source_ids = data.get("source_ids") or ([data["source_id"]] if data.get("source_id") is not None else [])
+        tags = data.get("tags") or []
+        if isinstance(tags, str):
+            tags = split_tags(tags)
+        search_filter = cls(
+            source_ids=[int(source_id) for source_id in source_ids],
+            start=_parse_date(data.get("start_date")),
+            end=_parse_date(data.get("end_date")),
+            tags=list(tags)
+        )
+        return None if search_filter.is_empty() else search_filter
+
+
+def normalize_tag(tag: str) -> str:
+    return tag.strip().lower()
+
+
+def split_tags(tags: Union[str, List[str], None]) -> List[str]:
+    """Tags of a document: comma-separated string (as stored in the database) or list."""
+    if not tags:
+        return []
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    return [normalize_tag(tag) for tag in tags if tag and tag.strip()]
+
+
+def _parse_date(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        raise ValueError(f"Invalid date: {value} (expected ISO 8601, e.g. 2024-05-01)")
@@ -0,0 +1,409 @@
+"""
+Append-only, crash-safe persistence for the FAISS index of the vector store.
+"""
+import json
+import os
+import pickle
+import struct
+import threading
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import numpy as np
+import faiss
+from services.knowledge_base.index_factory import compact, index_type_of, new_flat_index, remove_ids, tombstone_rows
+from utils.logging_config import app_logger
+
+# Record header: payload length and CRC32
+_HEADER = struct.Struct("<II")
+
+# Chunks found in stores written before the docstore moved to SQLite:
+# chunk id -> (docstore id, page_content, metadata)
+LegacyChunks = Dict[int, Tuple[str, str, Dict[str, Any]]]
+
+
+class SegmentStore:
+    """
+    On-disk layout of the FAISS index: a base snapshot plus delta logs.
+
+    * ``base-<gen>.faiss``: full index, written only by merges.
+    * ``log-<seq>.wal``: append-only records of added and removed vectors.
+      The highest-numbered log is the write-ahead log; older ones are
+      sealed, immutable segments.
+    * ``manifest.json``: which base and logs make up the store. It is
+      replaced atomically, so a crash at any point leaves a consistent store.
+
+    Ingesting appends one fsync'ed record (cost proportional to the batch).
+    Once the write-ahead log grows past ``wal_max_bytes`` it is sealed, and
+    once ``merge_min_segments`` segments exist a background merge folds them
+    into a new base. A torn record at the end of a log (crash mid-append) is
+    discarded on load.
+
+    Chunk texts are not stored here (see SQLiteDocstore); older stores that
+    kept them in ``base-<gen>.pkl`` and in the log records are still read,
+    and their chunks returned once by ``load`` for import.
+
+    Args:
+        directory: Store directory
+        wal_max_bytes: Size at which the write-ahead log is sealed
+        merge_min_segments: Number of sealed segments that triggers a merge
+        index_params: Index build parameters used when compacting replayed HNSW
+            deletes and, through ``storage``, for the empty index of a new store
+    """
+
+    MANIFEST_FILE = "manifest.json"
+
+    def __init__(self, directory: str, wal_max_bytes: int = 16 * 1024 * 1024, merge_min_segments: int = 4,
+                 index_params: Optional[Dict[str, Any]] = None):
+        self.directory = directory
+        self.wal_max_bytes = wal_max_bytes
+        self.merge_min_segments = max(1, merge_min_segments)
+        self.index_params = index_params or {}
+        self._lock = threading.Lock()
+        # Serialises base writes between checkpoints and background merges
+        self._base_lock = threading.Lock()
+        self._manifest: Dict[str, Any] = {"base": None, "merged_upto": -1, "segments": [], "wal": 0}
+        self._wal_file = None
+        self._merge_thread: Optional[threading.Thread] = None
+        # Base referenced by the latest publication to read-only processes; kept until the next one
+        self._pinned_base: Optional[int] = None
+        self.merges = 0
+        os.makedirs(directory, exist_ok=True)
+
+    # Paths
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _log_path(self, seq: int) -> str:
+        return self._path(f"log-{seq:08d}.wal")
+
+    def _base_paths(self, generation: int) -> Tuple[str, str]:
+        # The .pkl docstore snapshot is only written by the older format
+        return self._path(f"base-{generation:08d}.faiss"), self._path(f"base-{generation:08d}.pkl")
+
+    def exists(self) -> bool:
+        """Whether a store has been written to the directory."""
+        return os.path.exists(self._path(self.MANIFEST_FILE))
+
+    # Loading
+
+    def load(self, dimension: int) -> Tuple[faiss.Index, LegacyChunks]:
+        """
+        Load the base snapshot and replay every log on top of it.
+
+        Args:
+            dimension: Vector dimension, used when there is no base yet
+
+        Returns:
+            (index, chunks kept in the store by the older format)
+        """
+        with open(self._path(self.MANIFEST_FILE), "r", encoding="utf-8") as f:
+            self._manifest = json.load(f)
+
+        legacy: LegacyChunks = {}
+        if self._manifest["base"] is None:
+            index = new_flat_index(dimension, self.index_params.get("storage", "float32"))
+        else:
+            index_path, docs_path = self._base_paths(self._manifest["base"])
+            index = faiss.read_index(index_path)
+            if os.path.exists(docs_path):
+                with open(docs_path, "rb") as f:
+                    docs, mapping = pickle.load(f)
+                legacy = {chunk_id: (docstore_id, *docs[docstore_id]) for chunk_id, docstore_id in mapping.items()}
+
+        replayed = 0
+        # HNSW rows deleted by the logs, dropped in one rebuild after the replay
+        dead: Set[int] = set()
+        for seq in self._manifest["segments"] + [self._manifest["wal"]]:
+            for record in self._read_log(seq, truncate=seq == self._manifest["wal"]):
+                index = self._apply(record, index, legacy, dead)
+                replayed += 1
+        if dead:
+            index = compact(index, dead, **self.index_params)
+        app_logger.info(
+            f"Loaded vector store from {self.directory}: {index.ntotal} vectors, "
+            f"{len(self._manifest['segments'])} segments, {replayed} log records replayed"
+        )
+        return index, legacy
+
+    def load_mapped(self) -> Optional[faiss.Index]:
+        """
+        Memory-map the base snapshot read-only, without replaying logs.
+
+        Only possible when no log holds records, since replaying would
+        modify the mapped index. The returned index must never be written
+        to (FAISS aborts the process on writes to mapped storage).
+
+        Returns:
+            The mapped index, or None when there is no base or logs are pending
+        """
+        with open(self._path(self.MANIFEST_FILE), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest["base"] is None or self._has_pending_logs(manifest):
+            return None
+        self._manifest = manifest
+        return self.read_base(manifest["base"])
+
+    def read_base(self, generation: int) -> faiss.Index:
+        """
+        Memory-map a base snapshot read-only.
+
+        Raises:
+            FileNotFoundError: If the base has been replaced and deleted
+        """
+        index_path, _ = self._base_paths(generation)
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(index_path)
+        # MMAP_IFC maps flat code storage (flat, SQ, HNSW vectors), MMAP maps IVF lists
+        return faiss.read_index(index_path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_MMAP)
+
+    def _has_pending_logs(self, manifest: Dict[str, Any]) -> bool:
+        """Whether any log of a manifest holds records not in its base."""
+        return any(
+            os.path.exists(self._log_path(seq)) and os.path.getsize(self._log_path(seq))
+            for seq in manifest["segments"] + [manifest["wal"]]
+        )
+
+    def has_pending_logs(self) -> bool:
+        with self._lock:
+            return self._has_pending_logs(self._manifest)
+
+    def _read_log(self, seq: int, truncate: bool = False) -> List[Dict[str, Any]]:
+        """Read the records of a log, dropping a torn tail."""
+        path = self._log_path(seq)
+        if not os.path.exists(path):
+            return []
+        records = []
+        with open(path, "rb") as f:
+            data = f.read()
+        offset = 0
+        while offset + _HEADER.size <= len(data):
+            length, crc = _HEADER.unpack_from(data, offset)
+            payload = data[offset + _HEADER.size:offset + _HEADER.size + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            records.append(pickle.loads(payload))
+            offset += _HEADER.size + length
+        if offset < len(data):
+            app_logger.warning(f"Discarding {len(data) - offset} bytes of incomplete records in {path}")
+            if truncate:
+                with open(path, "r+b") as f:
+                    f.truncate(offset)
+        return records
+
+    def _apply(self, record: Dict[str, Any], index: faiss.Index, legacy: LegacyChunks, dead: Set[int]) -> faiss.Index:
+        """Apply one log record to the index; deleted HNSW rows are added to ``dead`` instead of removed."""
+        if record["op"] == "add":
+            index.add_with_ids(record["vectors"], record["ids"])
+            if "docs" in record:
+                for chunk_id, docstore_id, entry in zip(record["ids"].tolist(), record["docstore_ids"], record["docs"]):
+                    legacy[chunk_id] = (docstore_id, *entry)
+        elif record["op"] == "delete":
+            if index_type_of(index) == "hnsw":
+                dead.update(tombstone_rows(index, record["ids"], dead))
+            else:
+                index = remove_ids(index, record["ids"], **self.index_params)
+            for chunk_id in record["ids"].tolist():
+                legacy.pop(chunk_id, None)
+        return index
+
+    # Appending
+
+    def append_add(self, ids: np.ndarray, vectors: np.ndarray):
+        """Durably log added vectors."""
+        self._append({
+            "op": "add",
+            "ids": np.asarray(ids, dtype=np.int64),
+            "vectors": np.ascontiguousarray(vectors, dtype=np.float32)
+        })
+
+    def append_delete(self, ids: np.ndarray):
+        """Durably log removed vectors."""
+        self._append({"op": "delete", "ids": np.asarray(ids, dtype=np.int64)})
+
+    def _append(self, record: Dict[str, Any]):
+        payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if self._wal_file is None:
+                self._wal_file = open(self._log_path(self._manifest["wal"]), "ab")
+            self._wal_file.write(_HEADER.pack(len(payload), zlib.crc32(payload)))
+            self._wal_file.write(payload)
+            self._wal_file.flush()
+            os.fsync(self._wal_file.fileno())
+            if self._wal_file.tell() >= self.wal_max_bytes:
+                self._seal_wal()
+
+    def _seal_wal(self):
+        """Turn the write-ahead log into an immutable segment (caller holds the lock)."""
+        if self._wal_file is not None:
+            self._wal_file.close()
+            self._wal_file = None
+        if not os.path.exists(self._log_path(self._manifest["wal"])):
+            return
+        manifest = dict(self._manifest)
+        manifest["segments"] = self._manifest["segments"] + [self._manifest["wal"]]
+        manifest["wal"] = self._manifest["wal"] + 1
+        self._write_manifest(manifest)
+
+    def needs_merge(self) -> bool:
+        return len(self._manifest["segments"]) >= self.merge_min_segments
+
+    # Merging
+
+    def checkpoint(self, index: faiss.Index):
+        """
+        Write the given index as the new base and drop every log it covers.
+
+        The caller must hold whatever lock keeps the state and the logs in
+        step, i.e. no appends may happen during the call.
+        """
+        with self._lock:
+            self._seal_wal()
+            merged_upto = self._manifest["wal"] - 1
+        # Always written: the index may hold changes the logs do not (e.g. a new index type)
+        self._write_base(faiss.serialize_index(index), merged_upto, force=True)
+
+    def merge_in_background(self, snapshot: Callable[[], faiss.Index], state_lock: threading.RLock) -> bool:
+        """
+        Start a background merge of the base and segments into a new base.
+
+        Args:
+            snapshot: Returns the current index; called with ``state_lock``
+                held so it matches the sealed logs exactly
+            state_lock: Lock serialising state changes and appends
+
+        Returns:
+            True if a merge was started
+        """
+        with self._lock:
+            if self._merge_thread is not None and self._merge_thread.is_alive():
+                return False
+
+            def run():
+                try:
+                    with state_lock:
+                        # Serialise under the lock; the live index keeps changing afterwards
+                        index_bytes = faiss.serialize_index(snapshot())
+                        with self._lock:
+                            self._seal_wal()
+                            merged_upto = self._manifest["wal"] - 1
+                    self._write_base(index_bytes, merged_upto)
+                except Exception as e:
+                    app_logger.error(f"Vector store merge failed: {str(e)}")
+
+            self._merge_thread = threading.Thread(target=run, name="vector-store-merge", daemon=True)
+            self._merge_thread.start()
+            return True
+
+    def wait_for_merge(self, timeout: Optional[float] = None):
+        thread = self._merge_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def pin_base(self) -> Optional[int]:
+        """
+        Keep the current base on disk for read-only processes until the next pin.
+
+        Returns:
+            The pinned base generation (None if there is no base)
+        """
+        with self._base_lock:
+            previous = self._pinned_base
+            current = self._manifest["base"]
+            self._pinned_base = current
+        if previous is not None and previous != current:
+            for path in self._base_paths(previous):
+                if os.path.exists(path):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+        return current
+
+    def _write_base(self, index_bytes: np.ndarray, merged_upto: int, force: bool = False):
+        """Write a new base covering every log up to ``merged_upto`` and swap the manifest."""
+        with self._base_lock:
+            latest = self._manifest.get("merged_upto", -1)
+            if merged_upto < latest or (merged_upto == latest and not force):
+                # A newer checkpoint already covers this state
+                return
+            generation = (self._manifest["base"] or 0) + 1
+            index_path, _ = self._base_paths(generation)
+            self._write_file(index_path, index_bytes.tobytes())
+
+            with self._lock:
+                old_base = self._manifest["base"]
+                merged = [seq for seq in self._manifest["segments"] if seq <= merged_upto]
+                manifest = dict(self._manifest)
+                manifest["base"] = generation
+                manifest["merged_upto"] = merged_upto
+                manifest["segments"] = [seq for seq in self._manifest["segments"] if seq > merged_upto]
+                self._write_manifest(manifest)
+                self.merges += 1
+
+        # The new manifest no longer references these files
+        stale = [self._log_path(seq) for seq in merged]
+        if old_base is not None and old_base != self._pinned_base:
+            stale.extend(self._base_paths(old_base))
+        for path in stale:
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        app_logger.info(f"Vector store base {generation} written ({len(merged)} segments merged)")
+
+    def _write_manifest(self, manifest: Dict[str, Any]):
+        self._write_file(self._path(self.MANIFEST_FILE), json.dumps(manifest, indent=2).encode("utf-8"))
+        self._manifest = manifest
+
+    def _write_file(self, path: str, data: bytes):
+        """Write a file atomically: temp file, fsync, rename, fsync directory."""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        self._fsync_directory()
+
+    def _fsync_directory(self):
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            # Not supported on Windows
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def initialize(self):
+        """Write an empty manifest for a new store."""
+        with self._lock:
+            self._write_manifest({"base": None, "merged_upto": -1, "segments": [], "wal": 0})
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get segment counts and sizes."""
+        with self._lock:
+            wal_path = self._log_path(self._manifest["wal"])
+            return {
+                "base_generation": self._manifest["base"],
+                "segments": len(self._manifest["segments"]),
+                "segment_bytes": sum(
+                    os.path.getsize(self._log_path(seq)) for seq in self._manifest["segments"]
+                    if os.path.exists(self._log_path(seq))
+                ),
+                "wal_bytes": os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+                "merges": self.merges
+            }
+
+    def close(self):
+        """Close the write-ahead log."""
+        self.wait_for_merge()
+        with self._lock:
+            if self._wal_file is not None:
+                self._wal_file.close()
+                self._wal_file = None
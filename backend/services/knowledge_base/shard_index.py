@@ -0,0 +1,531 @@
+"""
+Time-partitioned FAISS index: one shard per month (or week) of publication date.
+"""
+import heapq
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import numpy as np
+import faiss
+from services.knowledge_base.index_factory import (
+    build_trained_index, code_size_of, compact, index_type_of, remove_ids, search_live, storage_of, tombstone_rows
+)
+from services.knowledge_base.segment_store import SegmentStore
+from utils.logging_config import app_logger
+
+SHARD_GRANULARITIES = ("month", "week", "none")
+# Shard of chunks without a publication date
+UNDATED_SHARD = "undated"
+# The single shard used when partitioning is disabled
+ALL_SHARD = "all"
+
+
+class ReadOnlyIndexError(RuntimeError):
+    """A write was attempted on an index opened read-only."""
+
+
+def shard_key_for(pub_ts: Optional[float], granularity: str = "month") -> str:
+    """
+    Shard holding chunks published at ``pub_ts`` (epoch seconds, local time).
+
+    Keys are ``YYYY-MM`` for months and ISO ``YYYY-Www`` for weeks.
+    """
+    if granularity == "none":
+        return ALL_SHARD
+    if pub_ts is None:
+        return UNDATED_SHARD
+    moment = datetime.fromtimestamp(pub_ts)
+    if granularity == "week":
+        year, week, _ = moment.isocalendar()
+        return f"{year}-W{week:02d}"
+    return f"{moment.year:04d}-{moment.month:02d}"
+
+
+def shard_range(key: str) -> Optional[Tuple[datetime, datetime]]:
+    """Publication period [start, end) covered by a shard, or None for undated/unpartitioned shards."""
+    try:
+        if "-W" in key:
+            year, week = key.split("-W")
+            start = datetime.fromisocalendar(int(year), int(week), 1)
+            return start, start + timedelta(days=7)
+        year, month = (int(part) for part in key.split("-"))
+        start = datetime(year, month, 1)
+        return start, datetime(year + month // 12, month % 12 + 1, 1)
+    except ValueError:
+        return None
+
+
+class _Shard:
+    """One partition: its on-disk store and, when loaded, its index."""
+
+    def __init__(self, key: str, store: SegmentStore):
+        self.key = key
+        self.store = store
+        self.index: Optional[faiss.Index] = None
+        self.mapped = False
+        self.last_used = 0.0
+        self.range = shard_range(key)
+        # Published base generation (read-only indexes)
+        self.base: Optional[int] = None
+        # Deleted rows of an HNSW index, skipped by searches until the next checkpoint or merge
+        self.tombstones: Set[int] = set()
+
+
+class ShardedIndex:
+    """
+    Chunk vectors partitioned by publication period, each partition a
+    separately persisted FAISS index (see SegmentStore).
+
+    Searches visit shards newest first and merge their top-k. Once k
+    results are at least as close as ``stop_distance``, older shards are
+    skipped, so queries answered by recent news do not scan the archive;
+    a date filter skips shards outside its window altogether.
+
+    The ``hot_shards`` newest shards stay in memory. Older shards are
+    loaded on demand, memory-mapped read-only when ``mmap_cold`` is set and
+    they have no pending log records, and unloaded least recently used
+    first beyond ``max_loaded_shards``.
+
+    HNSW graphs cannot delete nodes: deleted rows are tombstoned, skipped
+    by searches, and dropped when the shard is checkpointed or merged.
+
+    Publication: the writing process calls ``publish`` to checkpoint the
+    shards with pending log records and atomically replace
+    ``published.json``, which names one base snapshot per shard. Indexes
+    opened with ``read_only`` serve only published bases, memory-mapped,
+    so every reading process shares their pages through the page cache;
+    ``refresh`` swaps in a newer publication without disturbing searches
+    in flight.
+
+    Args:
+        directory: Directory holding one sub-directory per shard
+        dimension: Vector dimension
+        granularity: One of SHARD_GRANULARITIES
+        hot_shards: Number of newest shards kept loaded
+        max_loaded_shards: Maximum number of loaded shards (0 = unbounded)
+        mmap_cold: Memory-map older shards instead of reading them into memory
+        index_params: Index build parameters (vector storage of new shards, HNSW rebuilds)
+        wal_max_bytes: Passed to each shard's SegmentStore
+        merge_min_segments: Passed to each shard's SegmentStore
+        read_only: Serve published bases only; every write raises ReadOnlyIndexError
+    """
+
+    PUBLISHED_FILE = "published.json"
+
+    def __init__(self, directory: str, dimension: int, granularity: str = "month", hot_shards: int = 3,
+                 max_loaded_shards: int = 24, mmap_cold: bool = True, index_params: Optional[Dict[str, Any]] = None,
+                 wal_max_bytes: int = 16 * 1024 * 1024, merge_min_segments: int = 4, read_only: bool = False):
+        if granularity not in SHARD_GRANULARITIES:
+            raise ValueError(f"Unknown shard granularity: {granularity} (expected one of {', '.join(SHARD_GRANULARITIES)})")
+        self.directory = directory
+        self.dimension = dimension
+        self.granularity = granularity
+        self.hot_shards = max(1, hot_shards)
+        self.max_loaded_shards = max_loaded_shards
+        self.mmap_cold = mmap_cold
+        self.index_params = index_params or {}
+        self.wal_max_bytes = wal_max_bytes
+        self.merge_min_segments = merge_min_segments
+        self.read_only = read_only
+        self._shards: Dict[str, _Shard] = {}
+        self._lock = threading.RLock()
+        self.published_generation = 0
+        self.searches = 0
+        self.shards_searched = 0
+        self.early_stops = 0
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+
+    # Shard bookkeeping
+
+    def exists(self) -> bool:
+        """Whether any shard has been written to the directory."""
+        return os.path.isdir(self.directory) and any(
+            os.path.exists(os.path.join(self.directory, name, SegmentStore.MANIFEST_FILE))
+            for name in os.listdir(self.directory)
+        )
+
+    def open(self):
+        """Discover the shards on disk and load the hot ones (the latest publication when read-only)."""
+        if self.read_only:
+            self.refresh()
+            return
+        self.published_generation = (self._read_published() or {}).get("generation", 0)
+        with self._lock:
+            for name in sorted(os.listdir(self.directory)):
+                if os.path.exists(os.path.join(self.directory, name, SegmentStore.MANIFEST_FILE)):
+                    self._shards[name] = self._new_shard(name)
+            for shard in self._ordered()[:self.hot_shards]:
+                self._load(shard)
+        app_logger.info(f"Opened {len(self._shards)} index shards from {self.directory}")
+
+    def _new_shard(self, key: str) -> _Shard:
+        return _Shard(key, SegmentStore(
+            os.path.join(self.directory, key),
+            wal_max_bytes=self.wal_max_bytes,
+            merge_min_segments=self.merge_min_segments,
+            index_params=self.index_params
+        ))
+
+    def _ordered(self) -> List[_Shard]:
+        """Shards newest first; undated and unpartitioned shards last."""
+        dated = sorted((s for s in self._shards.values() if s.range), key=lambda s: s.range[0], reverse=True)
+        return dated + [s for s in self._shards.values() if not s.range]
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return [shard.key for shard in self._ordered()]
+
+    def key_for(self, pub_ts: Optional[float]) -> str:
+        return shard_key_for(pub_ts, self.granularity)
+
+    def _is_hot(self, shard: _Shard) -> bool:
+        return shard in self._ordered()[:self.hot_shards]
+
+    def _load(self, shard: _Shard, writable: bool = False) -> faiss.Index:
+        """Loaded index of a shard (caller holds the lock); mapped shards are read back in for writes."""
+        shard.last_used = time.monotonic()
+        if shard.index is not None and not (writable and shard.mapped):
+            return shard.index
+        if self.read_only:
+            return self._load_published(shard)
+        index = None
+        if not writable and self.mmap_cold and not self._is_hot(shard):
+            index = shard.store.load_mapped()
+        shard.mapped = index is not None
+        if index is None:
+            index, _ = shard.store.load(self.dimension)
+        shard.index = index
+        self._evict()
+        return index
+
+    def _evict(self):
+        """Unload least recently used cold shards beyond max_loaded_shards."""
+        if not self.max_loaded_shards:
+            return
+        loaded = [s for s in self._shards.values() if s.index is not None]
+        excess = len(loaded) - self.max_loaded_shards
+        if excess <= 0:
+            return
+        hot = set(s.key for s in self._ordered()[:self.hot_shards])
+        for shard in sorted((s for s in loaded if s.key not in hot), key=lambda s: s.last_used)[:excess]:
+            # Everything is in the shard's base and logs, so it can be reloaded at any time
+            shard.index = None
+            shard.mapped = False
+            shard.tombstones = set()
+
+    def _compact(self, shard: _Shard) -> faiss.Index:
+        """Rebuild a shard's HNSW index without its tombstoned rows (caller holds the lock)."""
+        if shard.tombstones:
+            shard.index = compact(shard.index, shard.tombstones, **self.index_params)
+            shard.tombstones = set()
+        return shard.index
+
+    def index_for(self, key: str, writable: bool = False) -> Optional[faiss.Index]:
+        """Index of a shard, loading it if needed; None if the shard does not exist."""
+        with self._lock:
+            shard = self._shards.get(key)
+            return self._load(shard, writable) if shard else None
+
+    def _writable_shard(self, key: str) -> _Shard:
+        """A shard ready for writes, created if needed."""
+        if self.read_only:
+            raise ReadOnlyIndexError(f"Index at {self.directory} is read-only in this process")
+        shard = self._shards.get(key)
+        if shard is None:
+            shard = self._new_shard(key)
+            shard.store.initialize()
+            self._shards[key] = shard
+        self._load(shard, writable=True)
+        return shard
+
+    # Writes (callers serialise them)
+
+    def add(self, key: str, ids: np.ndarray, vectors: np.ndarray):
+        """Durably add vectors to a shard."""
+        # Under the lock so the shard cannot be unloaded between logging and adding
+        with self._lock:
+            shard = self._writable_shard(key)
+            shard.store.append_add(ids, vectors)
+            shard.index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), np.asarray(ids, dtype=np.int64))
+
+    def remove(self, key: str, ids: np.ndarray):
+        """Durably remove vectors from a shard."""
+        with self._lock:
+            if key not in self._shards:
+                return
+            shard = self._writable_shard(key)
+            shard.store.append_delete(ids)
+            if index_type_of(shard.index) == "hnsw":
+                shard.tombstones.update(tombstone_rows(shard.index, ids, shard.tombstones))
+            else:
+                shard.index = remove_ids(shard.index, ids, **self.index_params)
+
+    def replace(self, key: str, index: faiss.Index):
+        """Replace a shard's index (e.g. with an ANN index) and checkpoint it."""
+        with self._lock:
+            shard = self._writable_shard(key)
+            shard.index = index
+            shard.mapped = False
+            shard.tombstones = set()
+        shard.store.checkpoint(index)
+
+    def import_vectors(self, ids: np.ndarray, vectors: np.ndarray, keys: List[str]):
+        """Partition vectors of an unsharded index into shards, checkpointing each."""
+        keys = np.asarray(keys, dtype=object)
+        for key in sorted(set(keys.tolist())):
+            selected = keys == key
+            self.replace(key, build_trained_index("flat", vectors[selected], ids[selected], **self.index_params))
+        app_logger.info(f"Partitioned {len(ids)} vectors into {len(set(keys.tolist()))} shards")
+
+    def checkpoint(self):
+        """Write every loaded, writable shard as a new base snapshot."""
+        if self.read_only:
+            return
+        with self._lock:
+            shards = [s for s in self._shards.values() if s.index is not None and not s.mapped]
+        for shard in shards:
+            with self._lock:
+                index = self._compact(shard)
+            shard.store.checkpoint(index)
+
+    # Publication
+
+    def _published_path(self) -> str:
+        return os.path.join(self.directory, self.PUBLISHED_FILE)
+
+    def _read_published(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._published_path(), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def publish(self) -> int:
+        """
+        Publish the current contents to read-only processes.
+
+        Shards with pending log records are checkpointed first, so each
+        published shard is a single base that can be memory-mapped. The
+        caller must keep writes out for the duration (see checkpoint).
+
+        Returns:
+            The new publication generation
+        """
+        with self._lock:
+            bases = {}
+            for shard in self._ordered():
+                if shard.store.has_pending_logs() or shard.store.get_stats()["base_generation"] is None:
+                    self._load(shard, writable=True)
+                    shard.store.checkpoint(self._compact(shard))
+                bases[shard.key] = shard.store.pin_base()
+            self.published_generation += 1
+            published = {
+                "generation": self.published_generation,
+                "granularity": self.granularity,
+                "published_at": time.time(),
+                "shards": bases
+            }
+            temp_path = f"{self._published_path()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(published, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            # Readers see either the previous or the new file, never a partial one
+            os.replace(temp_path, self._published_path())
+        app_logger.info(f"Published index generation {self.published_generation} ({len(bases)} shards)")
+        return self.published_generation
+
+    def refresh(self) -> bool:
+        """
+        Switch a read-only index to the latest publication.
+
+        The new shard set replaces the old one in a single assignment;
+        searches already running finish on the shards they started with.
+
+        Returns:
+            True if a newer publication was loaded
+        """
+        published = self._read_published()
+        if published is None or published["generation"] == self.published_generation:
+            return False
+        shards = {}
+        for key, base in published["shards"].items():
+            shard = self._new_shard(key)
+            shard.base = base
+            shards[key] = shard
+        with self._lock:
+            previous = self._shards
+            self._shards = shards
+            self.published_generation = published["generation"]
+            for shard in self._ordered()[:self.hot_shards]:
+                # Unchanged shards keep their mapping
+                old = previous.get(shard.key)
+                if old is not None and old.base == shard.base and old.index is not None:
+                    shard.index, shard.mapped = old.index, True
+                else:
+                    self._load(shard)
+        app_logger.info(f"Loaded published index generation {self.published_generation} ({len(shards)} shards)")
+        return True
+
+    def _load_published(self, shard: _Shard) -> faiss.Index:
+        """Memory-map a shard's published base (caller holds the lock)."""
+        try:
+            index = shard.store.read_base(shard.base)
+        except FileNotFoundError:
+            # Replaced by a publication newer than ours: move to it
+            app_logger.warning(f"Published base of shard {shard.key} is gone, refreshing")
+            if not self.refresh() or shard.key not in self._shards:
+                raise
+            return self._load(self._shards[shard.key])
+        shard.index = index
+        shard.mapped = True
+        self._evict()
+        return index
+
+    def merge_if_needed(self, key: str, state_lock: threading.RLock):
+        """Start a background merge of a shard's sealed logs when due."""
+        shard = self._shards.get(key)
+        if shard is not None and shard.store.needs_merge():
+            shard.store.merge_in_background(lambda: self._merge_snapshot(shard), state_lock)
+
+    def _merge_snapshot(self, shard: _Shard) -> faiss.Index:
+        """The shard's index for a merge, tombstoned rows dropped."""
+        with self._lock:
+            self._load(shard, writable=True)
+            return self._compact(shard)
+
+    # Search
+
+    def search(self, vector: np.ndarray, k: int,
+               params_for: Callable[[faiss.Index], Optional[faiss.SearchParameters]],
+               window: Optional[Tuple[Optional[datetime], Optional[datetime]]] = None,
+               stop_distance: Optional[float] = None) -> List[Tuple[float, int]]:
+        """
+        Search shards newest first and merge their results.
+
+        Args:
+            vector: Query vector, shape (1, dimension)
+            k: Number of results
+            params_for: Search parameters for a shard's index
+            window: Publication window (start, end); shards outside it are skipped
+            stop_distance: Skip older shards once the k-th result is this close
+
+        Returns:
+            (distance, chunk id) pairs, closest first
+        """
+        return self.search_batch(vector[:1], k, params_for, window=window, stop_distance=stop_distance)[0]
+
+    def search_batch(self, vectors: np.ndarray, k: int,
+                     params_for: Callable[[faiss.Index], Optional[faiss.SearchParameters]],
+                     window: Optional[Tuple[Optional[datetime], Optional[datetime]]] = None,
+                     stop_distance: Optional[float] = None) -> List[List[Tuple[float, int]]]:
+        """
+        Search several queries at once: one FAISS search over the query matrix per shard.
+
+        Older shards are skipped once every query's k-th result is within
+        ``stop_distance``.
+
+        Args:
+            vectors: Query vectors, shape (queries, dimension)
+
+        Returns:
+            (distance, chunk id) pairs of each query, closest first
+        """
+        with self._lock:
+            shards = self._ordered()
+        best: List[List[Tuple[float, int]]] = [[] for _ in range(len(vectors))]
+        searched = 0
+        for shard in shards:
+            if window and not self._overlaps(shard, window):
+                continue
+            with self._lock:
+                index = self._load(shard)
+                # Copied: a concurrent delete must not change the set during the search
+                tombstones = set(shard.tombstones)
+            if index.ntotal - len(tombstones) == 0:
+                continue
+            params = params_for(index)
+            distances, ids = search_live(index, vectors, k, params, tombstones)
+            searched += 1
+            best = [
+                heapq.nsmallest(k, hits + [
+                    (float(distance), int(chunk_id)) for distance, chunk_id in zip(row_distances, row_ids) if chunk_id != -1
+                ])
+                for hits, row_distances, row_ids in zip(best, distances, ids)
+            ]
+            if stop_distance is not None and all(len(hits) == k and hits[-1][0] <= stop_distance for hits in best):
+                if shard is not shards[-1]:
+                    self.early_stops += 1
+                break
+        self.searches += len(vectors)
+        self.shards_searched += searched * len(vectors)
+        return best
+
+    @staticmethod
+    def _overlaps(shard: _Shard, window: Tuple[Optional[datetime], Optional[datetime]]) -> bool:
+        if shard.range is None:
+            # Undated chunks never match a date filter; an unpartitioned shard may
+            return shard.key == ALL_SHARD
+        start, end = window
+        return (end is None or shard.range[0] < end) and (start is None or shard.range[1] > start)
+
+    # Introspection
+
+    @property
+    def ntotal(self) -> int:
+        """Number of vectors in the loaded shards."""
+        with self._lock:
+            return sum(s.index.ntotal - len(s.tombstones) for s in self._shards.values() if s.index is not None)
+
+    def stored_dimension(self) -> Optional[int]:
+        """Dimension of the stored vectors, from the newest shard."""
+        with self._lock:
+            shards = self._ordered()
+            return self._load(shards[0]).d if shards else None
+
+    def loaded_indexes(self) -> Dict[str, faiss.Index]:
+        with self._lock:
+            return {s.key: s.index for s in self._shards.values() if s.index is not None}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get shard, load and search counters."""
+        with self._lock:
+            shards = self._ordered()
+            loaded = [s.index for s in shards if s.index is not None]
+            return {
+                "granularity": self.granularity,
+                "read_only": self.read_only,
+                "published_generation": self.published_generation,
+                "shards": len(shards),
+                "loaded_shards": sum(1 for s in shards if s.index is not None),
+                "mapped_shards": sum(1 for s in shards if s.mapped),
+                "average_shards_searched": round(self.shards_searched / self.searches, 2) if self.searches else 0.0,
+                "early_stops": self.early_stops,
+                # Vector codes and ids of the loaded shards, and the same vectors as float32
+                "vector_bytes": sum(index.ntotal * (code_size_of(index) + 8) for index in loaded),
+                "float32_bytes": sum(index.ntotal * (index.d * 4 + 8) for index in loaded),
+                "per_shard": [
+                    {
+                        "key": s.key,
+                        "loaded": s.index is not None,
+                        "mapped": s.mapped,
+                        "vectors": s.index.ntotal - len(s.tombstones) if s.index is not None else None,
+                        "tombstones": len(s.tombstones),
+                        "index_type": index_type_of(s.index) if s.index is not None else None,
+                        "vector_storage": storage_of(s.index) if s.index is not None else None,
+                        "storage": {"published_base": s.base} if self.read_only else s.store.get_stats()
+                    }
+                    for s in shards
+                ]
+            }
+
+    def close(self):
+        if self.read_only:
+            return
+        with self._lock:
+            for shard in self._shards.values():
+                shard.store.close()
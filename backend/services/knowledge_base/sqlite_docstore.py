@@ -0,0 +1,471 @@
+"""
+SQLite-backed docstore for the FAISS vector store.
+"""
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+from services.knowledge_base.lexical import match_expression, tokenize
+from services.knowledge_base.search_filter import SearchFilter, normalize_tag, split_tags, to_timestamp
+from utils.logging_config import app_logger
+
+# Stay under SQLite's bound-parameter limit
+_PARAMETER_BATCH = 500
+
+
+class SQLiteDocstore(Docstore):
+    """
+    Chunk texts and metadata stored in a SQLite table keyed by FAISS chunk id.
+
+    Unlike ``InMemoryDocstore`` nothing is loaded up front: opening the store
+    is constant time and a query reads only the rows of its hits. Rows are
+    also indexed by database document id, source id, publication time and
+    tag, so finding the chunks of a document, or the chunks matching a
+    SearchFilter, does not scan the corpus.
+
+    Each row also keeps the chunk's full-precision embedding, used to
+    re-score candidates of a quantised index and to rebuild indexes
+    without re-embedding; it stays on disk until read.
+
+    Titles and texts are also in an FTS5 full-text index, kept in the same
+    transactions as the rows, for BM25 ranking (``lexical_search``). It
+    stores the terms of ``lexical.tokenize`` (CJK text as character
+    bigrams), so Chinese matches without a word segmenter.
+
+    Args:
+        path: SQLite database file
+        read_only: Open an existing database without write access (for
+            processes that only serve searches while another one writes)
+    """
+
+    def __init__(self, path: str, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._connection = None
+        self._lexical = False
+        self._initialize()
+
+    def _initialize(self):
+        """Open the database and create the table if needed."""
+        if self.read_only:
+            if not os.path.exists(self.path):
+                raise FileNotFoundError(f"Docstore {self.path} does not exist; start the writing process first")
+            # WAL mode lets readers in other processes see each committed write
+            self._connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._lexical = self._has_table("chunks_fts")
+            app_logger.info(f"Docstore opened read-only at {self.path}")
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id INTEGER PRIMARY KEY,
+                docstore_id TEXT NOT NULL UNIQUE,
+                document_id INTEGER,
+                content TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                source_id INTEGER,
+                pub_ts REAL,
+                vector BLOB
+            )
+            """
+        )
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunk_tags (
+                tag TEXT NOT NULL,
+                chunk_id INTEGER NOT NULL,
+                PRIMARY KEY (tag, chunk_id)
+            ) WITHOUT ROWID
+            """
+        )
+        self._add_filter_columns()
+        self._add_vector_column()
+        self._add_lexical_index()
+        self._connection.execute("CREATE INDEX IF NOT EXISTS idx_chunks_document_id ON chunks (document_id)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS idx_chunks_source_id ON chunks (source_id)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS idx_chunks_pub_ts ON chunks (pub_ts)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS idx_chunk_tags_chunk_id ON chunk_tags (chunk_id)")
+        self._connection.commit()
+        app_logger.info(f"Docstore opened at {self.path}")
+
+    def _add_filter_columns(self):
+        """Add and backfill the filter columns of docstores created before they existed."""
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(chunks)")}
+        if "pub_ts" in columns:
+            return
+        self._connection.execute("ALTER TABLE chunks ADD COLUMN source_id INTEGER")
+        self._connection.execute("ALTER TABLE chunks ADD COLUMN pub_ts REAL")
+        rows = self._connection.execute("SELECT chunk_id, metadata FROM chunks").fetchall()
+        for chunk_id, metadata in rows:
+            metadata = json.loads(metadata)
+            source_id, pub_ts, tags = self._filter_values(metadata)
+            self._connection.execute(
+                "UPDATE chunks SET source_id = ?, pub_ts = ? WHERE chunk_id = ?", (source_id, pub_ts, chunk_id)
+            )
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO chunk_tags (tag, chunk_id) VALUES (?, ?)", [(tag, chunk_id) for tag in tags]
+            )
+        app_logger.info(f"Added filter columns to docstore for {len(rows)} chunks")
+
+    def _add_vector_column(self):
+        """Add the embedding column to docstores created before it existed (rows stay without one)."""
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(chunks)")}
+        if "vector" not in columns:
+            self._connection.execute("ALTER TABLE chunks ADD COLUMN vector BLOB")
+
+    def _has_table(self, name: str) -> bool:
+        return self._connection.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone() is not None
+
+    def _add_lexical_index(self):
+        """Create the full-text index, filling it for docstores created before it existed."""
+        self._lexical = True
+        if self._has_table("chunks_fts"):
+            return
+        self._connection.execute("CREATE VIRTUAL TABLE chunks_fts USING fts5(terms, tokenize = 'unicode61')")
+        last, indexed = -1, 0
+        while True:
+            rows = self._connection.execute(
+                "SELECT chunk_id, content, metadata FROM chunks WHERE chunk_id > ? ORDER BY chunk_id LIMIT 1000", (last,)
+            ).fetchall()
+            if not rows:
+                break
+            self._connection.executemany(
+                "INSERT INTO chunks_fts (rowid, terms) VALUES (?, ?)",
+                [(chunk_id, self._lexical_terms(content, json.loads(metadata))) for chunk_id, content, metadata in rows]
+            )
+            last, indexed = rows[-1][0], indexed + len(rows)
+        app_logger.info(f"Built full-text index of docstore for {indexed} chunks")
+
+    @staticmethod
+    def _lexical_terms(content: str, metadata: Dict[str, Any]) -> str:
+        """Indexed terms of a chunk: its document title and its text."""
+        return " ".join(tokenize(f"{metadata.get('title') or ''}\n{content}"))
+
+    @staticmethod
+    def _filter_values(metadata: Dict[str, Any]) -> Tuple[Optional[int], Optional[float], List[str]]:
+        """Source id, publication timestamp and tags of a chunk."""
+        source_id = metadata.get("source_id")
+        return (
+            int(source_id) if source_id is not None else None,
+            to_timestamp(metadata.get("pub_date")),
+            split_tags(metadata.get("tags"))
+        )
+
+    @staticmethod
+    def _to_document(content: str, metadata: str) -> Document:
+        return Document(page_content=content, metadata=json.loads(metadata))
+
+    # LangChain Docstore interface
+
+    def search(self, search: str) -> Union[str, Document]:
+        """Look up a chunk by docstore id (LangChain returns a message when it is missing)."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT content, metadata FROM chunks WHERE docstore_id = ?", (search,)
+            ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return self._to_document(*row)
+
+    def delete(self, ids: List[str]):
+        """Delete chunks by docstore id."""
+        with self._lock:
+            self._connection.executemany(
+                "DELETE FROM chunk_tags WHERE chunk_id IN (SELECT chunk_id FROM chunks WHERE docstore_id = ?)",
+                [(i,) for i in ids]
+            )
+            self._connection.executemany(
+                "DELETE FROM chunks_fts WHERE rowid IN (SELECT chunk_id FROM chunks WHERE docstore_id = ?)",
+                [(i,) for i in ids]
+            )
+            self._connection.executemany("DELETE FROM chunks WHERE docstore_id = ?", [(i,) for i in ids])
+            self._connection.commit()
+
+    # Chunk id access
+
+    def add_chunks(self, chunk_ids: Iterable[int], docstore_ids: Iterable[str], documents: Iterable[Document],
+                   vectors: Optional[np.ndarray] = None):
+        """
+        Insert or replace chunks in one transaction.
+
+        Args:
+            chunk_ids: FAISS chunk ids
+            docstore_ids: LangChain docstore ids
+            documents: Chunk texts and metadata
+            vectors: Full-precision embedding of each chunk (optional)
+        """
+        chunk_ids = list(chunk_ids)
+        if vectors is None:
+            blobs = [None] * len(chunk_ids)
+        else:
+            blobs = [np.asarray(vector, dtype=np.float32).tobytes() for vector in vectors]
+        rows, tag_rows, term_rows = [], [], []
+        for chunk_id, docstore_id, document, blob in zip(chunk_ids, docstore_ids, documents, blobs):
+            source_id, pub_ts, tags = self._filter_values(document.metadata)
+            rows.append((
+                int(chunk_id),
+                docstore_id,
+                document.metadata.get("document_id"),
+                document.page_content,
+                json.dumps(document.metadata, ensure_ascii=False, default=str),
+                source_id,
+                pub_ts,
+                blob
+            ))
+            tag_rows.extend((tag, int(chunk_id)) for tag in tags)
+            term_rows.append((int(chunk_id), self._lexical_terms(document.page_content, document.metadata)))
+        with self._lock:
+            self._connection.executemany("DELETE FROM chunk_tags WHERE chunk_id = ?", [(row[0],) for row in rows])
+            self._connection.executemany("DELETE FROM chunks_fts WHERE rowid = ?", [(row[0],) for row in rows])
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO chunks "
+                "(chunk_id, docstore_id, document_id, content, metadata, source_id, pub_ts, vector) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._connection.executemany("INSERT OR IGNORE INTO chunk_tags (tag, chunk_id) VALUES (?, ?)", tag_rows)
+            self._connection.executemany("INSERT INTO chunks_fts (rowid, terms) VALUES (?, ?)", term_rows)
+            self._connection.commit()
+
+    def get_chunks(self, chunk_ids: List[int]) -> Dict[int, Document]:
+        """Fetch the chunks with the given ids; missing ids are left out."""
+        found = {}
+        ids = [int(chunk_id) for chunk_id in chunk_ids]
+        with self._lock:
+            for start in range(0, len(ids), _PARAMETER_BATCH):
+                batch = ids[start:start + _PARAMETER_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._connection.execute(
+                    f"SELECT chunk_id, content, metadata FROM chunks WHERE chunk_id IN ({placeholders})", batch
+                ).fetchall()
+                for chunk_id, content, metadata in rows:
+                    found[chunk_id] = self._to_document(content, metadata)
+        return found
+
+    def get_vectors(self, chunk_ids: List[int]) -> Dict[int, np.ndarray]:
+        """Full-precision embeddings of the given chunks; chunks stored without one are left out."""
+        found = {}
+        ids = [int(chunk_id) for chunk_id in chunk_ids]
+        with self._lock:
+            for start in range(0, len(ids), _PARAMETER_BATCH):
+                batch = ids[start:start + _PARAMETER_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._connection.execute(
+                    f"SELECT chunk_id, vector FROM chunks WHERE chunk_id IN ({placeholders}) AND vector IS NOT NULL",
+                    batch
+                ).fetchall()
+                for chunk_id, blob in rows:
+                    found[chunk_id] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def sample_vectors(self, limit: int) -> List[np.ndarray]:
+        """Up to ``limit`` stored full-precision embeddings, in chunk id order."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT vector FROM chunks WHERE vector IS NOT NULL ORDER BY chunk_id LIMIT ?", (int(limit),)
+            ).fetchall()
+        return [np.frombuffer(blob, dtype=np.float32) for blob, in rows]
+
+    def set_missing_vectors(self, chunk_ids: List[int], vectors: np.ndarray):
+        """Store embeddings for chunks that have none (e.g. imported from an older store)."""
+        rows = [
+            (np.asarray(vector, dtype=np.float32).tobytes(), int(chunk_id))
+            for chunk_id, vector in zip(chunk_ids, vectors)
+        ]
+        with self._lock:
+            self._connection.executemany("UPDATE chunks SET vector = ? WHERE chunk_id = ? AND vector IS NULL", rows)
+            self._connection.commit()
+
+    def delete_chunks(self, chunk_ids: List[int]):
+        """Delete chunks by chunk id."""
+        rows = [(int(i),) for i in chunk_ids]
+        with self._lock:
+            self._connection.executemany("DELETE FROM chunk_tags WHERE chunk_id = ?", rows)
+            self._connection.executemany("DELETE FROM chunks_fts WHERE rowid = ?", rows)
+            self._connection.executemany("DELETE FROM chunks WHERE chunk_id = ?", rows)
+            self._connection.commit()
+
+    def chunk_ids_for_documents(self, document_ids: Iterable[int]) -> List[int]:
+        """Chunk ids stored for the given database document ids."""
+        ids = list({int(document_id) for document_id in document_ids})
+        chunk_ids = []
+        with self._lock:
+            for start in range(0, len(ids), _PARAMETER_BATCH):
+                batch = ids[start:start + _PARAMETER_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                chunk_ids.extend(row[0] for row in self._connection.execute(
+                    f"SELECT chunk_id FROM chunks WHERE document_id IN ({placeholders})", batch
+                ))
+        return chunk_ids
+
+    def select_chunk_ids(self, search_filter: SearchFilter) -> np.ndarray:
+        """
+        Ids of the chunks matching a filter, resolved through the column indexes.
+
+        Returns:
+            Sorted int64 array of chunk ids
+        """
+        conditions, parameters = self._filter_conditions(search_filter)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._connection.execute(f"SELECT chunk_id FROM chunks{where} ORDER BY chunk_id", parameters)
+            return np.fromiter((row[0] for row in rows), dtype=np.int64)
+
+    def lexical_search(self, query: str, k: int, search_filter: Optional[SearchFilter] = None) -> List[Tuple[int, float]]:
+        """
+        Rank chunks against a query by BM25 over the full-text index.
+
+        Args:
+            query: Search query (any of its terms may match)
+            k: Maximum number of chunks
+            search_filter: Restrict to matching chunks
+
+        Returns:
+            (chunk id, BM25 score) pairs, best (highest score) first
+        """
+        expression = match_expression(query)
+        if not expression or not self._lexical:
+            return []
+        conditions, parameters = self._filter_conditions(search_filter) if search_filter else ([], [])
+        restrict = f" AND rowid IN (SELECT chunk_id FROM chunks WHERE {' AND '.join(conditions)})" if conditions else ""
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT rowid, bm25(chunks_fts) FROM chunks_fts WHERE chunks_fts MATCH ?{restrict} "
+                "ORDER BY bm25(chunks_fts) LIMIT ?",
+                [expression, *parameters, int(k)]
+            ).fetchall()
+        # FTS5 reports BM25 negated so that ascending order is best first
+        return [(chunk_id, -score) for chunk_id, score in rows]
+
+    def has_lexical_index(self) -> bool:
+        """False for read-only docstores written before the full-text index existed."""
+        return self._lexical
+
+    @staticmethod
+    def _filter_conditions(search_filter: SearchFilter) -> Tuple[List[str], List[Any]]:
+        """SQL conditions on the chunks table selecting a filter's chunks, and their parameters."""
+        conditions, parameters = [], []
+        if search_filter.source_ids:
+            conditions.append(f"source_id IN ({','.join('?' * len(search_filter.source_ids))})")
+            parameters.extend(int(source_id) for source_id in search_filter.source_ids)
+        if search_filter.start is not None:
+            conditions.append("pub_ts >= ?")
+            parameters.append(to_timestamp(search_filter.start))
+        if search_filter.end is not None:
+            conditions.append("pub_ts < ?")
+            parameters.append(to_timestamp(search_filter.end))
+        if search_filter.tags:
+            tags = sorted({normalize_tag(tag) for tag in search_filter.tags})
+            conditions.append(f"chunk_id IN (SELECT chunk_id FROM chunk_tags WHERE tag IN ({','.join('?' * len(tags))}))")
+            parameters.extend(tags)
+        return conditions, parameters
+
+    def pub_timestamps(self, chunk_ids: List[int]) -> Dict[int, Optional[float]]:
+        """Publication timestamp of each stored chunk (None when undated); missing ids are left out."""
+        found = {}
+        ids = [int(chunk_id) for chunk_id in chunk_ids]
+        with self._lock:
+            for start in range(0, len(ids), _PARAMETER_BATCH):
+                batch = ids[start:start + _PARAMETER_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                found.update(self._connection.execute(
+                    f"SELECT chunk_id, pub_ts FROM chunks WHERE chunk_id IN ({placeholders})", batch
+                ).fetchall())
+        return found
+
+    def all_chunk_ids(self) -> List[int]:
+        with self._lock:
+            return [row[0] for row in self._connection.execute("SELECT chunk_id FROM chunks ORDER BY chunk_id")]
+
+    def docstore_id_of(self, chunk_id: int) -> Optional[str]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT docstore_id FROM chunks WHERE chunk_id = ?", (int(chunk_id),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def iter_chunks(self, batch_size: int = 1000) -> Iterator[Tuple[int, Document]]:
+        """Iterate over all chunks in chunk id order, reading ``batch_size`` rows at a time."""
+        last = None
+        while True:
+            with self._lock:
+                if last is None:
+                    rows = self._connection.execute(
+                        "SELECT chunk_id, content, metadata FROM chunks ORDER BY chunk_id LIMIT ?", (batch_size,)
+                    ).fetchall()
+                else:
+                    rows = self._connection.execute(
+                        "SELECT chunk_id, content, metadata FROM chunks WHERE chunk_id > ? ORDER BY chunk_id LIMIT ?",
+                        (last, batch_size)
+                    ).fetchall()
+            if not rows:
+                return
+            for chunk_id, content, metadata in rows:
+                yield chunk_id, self._to_document(content, metadata)
+            last = rows[-1][0]
+
+    def id_map(self) -> "ChunkIdMap":
+        """Read-only chunk id -> docstore id view (LangChain's ``index_to_docstore_id``)."""
+        return ChunkIdMap(self)
+
+    def clear(self):
+        """Delete every chunk."""
+        with self._lock:
+            self._connection.execute("DELETE FROM chunk_tags")
+            self._connection.execute("DELETE FROM chunks_fts")
+            self._connection.execute("DELETE FROM chunks")
+            self._connection.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get row count and database size."""
+        return {
+            "path": self.path,
+            "chunks": self.count(),
+            "lexical_index": self._lexical,
+            "bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        }
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class ChunkIdMap(Mapping):
+    """Mapping view of a SQLiteDocstore from chunk id to docstore id."""
+
+    def __init__(self, docstore: SQLiteDocstore):
+        self._docstore = docstore
+
+    def __getitem__(self, chunk_id: int) -> str:
+        docstore_id = self._docstore.docstore_id_of(chunk_id)
+        if docstore_id is None:
+            raise KeyError(chunk_id)
+        return docstore_id
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._docstore.all_chunk_ids())
+
+    def __len__(self) -> int:
+        return self._docstore.count()
@@ -1,24 +1,217 @@
 """
 Vector store service for FAISS operations.
 """
+import copy
+import json
 import os
-from typing import List, Dict, Any, Optional
+import shutil
+import threading
+import time
+from collections import Counter
+from typing import Callable, Iterable, Iterator, List, Dict, Any, Optional, Set, Tuple
+import numpy as np
+import faiss
 from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from services.knowledge_base.embedding_service import embedding_service
+from services.knowledge_base.embedding_service import EmbeddingService, embedding_service
 from services.knowledge_base.rerank_service import rerank_service
+from services.knowledge_base.index_factory import (
+    build_trained_index, export_vectors, index_type_of, is_id_mapped, quantization_recall, rescore,
+    search_parameters, stored_ids
+)
+from services.knowledge_base.segment_store import SegmentStore
+from services.knowledge_base.shard_index import ReadOnlyIndexError, ShardedIndex
+from services.knowledge_base.write_spool import WriteSpool
+from services.knowledge_base.sqlite_docstore import SQLiteDocstore
+from services.knowledge_base.lexical import reciprocal_rank_fusion
+from services.knowledge_base.search_filter import SearchFilter, to_timestamp
+from services.knowledge_base.ingestion_queue import ingestion_queue
+from services.knowledge_base.model_metadata import (
+    ModelMetadata, ModelMetadataMismatchError, validate_index_metadata
+)
+from core.service_registry import service_registry
+from utils.lru_cache import LRUCache
 from utils.logging_config import app_logger
 from config.settings import settings
 
+# FAISS ids of chunks: document_id * CHUNK_ID_STRIDE + chunk number
+CHUNK_ID_STRIDE = 100000
+# Ids given to chunks of indexes built before chunk ids existed (their document is unknown)
+LEGACY_CHUNK_ID_BASE = 2 ** 62
+
+VECTOR_STORE_MODES = ("standalone", "writer", "reader")
+# Pointer to the live store directory (relative to the vector store directory), written by re-index swaps
+CURRENT_STORE_FILE = "current_store.json"
+# Re-indexed stores live in subdirectories of this one
+REINDEX_STORES_DIR = "stores"
+# Retrieval modes of search()
+SEARCH_MODES = ("dense", "lexical", "hybrid")
+# Stored vectors checked for unit length when a store of a model without a Normalize layer is opened
+UNIT_VECTOR_SAMPLE = 100
+
+
+def chunk_id_for(document_id: int, chunk_no: int) -> int:
+    """FAISS id of a document's chunk."""
+    if chunk_no >= CHUNK_ID_STRIDE:
+        raise ValueError(f"Document {document_id} has more than {CHUNK_ID_STRIDE} chunks")
+    return int(document_id) * CHUNK_ID_STRIDE + chunk_no
+
+
+def document_id_of(chunk_id: int) -> Optional[int]:
+    """Document id of a chunk, or None for legacy chunks."""
+    if chunk_id >= LEGACY_CHUNK_ID_BASE:
+        return None
+    return int(chunk_id) // CHUNK_ID_STRIDE
+
+
+def current_store_path(vectorstore_path: str) -> str:
+    """Live store directory: the one named by the store pointer, ``vectorstore_path`` itself before any re-index."""
+    try:
+        with open(os.path.join(vectorstore_path, CURRENT_STORE_FILE), encoding="utf-8") as f:
+            return os.path.join(vectorstore_path, json.load(f)["store"])
+    except FileNotFoundError:
+        return vectorstore_path
+
+
+def docstore_id_for(document_id: int, chunk_no: int) -> str:
+    """Docstore key of a document's chunk."""
+    return f"doc-{document_id}-chunk-{chunk_no}"
+
+
+def unit_distance(query: np.ndarray, vector: np.ndarray) -> float:
+    """Squared L2 distance between the unit-length versions of two vectors (2 - 2 cos)."""
+    norms = float(np.linalg.norm(query) * np.linalg.norm(vector))
+    return 2.0 - 2.0 * float(np.dot(query, vector)) / norms if norms > 0 else 2.0
+
 
 class VectorStoreService:
-    """Service for vector store operations using FAISS."""
+    """
+    Service for vector store operations using FAISS.
+    
+    With VECTOR_STORE_MODE "writer" this process owns every write and
+    publishes index generations; "reader" processes memory-map the latest
+    publication read-only (sharing its pages across workers), pick up new
+    ones atomically, and spool their writes for the writer to apply.
     
-    def __init__(self):
-        self.vectorstore = None
+    A full re-index builds a separate store directory and swaps it in
+    through the store pointer file (``swap_store``).
+    """
+    
+    def __init__(self, store_path: Optional[str] = None, embedding=None, mode: Optional[str] = None):
+        """
+        Args:
+            store_path: Store directory (defaults to the live one named by the store pointer)
+            embedding: Embedding service of the stored vectors (defaults to the global one)
+            mode: Serving mode (defaults to VECTOR_STORE_MODE)
+        """
+        mode = mode or settings.VECTOR_STORE_MODE
+        if mode not in VECTOR_STORE_MODES:
+            raise ValueError(
+                f"Unknown vector store mode: {mode} "
+                f"(expected one of {', '.join(VECTOR_STORE_MODES)})"
+            )
+        self.mode = mode
+        self.read_only = self.mode == "reader"
+        # Bumped on every change to the indexed content so caches can detect stale entries
+        self.index_generation = 0
         self.index_path = settings.FAISS_INDEX_PATH
         self.vectorstore_path = os.path.dirname(self.index_path)
+        # Model embedding the stored vectors and queries; a re-index may switch it
+        self.embedding = embedding if embedding is not None else embedding_service
+        # Directory of the docstore, index shards and model metadata; a re-index swaps it
+        self.store_path = store_path or current_store_path(self.vectorstore_path)
+        # Serialises index/docstore mutations and their log records
+        self._write_lock = threading.RLock()
+        # Id selectors of recent filters, keyed by (filter, index_generation)
+        self._selector_cache = LRUCache(max_entries=settings.SEARCH_FILTER_CACHE_SIZE)
+        # Query embeddings keyed by (model, query), and search results keyed by (query, parameters, index_generation)
+        self._embedding_cache = LRUCache(max_entries=settings.SEARCH_EMBEDDING_CACHE_SIZE) \
+            if settings.SEARCH_EMBEDDING_CACHE_SIZE > 0 else None
+        self._result_cache = LRUCache(max_entries=settings.SEARCH_RESULT_CACHE_SIZE) \
+            if settings.SEARCH_RESULT_CACHE_SIZE > 0 else None
+        # Last recall report of the vector storage: (index_generation, report)
+        self._recall_report: Optional[Tuple[int, Optional[Dict[str, Any]]]] = None
+        # Chunk ids a reader's published index serves: (index, publication generation, ids)
+        self._served_ids: Optional[Tuple[ShardedIndex, int, Set[int]]] = None
+        # Publication (writer) and refresh (reader) bookkeeping
+        self._publish_timer: Optional[threading.Timer] = None
+        self._last_publish = 0.0
+        self._last_refresh_check = time.monotonic()
+        # Cross-encoder pairs scored per reranked query, exported with the stats
+        self._rerank_lock = threading.Lock()
+        self._rerank_depth: Dict[str, Any] = {
+            "queries": 0, "pairs": 0, "skipped": 0, "early_exit": 0, "full": 0, "pairs_histogram": Counter()
+        }
+        # Documents written while a re-index runs, replayed into its store before the swap
+        self._reindex_touched: Optional[Set[int]] = None
+        # Writes handed from reader processes to the writer
+        self.spool = WriteSpool(os.path.join(self.vectorstore_path, "write_spool.db")) if self.mode != "standalone" else None
+        self.metadata_path, self.docstore, self.index = self._open_store(self.store_path, self.embedding)
         self._initialize_vectorstore()
+        # Whether stored vectors have unit length, so squared L2 distances convert to cosine similarity
+        self.unit_vectors = self._has_unit_vectors(self.docstore, self.embedding)
+        if self.mode == "writer":
+            # Readers started before this process get the current contents
+            self.publish()
+            threading.Thread(target=self._drain_spool, name="vector-store-spool", daemon=True).start()
+    
+    def _open_store(self, store_path: str, embedding) -> Tuple[str, SQLiteDocstore, ShardedIndex]:
+        """
+        Open the parts of a store directory.
+        
+        Returns:
+            Model metadata path, docstore and index shards
+        """
+        # Chunk texts and metadata, read per hit instead of loaded at startup
+        docstore = SQLiteDocstore(os.path.join(store_path, "docstore.db"), read_only=self.read_only)
+        # Vectors partitioned by publication period, each shard persisted as base snapshot + logs
+        index = ShardedIndex(
+            os.path.join(store_path, "faiss_shards"),
+            dimension=embedding.get_embedding_dimension(),
+            granularity=settings.FAISS_SHARD_GRANULARITY,
+            hot_shards=settings.FAISS_SHARD_HOT_COUNT,
+            max_loaded_shards=settings.FAISS_SHARD_MAX_LOADED,
+            mmap_cold=settings.FAISS_SHARD_MMAP_COLD,
+            index_params=self._index_params(),
+            wal_max_bytes=settings.FAISS_WAL_MAX_BYTES,
+            merge_min_segments=settings.FAISS_MERGE_MIN_SEGMENTS,
+            read_only=self.read_only
+        )
+        # Embedding model metadata persisted next to the index
+        return os.path.join(store_path, "index_meta.json"), docstore, index
+    
+    @staticmethod
+    def _has_unit_vectors(docstore: SQLiteDocstore, embedding) -> bool:
+        """
+        Whether a store's vectors have unit length.
+        
+        Vectors of models without a Normalize layer are L2-normalised on
+        add and query, so this only fails for stores written by such a
+        model before that. Their distances do not convert to cosine
+        similarity: searches then compute it from the stored vectors and
+        skip the shard early stop until the store is re-indexed.
+        """
+        if embedding.metadata.normalize:
+            return True
+        sample = docstore.sample_vectors(UNIT_VECTOR_SAMPLE)
+        if not sample or np.allclose(np.linalg.norm(np.stack(sample), axis=1), 1.0, atol=1e-3):
+            return True
+        app_logger.warning(
+            f"Vector store holds vectors of {embedding.model_name} that are not unit length; "
+            f"similarities are computed from the stored vectors and FAISS_SHARD_STOP_SIMILARITY is ignored "
+            f"until the store is re-indexed"
+        )
+        return False
+    
+    @staticmethod
+    def _index_vectors(embedding, vectors: np.ndarray, unit_vectors: bool) -> np.ndarray:
+        """L2-normalise vectors of a model without a Normalize layer for a store of unit-length vectors."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if unit_vectors and not embedding.metadata.normalize:
+            vectors = vectors.copy()
+            faiss.normalize_L2(vectors)
+        return vectors
     
     def _initialize_vectorstore(self):
         """Initialize or load FAISS vector store."""
@@ -27,15 +220,58 @@ class VectorStoreService:
             if not os.path.exists(self.vectorstore_path):
                 os.makedirs(self.vectorstore_path)
             
-            # Try to load existing vectorstore
-            if os.path.exists(self.index_path):
+            if self.read_only:
+                # Only the writer migrates or creates stores; serve whatever it has published
+                self.index.open()
+                if self.index.published_generation:
+                    self._validate_model_metadata(self.index.stored_dimension())
+                app_logger.info(f"Serving published vector store generation {self.index.published_generation} read-only")
+                return
+            
+            # Single segmented index written before sharding
+            unsharded = SegmentStore(os.path.join(self.vectorstore_path, "faiss_store"))
+            # Older on-disk formats only exist in the original store directory
+            original = self.store_path == self.vectorstore_path
+            
+            if self.index.exists():
+                self.index.open()
+                self._validate_model_metadata(self.index.stored_dimension())
+                app_logger.info("Successfully loaded existing vector store")
+            elif original and unsharded.exists():
+                index, legacy_chunks = unsharded.load(self.embedding.get_embedding_dimension())
+                self._validate_model_metadata(index.d)
+                if legacy_chunks:
+                    # Stores that kept chunk texts next to the index
+                    self._import_chunks({
+                        chunk_id: (docstore_id, Document(page_content=content, metadata=metadata))
+                        for chunk_id, (docstore_id, content, metadata) in legacy_chunks.items()
+                    })
+                self._partition(index)
+                unsharded.close()
+                shutil.rmtree(unsharded.directory, ignore_errors=True)
+                app_logger.info("Successfully loaded existing vector store")
+            # Try to load a vectorstore saved with save_local by earlier versions
+            elif original and os.path.exists(self.index_path):
                 try:
-                    self.vectorstore = FAISS.load_local(
+                    legacy = FAISS.load_local(
                         self.vectorstore_path, 
-                        embedding_service.embeddings, 
+                        self.embedding.langchain_embeddings, 
                         allow_dangerous_deserialization=True
                     )
+                    self._validate_model_metadata(legacy.index.d)
+                    if not is_id_mapped(legacy.index):
+                        self._migrate_legacy_index(legacy)
+                    # Move it to the index shards and the SQLite docstore; the old files are no longer read
+                    self.docstore.clear()
+                    self._import_chunks({
+                        chunk_id: (docstore_id, legacy.docstore.search(docstore_id))
+                        for chunk_id, docstore_id in legacy.index_to_docstore_id.items()
+                    })
+                    self._partition(legacy.index)
                     app_logger.info("Successfully loaded existing vector store")
+                except ModelMetadataMismatchError:
+                    # Never silently replace an index built with another model
+                    raise
                 except Exception as e:
                     app_logger.warning(f"Failed to load existing vector store: {str(e)}")
                     self._create_new_vectorstore()
@@ -46,33 +282,320 @@ class VectorStoreService:
             app_logger.error(f"Error initializing vector store: {str(e)}")
             raise
     
+    def _import_chunks(self, chunks: Dict[int, Tuple[str, Any]]):
+        """Copy chunks (chunk id -> (docstore id, document)) of an older on-disk format into SQLite."""
+        chunks = {chunk_id: entry for chunk_id, entry in chunks.items() if hasattr(entry[1], "page_content")}
+        self.docstore.add_chunks(
+            list(chunks),
+            [docstore_id for docstore_id, _ in chunks.values()],
+            [document for _, document in chunks.values()]
+        )
+        app_logger.info(f"Imported {len(chunks)} chunks into the SQLite docstore")
+    
+    def _partition(self, index):
+        """Split an unsharded index into publication-period shards."""
+        ids, vectors = export_vectors(index)
+        timestamps = self.docstore.pub_timestamps(ids.tolist())
+        keys = [self.index.key_for(timestamps.get(int(chunk_id))) for chunk_id in ids]
+        # Older stores kept no full-precision vectors outside the index
+        self.docstore.set_missing_vectors(ids.tolist(), vectors)
+        self.index.import_vectors(ids, vectors, keys)
+        self.embedding.metadata.save(self.metadata_path)
+    
     def _create_new_vectorstore(self):
-        """Create a new vector store with placeholder text."""
+        """Create a new, empty vector store (shards are created by the first writes)."""
         try:
             app_logger.info("Creating new vector store")
-            self.vectorstore = FAISS.from_texts(
-                ["Placeholder text"], 
-                embedding_service.embeddings
-            )
-            self.save_vectorstore()
+            self.docstore.clear()
+            self.embedding.metadata.save(self.metadata_path)
             app_logger.info("New vector store created successfully")
         except Exception as e:
             app_logger.error(f"Error creating new vector store: {str(e)}")
             raise
     
+    def _migrate_legacy_index(self, vectorstore: FAISS):
+        """
+        Move a position-addressed index to an ID-mapped one.
+        
+        Chunks of legacy indexes carry no document id, so they get ids from
+        LEGACY_CHUNK_ID_BASE; they stay searchable but cannot be deleted by
+        document until the index is rebuilt. The old placeholder entry is
+        dropped.
+        """
+        index = vectorstore.index
+        docstore = vectorstore.docstore
+        app_logger.warning(f"Migrating legacy vector store with {index.ntotal} vectors to chunk ids")
+        positions, vectors = export_vectors(index)
+        
+        keep, ids, mapping, dropped = [], [], {}, []
+        for position in positions:
+            docstore_id = vectorstore.index_to_docstore_id.get(int(position))
+            document = docstore.search(docstore_id) if docstore_id else None
+            if not hasattr(document, "page_content") or document.page_content == "Placeholder text":
+                if docstore_id:
+                    dropped.append(docstore_id)
+                continue
+            chunk_id = LEGACY_CHUNK_ID_BASE + int(position)
+            keep.append(int(position))
+            ids.append(chunk_id)
+            mapping[chunk_id] = docstore_id
+        
+        if dropped:
+            docstore.delete(dropped)
+        vectorstore.index = build_trained_index("flat", vectors[keep], np.asarray(ids, dtype=np.int64))
+        vectorstore.index_to_docstore_id = mapping
+        app_logger.info(f"Migrated {len(ids)} legacy chunks, dropped {len(dropped)} placeholder entries")
+    
+    def _validate_model_metadata(self, index_dimension: Optional[int]):
+        """
+        Check the stored index against the embedding model's metadata.
+        
+        Legacy indexes without a metadata file are checked on dimension only
+        and then get one written.
+        
+        Raises:
+            ModelMetadataMismatchError: If the index was built with another model
+        """
+        index_metadata = ModelMetadata.load(self.metadata_path)
+        validate_index_metadata(
+            index_metadata,
+            self.embedding.metadata,
+            index_dimension or self.embedding.get_embedding_dimension(),
+            self.vectorstore_path
+        )
+        if index_metadata is None and not self.read_only:
+            app_logger.info(f"Recording embedding model metadata for existing index at {self.metadata_path}")
+            self.embedding.metadata.save(self.metadata_path)
+    
     def save_vectorstore(self):
-        """Save vector store to disk."""
+        """
+        Write every loaded shard as a new base snapshot.
+        
+        Ingestion only appends to the shards' write-ahead logs, so this is
+        not needed for durability; it shortens the logs replayed at startup.
+        Readers have nothing to save.
+        """
+        if self.read_only:
+            return
         try:
-            self.vectorstore.save_local(self.vectorstore_path)
-            app_logger.info(f"Vector store saved to: {self.vectorstore_path}")
+            with self._write_lock:
+                self.index.checkpoint()
+            self.embedding.metadata.save(self.metadata_path)
+            app_logger.info(f"Vector store saved to: {self.index.directory}")
         except Exception as e:
             app_logger.error(f"Error saving vector store: {str(e)}")
             raise
     
+    def _after_write(self, shard_keys: Iterable[str]):
+        """Bump the generation, merge logged segments of the written shards when due and schedule a publication."""
+        self.index_generation += 1
+        for key in set(shard_keys):
+            self.index.merge_if_needed(key, self._write_lock)
+        if self.mode == "writer":
+            self._schedule_publish()
+    
+    def publish(self) -> int:
+        """
+        Publish the current index to reader processes.
+        
+        Returns:
+            The publication generation
+        """
+        with self._write_lock:
+            self._publish_timer = None
+            self._last_publish = time.monotonic()
+            return self.index.publish()
+    
+    def _schedule_publish(self):
+        """Publish after the last write, at most once per VECTOR_STORE_PUBLISH_INTERVAL (caller holds the write lock)."""
+        if self._publish_timer is not None:
+            return
+        delay = max(0.0, self._last_publish + settings.VECTOR_STORE_PUBLISH_INTERVAL - time.monotonic())
+        self._publish_timer = threading.Timer(delay, self._publish_in_background)
+        self._publish_timer.daemon = True
+        self._publish_timer.start()
+    
+    def _publish_in_background(self):
+        try:
+            self.publish()
+        except Exception as e:
+            app_logger.error(f"Error publishing vector store: {str(e)}")
+    
+    def _refresh_if_due(self):
+        """Switch a reader to a newer publication, checking at most once per VECTOR_STORE_REFRESH_INTERVAL."""
+        now = time.monotonic()
+        if now - self._last_refresh_check < settings.VECTOR_STORE_REFRESH_INTERVAL:
+            return
+        self._last_refresh_check = now
+        try:
+            store_path = current_store_path(self.vectorstore_path)
+            if store_path != self.store_path:
+                self._follow_store(store_path)
+            elif self.index.refresh():
+                self.index_generation += 1
+        except Exception as e:
+            app_logger.error(f"Error refreshing published vector store: {str(e)}")
+    
+    def _follow_store(self, store_path: str):
+        """Switch a reader to the store a re-index swapped in, loading its embedding model if it changed."""
+        metadata = ModelMetadata.load(os.path.join(store_path, "index_meta.json"))
+        embedding = self.embedding
+        if metadata is not None and metadata.model_name != embedding.model_name:
+            app_logger.info(f"Re-indexed store uses embedding model {metadata.model_name}, loading it")
+            embedding = EmbeddingService(metadata.model_name)
+        metadata_path, docstore, index = self._open_store(store_path, embedding)
+        index.open()
+        unit_vectors = self._has_unit_vectors(docstore, embedding)
+        # Searches in flight keep the references they started with
+        self.embedding, self.store_path = embedding, store_path
+        self.metadata_path, self.docstore, self.index = metadata_path, docstore, index
+        self.unit_vectors = unit_vectors
+        self._selector_cache.clear()
+        self.index_generation += 1
+        app_logger.info(f"Serving re-indexed vector store {store_path}")
+    
+    def begin_reindex(self):
+        """
+        Record the documents written from now on, to be replayed into a re-indexed store before it is swapped in.
+        
+        Raises:
+            ReadOnlyIndexError: In reader processes, which cannot swap stores
+        """
+        if self.read_only:
+            raise ReadOnlyIndexError("Re-index runs in the writer process")
+        with self._write_lock:
+            self._reindex_touched = set()
+    
+    def abandon_reindex(self):
+        """Stop recording writes for a re-index that did not complete."""
+        with self._write_lock:
+            self._reindex_touched = None
+    
+    def _note_reindex_writes(self, document_ids: Iterable[int]):
+        if self._reindex_touched is not None:
+            self._reindex_touched.update(int(document_id) for document_id in document_ids)
+    
+    def swap_store(self, shadow: "VectorStoreService", catch_up: Callable[[Set[int]], None]):
+        """
+        Make a re-indexed store the live one.
+        
+        Writes wait while the documents written since ``begin_reindex`` are
+        replayed into the new store and the store pointer is switched;
+        searches keep being served from the old store until its references
+        are replaced. Reader processes follow the pointer. The previous
+        store is kept for readers still on it, older ones are deleted.
+        
+        Args:
+            shadow: Vector store built in the new store directory
+            catch_up: Re-applies the given document ids (from the database) to the shadow
+        """
+        with self._write_lock:
+            touched, self._reindex_touched = self._reindex_touched or set(), None
+            if touched:
+                app_logger.info(f"Replaying {len(touched)} documents written during the re-index")
+                catch_up(touched)
+            shadow.save_vectorstore()
+            if self.mode == "writer":
+                shadow.index.publish()
+                self._last_publish = time.monotonic()
+            self._write_store_pointer(shadow.store_path)
+            previous = self.store_path
+            self.embedding, self.store_path = shadow.embedding, shadow.store_path
+            self.metadata_path, self.docstore, self.index = shadow.metadata_path, shadow.docstore, shadow.index
+            self.unit_vectors = shadow.unit_vectors
+            self._selector_cache.clear()
+            self._recall_report = None
+            self.index_generation += 1
+        app_logger.info(f"Swapped in re-indexed vector store {self.store_path} (model {self.embedding.model_name})")
+        self._discard_stores(keep={self.store_path, previous})
+    
+    def _write_store_pointer(self, store_path: str):
+        """Point the live store at a directory, atomically."""
+        pointer = os.path.join(self.vectorstore_path, CURRENT_STORE_FILE)
+        temp_path = f"{pointer}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"store": os.path.relpath(store_path, self.vectorstore_path)}, f)
+        os.replace(temp_path, pointer)
+    
+    def _discard_stores(self, keep: Set[str]):
+        """Delete store directories other than the given ones."""
+        stores = os.path.join(self.vectorstore_path, REINDEX_STORES_DIR)
+        if os.path.isdir(stores):
+            for name in os.listdir(stores):
+                path = os.path.join(stores, name)
+                if path not in keep:
+                    shutil.rmtree(path, ignore_errors=True)
+        if self.vectorstore_path not in keep:
+            # The original store shares its directory with the pointer, spool and legacy files
+            shutil.rmtree(os.path.join(self.vectorstore_path, "faiss_shards"), ignore_errors=True)
+            for name in ("docstore.db", "docstore.db-wal", "docstore.db-shm", "index_meta.json"):
+                path = os.path.join(self.vectorstore_path, name)
+                if os.path.exists(path):
+                    os.remove(path)
+    
+    def new_store_path(self) -> str:
+        """Fresh directory for a re-indexed store."""
+        base = os.path.join(self.vectorstore_path, REINDEX_STORES_DIR, time.strftime("%Y%m%d-%H%M%S"))
+        path, suffix = base, 1
+        while os.path.exists(path):
+            path, suffix = f"{base}-{suffix}", suffix + 1
+        return path
+    
+    def _drain_spool(self):
+        """Writer thread applying the writes spooled by reader processes, in order."""
+        # Failed attempts per request; one that keeps failing is set aside after VECTOR_STORE_SPOOL_MAX_ATTEMPTS
+        attempts: Dict[int, int] = {}
+        while True:
+            try:
+                requests = self.spool.take()
+                for request_id, operation, payload in requests:
+                    try:
+                        self._apply_spooled(operation, payload)
+                    except ValueError as e:
+                        # Malformed request: retrying cannot help
+                        app_logger.error(f"Setting aside spooled {operation} request {request_id}: {str(e)}")
+                        self.spool.fail(request_id, str(e))
+                        continue
+                    except Exception as e:
+                        attempts[request_id] = attempts.get(request_id, 0) + 1
+                        if attempts[request_id] < settings.VECTOR_STORE_SPOOL_MAX_ATTEMPTS:
+                            raise
+                        app_logger.error(
+                            f"Setting aside spooled {operation} request {request_id} "
+                            f"after {attempts.pop(request_id)} failed attempts: {str(e)}"
+                        )
+                        self.spool.fail(request_id, str(e))
+                        continue
+                    attempts.pop(request_id, None)
+                    self.spool.ack([request_id])
+                if requests:
+                    continue
+            except Exception as e:
+                app_logger.error(f"Error applying spooled vector store writes: {str(e)}")
+            time.sleep(settings.VECTOR_STORE_SPOOL_POLL_INTERVAL)
+    
+    def _apply_spooled(self, operation: str, payload: List[Any]):
+        """Apply one spooled write request."""
+        if operation == "add":
+            ingestion_queue.submit(payload).result()
+        else:
+            # Spooled adds before it were waited for, so the spool's own order holds
+            self.delete_documents(payload)
+    
+    def _shard_keys(self, chunk_ids: List[int]) -> List[str]:
+        """Shard of each stored chunk, from its publication date in the docstore."""
+        timestamps = self.docstore.pub_timestamps(chunk_ids)
+        return [self.index.key_for(timestamps.get(int(chunk_id))) for chunk_id in chunk_ids]
+    
     def add_documents(self, documents: List[Dict[str, Any]]) -> str:
         """
         Add documents to the vector store.
         
+        Each document must carry its database ``id``; its chunks are stored
+        under ids derived from it. Adding a document that is already indexed
+        replaces its chunks, or removes them when it no longer has content.
+        Reader processes hand the documents to the writer instead.
+        
         Args:
             documents: List of document dictionaries
             
@@ -80,21 +603,49 @@ class VectorStoreService:
             Success message
         """
         try:
+            if self.read_only:
+                self.spool.put("add", documents)
+                return f"Queued {len(documents)} documents for the writer process"
             app_logger.info(f"Adding {len(documents)} documents to vector store")
             
             # Process documents
-            all_chunks, all_metadatas = self._process_documents(documents)
-            
-            # Check if vectorstore has only placeholder text
-            if self._has_only_placeholder():
-                app_logger.info("Replacing placeholder vector store with new documents")
-                self._replace_placeholder_vectorstore(all_chunks, all_metadatas)
-            else:
-                app_logger.info("Adding documents to existing vector store")
-                self.vectorstore.add_texts(all_chunks, all_metadatas)
+            all_chunks, all_metadatas, chunk_refs = self._process_documents(documents)
+            document_ids = [doc["id"] for doc in documents if doc.get("id") is not None]
+            if not all_chunks:
+                # Re-ingested documents that lost their content keep no stale chunks
+                self.delete_documents(document_ids)
+                return "No document content to store"
+            # Embedded outside the lock; a store swapped in meanwhile may use another model
+            embedding = self.embedding
+            vectors = np.asarray(embedding.embed_texts(all_chunks), dtype=np.float32)
             
-            # Save the updated vectorstore
-            self.save_vectorstore()
+            with self._write_lock:
+                if self.embedding is not embedding:
+                    app_logger.info(f"Vector store was swapped while embedding, re-embedding with {self.embedding.model_name}")
+                    vectors = np.asarray(self.embedding.embed_texts(all_chunks), dtype=np.float32)
+                vectors = self._index_vectors(self.embedding, vectors, self.unit_vectors)
+                self._note_reindex_writes(document_ids)
+                shard_keys = np.asarray(
+                    [self.index.key_for(to_timestamp(metadata.get("pub_date"))) for metadata in all_metadatas],
+                    dtype=object
+                )
+                # Re-ingested documents replace their previous chunks, including those left without content
+                removed = self._remove_chunks(self._chunk_ids_for_documents(document_ids))
+                
+                chunk_ids = np.asarray([chunk_id_for(doc_id, j) for doc_id, j in chunk_refs], dtype=np.int64)
+                # Texts first: a crash before the vectors are logged leaves only unreachable rows
+                self.docstore.add_chunks(
+                    chunk_ids.tolist(),
+                    [docstore_id_for(doc_id, j) for doc_id, j in chunk_refs],
+                    [Document(page_content=chunk, metadata=metadata) for chunk, metadata in zip(all_chunks, all_metadatas)],
+                    vectors
+                )
+                written = sorted(set(shard_keys.tolist()))
+                for key in written:
+                    selected = shard_keys == key
+                    self.index.add(key, chunk_ids[selected], vectors[selected])
+                    self._maybe_build_ann_index(key)
+                self._after_write(written + removed)
             
             message = f"Successfully processed and stored {len(all_chunks)} document chunks"
             app_logger.info(f"Document storage completed: {message}")
@@ -104,31 +655,95 @@ class VectorStoreService:
             app_logger.error(f"Error adding documents to vector store: {str(e)}")
             raise
     
-    def _process_documents(self, documents: List[Dict[str, Any]]) -> tuple[List[str], List[Dict[str, Any]]]:
-        """Process documents into chunks with metadata."""
+    def delete_documents(self, document_ids: Iterable[int]) -> int:
+        """
+        Remove every chunk of the given documents from the index.
+        
+        Reader processes hand the deletion to the writer and report 0.
+        
+        Args:
+            document_ids: Database ids of the documents
+            
+        Returns:
+            Number of chunks removed
+        """
+        try:
+            if self.read_only:
+                self.spool.put("delete", [int(document_id) for document_id in document_ids])
+                return 0
+            document_ids = list(document_ids)
+            with self._write_lock:
+                self._note_reindex_writes(document_ids)
+                chunk_ids = self._chunk_ids_for_documents(document_ids)
+                if not chunk_ids:
+                    return 0
+                written = self._remove_chunks(chunk_ids)
+                self._after_write(written)
+            app_logger.info(f"Deleted {len(chunk_ids)} chunks of {len(set(document_ids))} documents from vector store")
+            return len(chunk_ids)
+        except Exception as e:
+            app_logger.error(f"Error deleting documents from vector store: {str(e)}")
+            raise
+    
+    def _chunk_ids_for_documents(self, document_ids: Iterable[int]) -> List[int]:
+        """Chunk ids currently stored for the given documents."""
+        return self.docstore.chunk_ids_for_documents(document_ids)
+    
+    def _remove_chunks(self, chunk_ids: List[int]) -> List[str]:
+        """
+        Remove chunks from their index shards and the docstore.
+        
+        Returns:
+            Keys of the shards written
+        """
+        if not chunk_ids:
+            return []
+        ids = np.asarray(chunk_ids, dtype=np.int64)
+        shard_keys = np.asarray(self._shard_keys(chunk_ids), dtype=object)
+        written = sorted(set(shard_keys.tolist()))
+        for key in written:
+            self.index.remove(key, ids[shard_keys == key])
+        self.docstore.delete_chunks(chunk_ids)
+        return written
+    
+    def _process_documents(self, documents: List[Dict[str, Any]]) -> Tuple[List[str], List[Dict[str, Any]], List[Tuple[int, int]]]:
+        """
+        Process documents into chunks with metadata.
+        
+        Returns:
+            Chunk texts, chunk metadata and (document id, chunk number) per chunk
+        """
         text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
+            chunk_size=settings.CHUNK_SIZE,
+            chunk_overlap=settings.CHUNK_OVERLAP,
             length_function=len
         )
         
         all_chunks = []
         all_metadatas = []
+        chunk_refs = []
         
         for i, doc in enumerate(documents):
+            document_id = doc.get("id")
+            if document_id is None:
+                raise ValueError(f"Document '{doc.get('title', i)}' has no id; store it in the database first")
+            
             # Extract content and metadata
             content = doc.get("description", "")
-            title = doc.get("title", f"Document_{i}")
+            title = doc.get("title", f"Document_{document_id}")
             tags = doc.get("tags", "")
             pub_date = doc.get("pub_date", "")
             author = doc.get("author", "")
             
             # Split content into chunks
-            chunks = text_splitter.split_text(content)
+            chunks = text_splitter.split_text(content or "")
             
             # Create metadata for each chunk
             metadatas = [{
-                "source": f"document_{i}",
+                "source": f"document_{document_id}",
+                "document_id": document_id,
+                "source_id": doc.get("source_id"),
+                "link": doc.get("link", ""),
                 "chunk": j,
                 "title": title,
                 "tags": tags,
@@ -138,84 +753,533 @@ class VectorStoreService:
             
             all_chunks.extend(chunks)
             all_metadatas.extend(metadatas)
+            chunk_refs.extend((int(document_id), j) for j in range(len(chunks)))
         
-        return all_chunks, all_metadatas
+        return all_chunks, all_metadatas, chunk_refs
     
-    def _has_only_placeholder(self) -> bool:
-        """Check if vectorstore contains only placeholder text."""
-        try:
-            if len(self.vectorstore.index_to_docstore_id) == 1:
-                first_doc_id = list(self.vectorstore.index_to_docstore_id.values())[0]
-                first_doc = self.vectorstore.docstore.search(first_doc_id)
-                return "Placeholder text" in str(first_doc)
+    def _index_params(self) -> Dict[str, Any]:
+        """Index build parameters from the settings."""
+        return {
+            "nlist": settings.FAISS_IVF_NLIST,
+            "pq_m": settings.FAISS_PQ_M,
+            "hnsw_m": settings.FAISS_HNSW_M,
+            "ef_construction": settings.FAISS_HNSW_EF_CONSTRUCTION,
+            "storage": settings.FAISS_VECTOR_STORAGE
+        }
+    
+    def _rescore_factor(self) -> int:
+        """Candidates fetched per result for full-precision re-scoring (1 = no re-scoring)."""
+        if settings.FAISS_VECTOR_STORAGE == "float32":
+            return 1
+        return max(1, settings.FAISS_RESCORE_FACTOR)
+    
+    def _maybe_build_ann_index(self, shard_key: str) -> bool:
+        """
+        Replace a shard's flat index with the configured approximate index.
+        
+        Happens once per shard, when its flat index reaches
+        FAISS_ANN_MIN_VECTORS. Vectors keep their chunk ids, so the docstore
+        mapping stays valid. The replaced shard is checkpointed, since its
+        log cannot express the change of index type.
+        
+        Returns:
+            True if the index was replaced
+        """
+        index = self.index.index_for(shard_key, writable=True)
+        if settings.FAISS_INDEX_TYPE == "flat" or index_type_of(index) != "flat":
             return False
-        except Exception:
+        if index.ntotal < settings.FAISS_ANN_MIN_VECTORS:
             return False
+        app_logger.info(
+            f"Flat index of shard {shard_key} reached {index.ntotal} vectors, building {settings.FAISS_INDEX_TYPE} index"
+        )
+        ids, vectors = export_vectors(index)
+        self.index.replace(
+            shard_key, build_trained_index(settings.FAISS_INDEX_TYPE, vectors, ids, **self._index_params())
+        )
+        return True
+    
+    def _id_selector(self, filters: SearchFilter) -> Tuple[int, Optional[faiss.IDSelector]]:
+        """
+        FAISS id selector accepting the chunks that match a filter.
+        
+        The matching ids come from the docstore's column indexes; selectors
+        are cached until the indexed content changes.
+        
+        Returns:
+            (number of matching chunks, selector or None when nothing matches)
+        """
+        key = (filters.cache_key(), self.index_generation)
+        cached = self._selector_cache.get(key)
+        if cached is None:
+            chunk_ids = self.docstore.select_chunk_ids(filters)
+            cached = (len(chunk_ids), faiss.IDSelectorBatch(chunk_ids) if len(chunk_ids) else None)
+            self._selector_cache.put(key, cached)
+        return cached
     
-    def _replace_placeholder_vectorstore(self, chunks: List[str], metadatas: List[Dict[str, Any]]):
-        """Replace placeholder vectorstore with new documents."""
-        new_vectorstore = FAISS.from_texts(chunks, embedding_service.embeddings, metadatas=metadatas)
-        self.vectorstore.index_to_docstore_id = new_vectorstore.index_to_docstore_id
-        self.vectorstore.docstore = new_vectorstore.docstore
-        self.vectorstore.index = new_vectorstore.index
+    def _similarity_search_many(self, queries: List[str], k: int, nprobe: Optional[int] = None,
+                                ef_search: Optional[int] = None,
+                                filters: Optional[SearchFilter] = None,
+                                mode: str = "dense") -> List[List[Tuple[Any, Optional[float]]]]:
+        """
+        Nearest-neighbour search of several queries with per-query ANN parameters, optionally fused with BM25.
+        
+        The queries are embedded in one batch and searched with one FAISS
+        search over the query matrix per shard. Shards are searched newest
+        first, stopping early once the results are close enough
+        (FAISS_SHARD_STOP_SIMILARITY). A filter is applied inside the index
+        scan through an id selector, so no candidates are fetched only to
+        be discarded, and its date range skips shards outside it. With
+        quantised vector storage, more candidates are fetched and re-ranked
+        by their full-precision distance.
+        
+        In lexical and hybrid mode the docstore's full-text index ranks
+        chunks by BM25; hybrid merges both rankings by reciprocal rank.
+        
+        Returns:
+            (document, squared L2 distance) pairs of each query, best first;
+            the distance is None for a lexical hit whose vector is not stored
+        """
+        # A re-index swap replaces these; this search finishes on the store it started with
+        index, docstore, embedding, unit_vectors = self.index, self.docstore, self.embedding, self.unit_vectors
+        selector = None
+        window = None
+        if filters is not None and not filters.is_empty():
+            matching, selector = self._id_selector(filters)
+            app_logger.info(f"Search filter matches {matching} chunks")
+            if selector is None:
+                return [[] for _ in queries]
+            k = min(k, matching)
+            if filters.start or filters.end:
+                window = (filters.start, filters.end)
+        vectors = self._index_vectors(embedding, self._embed_queries(embedding, queries), unit_vectors)
+        if mode != "dense" and not docstore.has_lexical_index():
+            app_logger.warning("Docstore has no full-text index, falling back to dense search")
+            mode = "dense"
+        if mode != "lexical":
+            hits = self._dense_hits(index, docstore, vectors, k, nprobe, ef_search, selector, window, unit_vectors)
+        else:
+            hits = [[] for _ in queries]
+        if mode != "dense":
+            served = self._served_chunk_ids(index) if self.read_only else None
+            for i, query in enumerate(queries):
+                lexical = docstore.lexical_search(query, k, filters)
+                if served is not None:
+                    lexical = [(chunk_id, score) for chunk_id, score in lexical if chunk_id in served]
+                hits[i] = self._fuse(vectors[i], docstore, hits[i], lexical, k, unit_vectors)
+        
+        # One docstore read for the hits of every query
+        documents = docstore.get_chunks(list({chunk_id for query_hits in hits for _, chunk_id in query_hits}))
+        return [
+            [(documents[chunk_id], distance) for distance, chunk_id in query_hits if chunk_id in documents]
+            for query_hits in hits
+        ]
     
-    def search(self, query: str, k: int = 3, rerank: bool = True) -> List[Dict[str, Any]]:
+    def _embed_queries(self, embedding, queries: List[str]) -> np.ndarray:
+        """
+        Embed queries in one batch, reusing embeddings of earlier identical queries of the same model.
+        
+        Returns:
+            float32 matrix, one row per query
+        """
+        cached = [self._embedding_cache.get((embedding.model_name, query)) if self._embedding_cache is not None
+                  else None for query in queries]
+        missing = list(dict.fromkeys(query for query, vector in zip(queries, cached) if vector is None))
+        if missing:
+            computed = dict(zip(missing, embedding.embed_queries(missing)))
+            for query, vector in computed.items():
+                if self._embedding_cache is not None:
+                    self._embedding_cache.put((embedding.model_name, query), vector)
+            cached = [vector if vector is not None else computed[query] for query, vector in zip(queries, cached)]
+        return np.asarray(cached, dtype=np.float32)
+    
+    def _dense_hits(self, index: ShardedIndex, docstore: SQLiteDocstore, vectors: np.ndarray, k: int,
+                    nprobe: Optional[int], ef_search: Optional[int], selector: Optional[faiss.IDSelector],
+                    window, unit_vectors: bool = True) -> List[List[Tuple[float, int]]]:
+        """
+        (squared L2 distance, chunk id) pairs of the k nearest chunks of each query, closest first.
+        
+        For a store whose vectors are not unit length the distances are
+        recomputed between the unit-length query and stored vectors, so
+        they convert to cosine similarity like those of other stores.
+        """
+        stop_similarity = settings.FAISS_SHARD_STOP_SIMILARITY if unit_vectors else 0.0
+        rescore_factor = self._rescore_factor()
+        hits = index.search_batch(
+            vectors,
+            k * rescore_factor,
+            params_for=lambda index: search_parameters(
+                index,
+                nprobe=nprobe or settings.FAISS_IVF_NPROBE,
+                ef_search=ef_search or settings.FAISS_HNSW_EF_SEARCH,
+                selector=selector
+            ),
+            window=window,
+            # Inverse of _distance_to_similarity
+            stop_distance=2.0 * (1.0 - stop_similarity) if stop_similarity > 0 else None
+        )
+        if rescore_factor > 1 or not unit_vectors:
+            full = docstore.get_vectors(list({chunk_id for query_hits in hits for _, chunk_id in query_hits}))
+            if rescore_factor > 1:
+                hits = [rescore(vector, query_hits, full, k) for vector, query_hits in zip(vectors, hits)]
+            if not unit_vectors:
+                hits = [
+                    sorted((unit_distance(vector, full[chunk_id]) if chunk_id in full else distance, chunk_id)
+                           for distance, chunk_id in query_hits)
+                    for vector, query_hits in zip(vectors, hits)
+                ]
+        return hits
+    
+    def _served_chunk_ids(self, index: ShardedIndex) -> Set[int]:
+        """
+        Ids of the chunks in a reader's published index, cached per publication.
+        
+        The docstore is shared with the writer and already holds chunks
+        published later; BM25 hits are limited to these so that lexical
+        and dense results come from the same generation.
+        """
+        cached = self._served_ids
+        if cached is not None and cached[0] is index and cached[1] == index.published_generation:
+            return cached[2]
+        generation = index.published_generation
+        served = set()
+        for key in index.keys():
+            shard = index.index_for(key)
+            if shard is not None:
+                served.update(stored_ids(shard).tolist())
+        self._served_ids = (index, generation, served)
+        return served
+    
+    @staticmethod
+    def _fuse(query_vector: np.ndarray, docstore: SQLiteDocstore, dense: List[Tuple[float, int]],
+              lexical: List[Tuple[int, float]], k: int, unit_vectors: bool = True) -> List[Tuple[Optional[float], int]]:
+        """
+        Merge dense and BM25 rankings by reciprocal rank (SEARCH_RRF_K).
+        
+        Chunks found only by BM25 get their distance from the stored
+        full-precision vectors, so every result keeps a comparable relevance.
+        
+        Returns:
+            Top k (squared L2 distance or None, chunk id) pairs, best first
+        """
+        fused = reciprocal_rank_fusion(
+            [[chunk_id for _, chunk_id in dense], [chunk_id for chunk_id, _ in lexical]],
+            k=settings.SEARCH_RRF_K
+        )[:k]
+        distances = {chunk_id: distance for distance, chunk_id in dense}
+        missing = [chunk_id for chunk_id, _ in fused if chunk_id not in distances]
+        for chunk_id, stored in docstore.get_vectors(missing).items():
+            stored = np.asarray(stored, dtype=np.float32)
+            distances[chunk_id] = float(np.sum((stored - query_vector) ** 2)) if unit_vectors \
+                else unit_distance(query_vector, stored)
+        return [(distances.get(chunk_id), chunk_id) for chunk_id, _ in fused]
+    
+    def search(self, query: str, k: int = 3, rerank: bool = True, nprobe: Optional[int] = None,
+               ef_search: Optional[int] = None, filters: Optional[SearchFilter] = None,
+               mode: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Search for similar documents.
         
+        Every result carries the FAISS ``distance`` and a ``relevance`` in
+        [0, 1]: the calibrated reranker probability when reranking ran, the
+        cosine similarity derived from the distance otherwise (0 for a
+        lexical hit without a stored vector, whose distance is None).
+        
+        Results are cached per query and parameters for the current index
+        generation, so any write or swap invalidates them; callers get copies.
+        
         Args:
             query: Search query
             k: Number of results to return
             rerank: Whether to use reranking
+            nprobe: IVF lists to visit (defaults to FAISS_IVF_NPROBE)
+            ef_search: HNSW candidate list size (defaults to FAISS_HNSW_EF_SEARCH)
+            filters: Restrict results to matching source, publication date range and tags
+            mode: dense, lexical or hybrid retrieval (defaults to SEARCH_MODE)
             
         Returns:
             List of search results
         """
-        try:
-            app_logger.info(f"Searching vector store for: '{query}'")
+        return self.search_many([query], k, rerank=rerank, nprobe=nprobe, ef_search=ef_search,
+                                filters=filters, mode=mode)[0]
+    
+    def search_many(self, queries: List[str], k: int = 3, rerank: bool = True, nprobe: Optional[int] = None,
+                    ef_search: Optional[int] = None, filters: Optional[SearchFilter] = None,
+                    mode: Optional[str] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search for several queries in one call.
+        
+        Uncached queries are embedded in one batch, searched with one FAISS
+        search over the query matrix, and reranked with the cross-encoder
+        pairs of all queries scored together. Results are as for search().
+        
+        Args:
+            queries: Search queries
+            k: Number of results to return per query
+            rerank: Whether to use reranking
+            nprobe: IVF lists to visit (defaults to FAISS_IVF_NPROBE)
+            ef_search: HNSW candidate list size (defaults to FAISS_HNSW_EF_SEARCH)
+            filters: Restrict results to matching source, publication date range and tags
+            mode: dense, lexical or hybrid retrieval (defaults to SEARCH_MODE)
             
-            # Determine initial search count
-            initial_k = k * 3 if rerank and rerank_service.is_available() else k
+        Returns:
+            Search results of each query, in the order of ``queries``
+        """
+        mode = (mode or settings.SEARCH_MODE).lower()
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {', '.join(SEARCH_MODES)}")
+        if not queries:
+            return []
+        try:
+            searched = f"'{queries[0]}'" if len(queries) == 1 else f"{len(queries)} queries"
+            app_logger.info(f"Searching vector store for: {searched}" + (f" with {filters}" if filters else ""))
+            if self.read_only:
+                self._refresh_if_due()
             
-            # Perform similarity search
-            results = self.vectorstore.similarity_search(query, k=initial_k)
-            app_logger.info(f"Found {len(results)} initial results")
+            # Determine initial search count (the deepest the reranker may go)
+            rerank = rerank and rerank_service.is_available()
+            initial_k = k * max(1, settings.RERANK_CANDIDATE_FACTOR) if rerank else k
             
-            # Apply reranking if requested and available
-            if rerank and rerank_service.is_available() and results:
-                results = rerank_service.rerank_results(query, results, k)
-                app_logger.info(f"Reranked to top {len(results)} results")
+            # Read before searching: a write during the search leaves its results under the old generation
+            filter_key = filters.cache_key() if filters is not None else None
+            generation = self.index_generation
+            cache_keys = {query: (query, k, rerank, mode, nprobe, ef_search, filter_key, generation) for query in queries}
+            found: Dict[str, List[Dict[str, Any]]] = {}
+            if self._result_cache is not None:
+                for query, cache_key in cache_keys.items():
+                    cached = self._result_cache.get(cache_key)
+                    if cached is not None:
+                        found[query] = cached
+                if found:
+                    app_logger.info(f"Using cached results for {len(found)} of {len(cache_keys)} queries")
             
-            # Format results
-            formatted_results = []
-            for i, result in enumerate(results, 1):
-                formatted_results.append({
-                    "id": i,
-                    "content": result.page_content,
-                    "metadata": result.metadata
-                })
+            # Duplicate queries are searched once
+            pending = [query for query in cache_keys if query not in found]
+            if pending:
+                hits = self._similarity_search_many(pending, initial_k, nprobe=nprobe, ef_search=ef_search,
+                                                    filters=filters, mode=mode)
+                app_logger.info(f"Found {sum(len(query_hits) for query_hits in hits)} initial results ({mode})")
+                
+                results = [
+                    [
+                        {
+                            "content": document.page_content,
+                            "metadata": document.metadata,
+                            "distance": float(distance) if distance is not None else None,
+                            "relevance": self._distance_to_similarity(float(distance)) if distance is not None else 0.0
+                        }
+                        for document, distance in query_hits
+                    ]
+                    for query_hits in hits
+                ]
+                
+                # Apply reranking if requested and available
+                if rerank:
+                    results = self._adaptive_rerank_many(pending, results, k)
+                
+                # Format results
+                for query, query_results in zip(pending, results):
+                    found[query] = [{"id": i, **result} for i, result in enumerate(query_results[:k], 1)]
+                    if self._result_cache is not None:
+                        self._result_cache.put(cache_keys[query], found[query])
             
-            app_logger.info(f"Vector store search completed, returning {len(formatted_results)} results")
-            return formatted_results
+            app_logger.info(f"Vector store search completed, returning {sum(len(found[q]) for q in queries)} results")
+            return [copy.deepcopy(found[query]) for query in queries]
             
         except Exception as e:
             app_logger.error(f"Error searching vector store: {str(e)}")
-            return []
+            return [[] for _ in queries]
+    
+    def _adaptive_rerank_many(self, queries: List[str], results: List[List[Dict[str, Any]]],
+                              k: int) -> List[List[Dict[str, Any]]]:
+        """
+        Rerank each query's candidates (in retrieval order) only as deep as needed.
+        
+        Reranking a query is skipped when every one of its first k
+        candidates leads the rest in similarity by
+        RERANK_SKIP_SIMILARITY_GAP: the top k are then clear from the
+        first-stage search alone. Otherwise the first k candidates are
+        scored, then RERANK_CASCADE_BATCH_SIZE more at a time, stopping once
+        a batch's best score falls RERANK_STABLE_MARGIN below the current
+        k-th score, i.e. the top k stopped changing and the candidates left
+        rank lower still. Hard queries, where later candidates keep scoring
+        well, are scored to the full depth. Each round scores the next batch
+        of every query still going in one cross-encoder call.
+        
+        Returns:
+            Top k results of each query
+        """
+        gap = settings.RERANK_SKIP_SIMILARITY_GAP
+        margin = settings.RERANK_STABLE_MARGIN
+        batch_size = max(1, settings.RERANK_CASCADE_BATCH_SIZE)
+        reranked: List[Optional[List[Dict[str, Any]]]] = [None] * len(queries)
+        scored: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        outcomes = ["full"] * len(queries)
+        active = []
+        for i, candidates in enumerate(results):
+            if not candidates:
+                reranked[i] = []
+            # Fused rankings are not ordered by similarity, so compare the weakest of the top k with the best of the rest
+            elif gap > 0 and len(candidates) > k and \
+                    min(r["relevance"] for r in candidates[:k]) - max(r["relevance"] for r in candidates[k:]) >= gap:
+                self._record_rerank_depth(0, "skipped")
+                app_logger.info(f"Skipped reranking: top {k} hits lead the other candidates by at least {gap}")
+                reranked[i] = candidates[:k]
+            else:
+                active.append(i)
+        
+        try:
+            while active:
+                batches = [results[i][len(scored[i]):len(scored[i]) + (batch_size if scored[i] else max(k, batch_size))]
+                           for i in active]
+                batches = rerank_service.score_results_many([queries[i] for i in active], batches)
+                remaining = []
+                for i, batch in zip(active, batches):
+                    scored[i].extend(batch)
+                    scored[i].sort(key=lambda result: result["rerank_score"], reverse=True)
+                    if len(scored[i]) >= len(results[i]):
+                        continue
+                    if margin > 0 and len(scored[i]) >= k and \
+                            max(result["rerank_score"] for result in batch) <= scored[i][k - 1]["rerank_score"] - margin:
+                        outcomes[i] = "early_exit"
+                        continue
+                    remaining.append(i)
+                active = remaining
+        except Exception as e:
+            app_logger.warning(f"Reranking failed: {str(e)}, using original results")
+            for i in active:
+                reranked[i] = results[i][:k]
+        
+        for i, query_scored in enumerate(scored):
+            if reranked[i] is None:
+                self._record_rerank_depth(len(query_scored), outcomes[i])
+                app_logger.info(f"Reranked {len(query_scored)} of {len(results[i])} candidates ({outcomes[i]}) "
+                                f"to top {min(k, len(query_scored))}")
+                reranked[i] = query_scored[:k]
+        return reranked
+    
+    def _record_rerank_depth(self, pairs: int, outcome: str):
+        """Count the cross-encoder pairs scored for one query."""
+        with self._rerank_lock:
+            stats = self._rerank_depth
+            stats["queries"] += 1
+            stats["pairs"] += pairs
+            stats[outcome] += 1
+            stats["pairs_histogram"][pairs] += 1
+    
+    def get_rerank_depth_stats(self) -> Dict[str, Any]:
+        """Per-query rerank pair counts: totals, outcomes and a histogram of pairs per query."""
+        with self._rerank_lock:
+            stats = dict(self._rerank_depth)
+            histogram = dict(sorted(stats.pop("pairs_histogram").items()))
+        stats["average_pairs_per_query"] = round(stats["pairs"] / stats["queries"], 2) if stats["queries"] else 0.0
+        stats["pairs_histogram"] = {str(pairs): count for pairs, count in histogram.items()}
+        return stats
+    
+    def iter_documents(self, batch_size: int = 1000) -> Iterator[Document]:
+        """
+        Iterate over every stored chunk without loading the corpus at once.
+        
+        Args:
+            batch_size: Rows read from the docstore per query
+        """
+        for _, document in self.docstore.iter_chunks(batch_size):
+            yield document
+    
+    @staticmethod
+    def _distance_to_similarity(distance: float) -> float:
+        """
+        Convert a FAISS squared L2 distance to cosine similarity.
+        
+        Holds for unit-length vectors, for which cos = 1 - d / 2: vectors of
+        models without a Normalize layer are normalised on add and query,
+        and searches of older stores holding unnormalised vectors recompute
+        their distances between unit-length vectors (see _has_unit_vectors).
+        """
+        return max(0.0, min(1.0, 1.0 - distance / 2.0))
     
     def get_stats(self) -> Dict[str, Any]:
         """Get vector store statistics."""
         try:
-            total_docs = len(self.vectorstore.index_to_docstore_id)
+            total_docs = self.docstore.count()
+            shard_stats = self.index.get_stats()
             return {
+                "mode": self.mode,
                 "total_documents": total_docs,
-                "index_path": self.index_path,
-                "embedding_model": embedding_service.model_name,
-                "rerank_available": rerank_service.is_available()
+                "store_path": self.store_path,
+                "index_path": self.index.directory,
+                "index_types": sorted({index_type_of(index) for index in self.index.loaded_indexes().values()}),
+                "configured_index_type": settings.FAISS_INDEX_TYPE,
+                "embedding_model": self.embedding.model_name,
+                "embedding_backend": self.embedding.backend,
+                "embedding_dimension": self.embedding.get_embedding_dimension(),
+                "embedding_batching": self.embedding.get_batching_stats(),
+                "embedding_cache": self.embedding.get_cache_stats(),
+                "shards": shard_stats,
+                "vector_storage": self._storage_report(shard_stats),
+                "docstore": self.docstore.get_stats(),
+                "ingestion": ingestion_queue.get_stats(),
+                "spooled_writes": self.spool.pending() if self.spool else 0,
+                "failed_spooled_writes": self.spool.failed() if self.spool else 0,
+                "rerank_available": rerank_service.is_available(),
+                "rerank": rerank_service.get_stats(),
+                "rerank_depth": self.get_rerank_depth_stats(),
+                "search_cache": {
+                    "query_embeddings": self._embedding_cache.get_stats() if self._embedding_cache is not None else None,
+                    "results": self._result_cache.get_stats() if self._result_cache is not None else None
+                }
             }
         except Exception as e:
             app_logger.error(f"Error getting vector store stats: {str(e)}")
             return {"error": str(e)}
     
+    def _storage_report(self, shard_stats: Dict[str, Any]) -> Dict[str, Any]:
+        """Memory of the loaded vectors against float32, and the recall of their storage."""
+        vector_bytes = shard_stats["vector_bytes"]
+        float32_bytes = shard_stats["float32_bytes"]
+        return {
+            "storage": settings.FAISS_VECTOR_STORAGE,
+            "rescore_factor": self._rescore_factor(),
+            "vector_bytes": vector_bytes,
+            "float32_bytes": float32_bytes,
+            "memory_ratio": round(vector_bytes / float32_bytes, 4) if float32_bytes else None,
+            "recall": self._storage_recall()
+        }
+    
+    def _storage_recall(self) -> Optional[Dict[str, Any]]:
+        """
+        Recall@10 of the newest shard against exact search, with and without re-scoring.
+        
+        Measured on up to FAISS_RECALL_SAMPLE_VECTORS of its vectors and
+        cached until the indexed content changes.
+        """
+        if not settings.FAISS_RECALL_SAMPLE_VECTORS:
+            return None
+        generation = self.index_generation
+        if self._recall_report is not None and self._recall_report[0] == generation:
+            return self._recall_report[1]
+        report = None
+        for key in self.index.keys():
+            index = self.index.index_for(key)
+            if index is None or index.ntotal == 0:
+                continue
+            ids = stored_ids(index)
+            if len(ids) > settings.FAISS_RECALL_SAMPLE_VECTORS:
+                ids = np.random.default_rng(generation).choice(ids, settings.FAISS_RECALL_SAMPLE_VECTORS, replace=False)
+            full = self.docstore.get_vectors(ids.tolist())
+            if full:
+                report = {"shard": key, **quantization_recall(
+                    index,
+                    np.fromiter(full.keys(), dtype=np.int64),
+                    np.vstack(list(full.values())),
+                    rescore_factor=max(1, settings.FAISS_RESCORE_FACTOR),
+                    nprobe=settings.FAISS_IVF_NPROBE,
+                    ef_search=settings.FAISS_HNSW_EF_SEARCH
+                )}
+            break
+        self._recall_report = (generation, report)
+        return report
+    
     def create_search_tool(self):
         """Create a search tool for the vector store."""
         from langchain_core.tools import StructuredTool
@@ -237,4 +1301,4 @@ class VectorStoreService:
 
 
 # Global service instance
-vector_store_service = VectorStoreService()
+vector_store_service = service_registry.register("vector_store", VectorStoreService)
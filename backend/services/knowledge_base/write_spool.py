@@ -0,0 +1,123 @@
+"""
+Cross-process hand-off of vector store writes from read-only workers to the writer.
+"""
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, List, Tuple
+from utils.logging_config import app_logger
+
+WRITE_OPERATIONS = ("add", "delete")
+
+
+def _json_default(value: Any) -> str:
+    """Dates as ISO 8601 (what the vector store parses back), anything else as text."""
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+class WriteSpool:
+    """
+    Durable queue of write requests in a small SQLite database.
+
+    Processes serving the vector store read-only cannot change it; they
+    append their writes here (documents to add, document ids to delete)
+    and the writing process applies them in order, then acknowledges
+    them. A request is removed only once acknowledged, so a writer crash
+    replays it; adds and deletes are idempotent. Requests that cannot be
+    applied are moved to a table of failed requests, so later ones are
+    not held up.
+
+    Args:
+        path: SQLite database file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS write_requests (
+                request_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                operation TEXT NOT NULL,
+                payload TEXT NOT NULL
+            )
+            """
+        )
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS failed_requests (
+                request_id INTEGER PRIMARY KEY,
+                operation TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                error TEXT NOT NULL
+            )
+            """
+        )
+        self._connection.commit()
+
+    def put(self, operation: str, payload: List[Any]) -> int:
+        """
+        Append a write request.
+
+        Args:
+            operation: "add" (payload: document dicts) or "delete" (payload: document ids)
+            payload: Request data (JSON-serialisable; dates are stored as ISO strings)
+
+        Returns:
+            Request id
+        """
+        if operation not in WRITE_OPERATIONS:
+            raise ValueError(f"Unknown write operation: {operation}")
+        data = json.dumps(payload, ensure_ascii=False, default=_json_default)
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT INTO write_requests (operation, payload) VALUES (?, ?)", (operation, data)
+            )
+            self._connection.commit()
+        app_logger.info(f"Spooled {operation} of {len(payload)} items for the writer process")
+        return cursor.lastrowid
+
+    def take(self, limit: int = 100) -> List[Tuple[int, str, List[Any]]]:
+        """Oldest unacknowledged requests as (request id, operation, payload)."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT request_id, operation, payload FROM write_requests ORDER BY request_id LIMIT ?", (limit,)
+            ).fetchall()
+        return [(request_id, operation, json.loads(payload)) for request_id, operation, payload in rows]
+
+    def ack(self, request_ids: List[int]):
+        """Remove applied requests."""
+        with self._lock:
+            self._connection.executemany(
+                "DELETE FROM write_requests WHERE request_id = ?", [(int(i),) for i in request_ids]
+            )
+            self._connection.commit()
+
+    def fail(self, request_id: int, error: str):
+        """Move a request that cannot be applied out of the queue, keeping it with its error."""
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO failed_requests (request_id, operation, payload, error) "
+                "SELECT request_id, operation, payload, ? FROM write_requests WHERE request_id = ?",
+                (error, int(request_id))
+            )
+            self._connection.execute("DELETE FROM write_requests WHERE request_id = ?", (int(request_id),))
+            self._connection.commit()
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM write_requests").fetchone()[0]
+
+    def failed(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM failed_requests").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -22,10 +22,7 @@ class SchedulerService:
         self.running = False
         self.threads = {}
         self.lock = threading.Lock()
-        # Automatically start scheduler based on environment variable
-        auto_start = settings.AUTO_START_SCHEDULER
-        if auto_start:
-            self.start_scheduler()
+        # Started by app.py when AUTO_START_SCHEDULER is set, so importing this module starts no threads
     
     def start_scheduler(self):
         """Start the scheduled task scheduler."""
@@ -4,7 +4,6 @@ Online search service using Tavily API.
 import os
 import requests
 import json
-import getpass
 from typing import List, Dict, Any, Optional
 from langchain_core.tools import Tool
 from utils.logging_config import app_logger
@@ -19,15 +18,10 @@ class OnlineSearchService:
         self._initialize_api_key()
     
     def _initialize_api_key(self):
-        """Initialize API key from environment or user input."""
+        """Initialize API key from the environment; never prompt, so imports cannot block."""
         if not self.api_key:
-            app_logger.warning("TAVILY_API_KEY not found in environment variables")
-            try:
-                self.api_key = getpass.getpass("请输入Tavily API密钥：")
-                os.environ["TAVILY_API_KEY"] = self.api_key
-            except Exception as e:
-                app_logger.error(f"Failed to get API key: {str(e)}")
-                self.api_key = None
+            app_logger.warning("TAVILY_API_KEY not found in environment variables, online search is disabled")
+            self.api_key = None
     
     def search(self, query: str, max_results: int = 3) -> List[Dict[str, Any]]:
         """
@@ -11,12 +11,11 @@ from schemas.requests import (
 from schemas.responses import (
     SourceResponse, SourceListResponse, SourceStatsResponse, SourceTriggerResponse
 )
-from services.knowledge_base.vector_store_service import vector_store_service
+from services.knowledge_base.ingestion_queue import ingestion_queue
 from utils.logging_config import app_logger
 import feedparser
 import requests
 from bs4 import BeautifulSoup
-import threading
 from utils.email_sender import send_notification_email
 from config.settings import settings
 import json
@@ -319,11 +318,14 @@ class SourceService:
                     
                     # 准备知识库数据
                     document_list.append({
+                        "id": document.id,
                         "title": document.title,
                         "description": document.description,
                         "tags": document.tags,
                         "pub_date": document.pub_date.isoformat() if document.pub_date else "",
-                        "author": document.author
+                        "author": document.author,
+                        "link": document.link,
+                        "source_id": document.source_id
                     })
                     
                     app_logger.info(f"Created document: {clean_title}")
@@ -404,11 +406,14 @@ class SourceService:
                     
                     # 准备知识库数据
                     document_list.append({
+                        "id": document.id,
                         "title": document.title,
                         "description": document.description,
                         "tags": document.tags,
                         "pub_date": document.pub_date.isoformat() if document.pub_date else "",
-                        "author": document.author
+                        "author": document.author,
+                        "link": document.link,
+                        "source_id": document.source_id
                     })
                     
                 except Exception as e:
@@ -486,17 +491,12 @@ class SourceService:
         return None
     
     def _add_to_knowledge_base_async(self, document_list: List[Dict[str, Any]]):
-        """异步添加文档到知识库"""
-        def add_to_kb():
-            try:
-                vector_store_service.add_documents(document_list)
-                app_logger.info(f"Added {len(document_list)} documents to knowledge base")
-            except Exception as e:
-                app_logger.error(f"Error adding documents to knowledge base: {str(e)}")
-        
-        thread = threading.Thread(target=add_to_kb)
-        thread.daemon = True
-        thread.start()
+        """异步添加文档到知识库（经由单写入线程的入库队列）"""
+        try:
+            ingestion_queue.submit(document_list)
+            app_logger.info(f"Queued {len(document_list)} documents for knowledge base")
+        except Exception as e:
+            app_logger.error(f"Error adding documents to knowledge base: {str(e)}")
     
     def _send_notification_email(self, source, documents_created: int, document_list: List[Dict[str, Any]]):
         """发送通知邮件"""
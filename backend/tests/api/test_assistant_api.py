@@ -247,6 +247,45 @@ class TestAssistantAPI:
             assert 'answer' in data
 
 
+class TestAssistantStreamAPI:
+    """助手流式API测试"""
+    
+    def test_assistant_query_stream_events(self, test_client, auth_headers):
+        """测试流式查询按顺序返回SSE事件"""
+        mock_service = Mock()
+        mock_service.stream_query.return_value = iter([
+            {"event": "sources", "data": {"origin": "knowledge_base", "sources": []}},
+            {"event": "token", "data": {"text": "测试"}},
+            {"event": "token", "data": {"text": "回答"}},
+            {"event": "done", "data": {"answer": "测试回答", "status": "success"}},
+        ])
+        
+        with patch('apis.assistant.get_assistant_service', return_value=mock_service):
+            response = test_client.post(
+                '/api/assistant/query/stream',
+                headers=auth_headers,
+                json={'query': '测试问题'}
+            )
+            body = response.get_data(as_text=True)
+        
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        events = [line.split(': ', 1)[1] for line in body.splitlines() if line.startswith('event: ')]
+        assert events == ['sources', 'token', 'token', 'done']
+        assert '"answer": "测试回答"' in body
+        mock_service.close.assert_called_once()
+    
+    def test_assistant_query_stream_missing_query(self, test_client, auth_headers):
+        """测试流式查询缺少query字段"""
+        response = test_client.post(
+            '/api/assistant/query/stream',
+            headers=auth_headers,
+            json={}
+        )
+        
+        assert response.status_code == 400
+
+
 class TestAssistantAPIIntegration:
     """助手API集成测试"""
     
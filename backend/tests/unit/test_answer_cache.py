@@ -0,0 +1,83 @@
+"""
+answer_cache.py 单元测试
+"""
+import time
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from services.assistant.answer_cache import SemanticAnswerCache, normalize_query
+
+
+VECTORS = {
+    "今天的科技新闻": [1.0, 0.0, 0.0],
+    "今天有什么科技新闻": [0.99, 0.05, 0.0],
+    "股市行情如何": [0.0, 1.0, 0.0],
+}
+
+
+def make_cache(generation=None, **kwargs):
+    """创建使用固定向量的缓存"""
+    state = generation if generation is not None else {"generation": 0}
+    return SemanticAnswerCache(
+        embed_func=lambda query: VECTORS.get(query, [0.0, 0.0, 1.0]),
+        generation_func=lambda: state["generation"],
+        **kwargs
+    ), state
+
+
+class TestSemanticAnswerCache:
+    """测试语义答案缓存"""
+    
+    def test_normalize_query(self):
+        """测试查询归一化"""
+        assert normalize_query("  Hello   World？ ") == "hello world"
+    
+    def test_exact_hit_after_normalisation(self):
+        """测试归一化后的精确命中"""
+        cache, _ = make_cache()
+        cache.put("今天的科技新闻", {"answer": "A"})
+        
+        assert cache.get(" 今天的科技新闻？") == {"answer": "A"}
+        assert cache.get_stats()["exact_hits"] == 1
+    
+    def test_semantic_hit_and_miss(self):
+        """测试相似查询命中、不相似查询未命中"""
+        cache, _ = make_cache(similarity_threshold=0.95)
+        cache.put("今天的科技新闻", {"answer": "A"})
+        
+        assert cache.get("今天有什么科技新闻") == {"answer": "A"}
+        assert cache.get("股市行情如何") is None
+        stats = cache.get_stats()
+        assert stats["semantic_hits"] == 1
+        assert stats["misses"] == 1
+    
+    def test_generation_change_invalidates(self):
+        """测试索引代次变化时缓存失效"""
+        cache, state = make_cache()
+        cache.put("今天的科技新闻", {"answer": "A"})
+        state["generation"] = 1
+        
+        assert cache.get("今天的科技新闻") is None
+        assert cache.get_stats()["invalidations"] == 1
+        assert cache.get_stats()["entries"] == 0
+    
+    def test_lru_eviction_removes_vectors(self):
+        """测试LRU淘汰同时移除向量"""
+        cache, _ = make_cache(max_entries=1)
+        cache.put("今天的科技新闻", {"answer": "A"})
+        cache.put("股市行情如何", {"answer": "B"})
+        
+        assert cache.get("今天有什么科技新闻") is None
+        assert cache.get("股市行情如何") == {"answer": "B"}
+        assert cache.get_stats()["evictions"] == 1
+    
+    def test_ttl_expiry(self):
+        """测试过期条目不会被返回"""
+        cache, _ = make_cache(ttl_seconds=0.01)
+        cache.put("今天的科技新闻", {"answer": "A"})
+        time.sleep(0.02)
+        
+        assert cache.get("今天的科技新闻") is None
@@ -234,3 +234,168 @@ class TestAssistantIntegration:
         assert "优先使用" in system_message
         assert "在线搜索" in system_message
 
+
+
+class TestAssistantRuntime:
+    """测试进程级助手运行时复用"""
+    
+    @patch('services.assistant_service.online_search_service')
+    @patch('services.assistant_service.initialize_agent')
+    @patch('services.assistant_service.Ollama')
+    def test_runtime_shared_across_services(self, mock_ollama, mock_initialize_agent, mock_online_search):
+        """测试多个服务实例共享同一个LLM客户端和智能体"""
+        from services.assistant_service import AssistantRuntime
+        
+        mock_initialize_agent.return_value = Mock()
+        runtime = AssistantRuntime()
+        
+        first = AssistantService(Mock(), runtime=runtime)
+        second = AssistantService(Mock(), runtime=runtime)
+        
+        assert first.assistant is second.assistant
+        assert first.llm is second.llm
+        mock_ollama.assert_called_once()
+        mock_initialize_agent.assert_called_once()
+    
+    @patch('services.assistant_service.online_search_service')
+    @patch('services.assistant_service.initialize_agent')
+    @patch('services.assistant_service.Ollama')
+    def test_service_close_releases_session(self, mock_ollama, mock_initialize_agent, mock_online_search):
+        """测试关闭服务时释放数据库会话"""
+        from services.assistant_service import AssistantRuntime
+        
+        session = Mock()
+        service = AssistantService(session, runtime=AssistantRuntime())
+        service.close()
+        
+        session.close.assert_called_once()
+    
+    def test_runtime_construction_does_not_load_models(self):
+        """测试创建运行时（含语义答案缓存）不会触发懒加载服务的模型加载"""
+        from core.service_registry import LazyService
+        from services import assistant_service as assistant_module
+        
+        with patch.object(assistant_module.settings, 'ANSWER_CACHE_ENABLED', True), \
+                patch.object(assistant_module, '_assistant_runtime', None), \
+                patch.object(LazyService, 'get_instance') as mock_get_instance:
+            runtime = assistant_module.get_assistant_runtime()
+        
+        assert runtime.answer_cache is not None
+        mock_get_instance.assert_not_called()
+    
+    def test_importing_app_leaves_services_unloaded(self):
+        """测试导入应用并获取运行时不会在主线程加载模型，预热只在后台线程进行"""
+        pytest.importorskip('flask_cors')
+        import threading
+        from core.service_registry import LazyService
+        from config.settings import settings
+        from services import assistant_service as assistant_module
+        
+        warmed = threading.Event()
+        with patch.multiple(settings, AUTO_START_SCHEDULER=False, SERVICE_WARMUP_ON_STARTUP=False,
+                            ASSISTANT_WARMUP_ON_STARTUP=True, ANSWER_CACHE_ENABLED=True), \
+                patch.object(assistant_module, '_assistant_runtime', None), \
+                patch.object(assistant_module.AssistantRuntime, 'warm_up', new=Mock(side_effect=warmed.set)), \
+                patch.object(LazyService, 'get_instance') as mock_get_instance, \
+                patch.dict(sys.modules):
+            sys.modules.pop('app', None)
+            import app  # noqa: F401
+            assistant_module.get_assistant_runtime()
+            assert warmed.wait(timeout=5)
+        
+        mock_get_instance.assert_not_called()
+
+
+class TestRelevanceGate:
+    """测试基于检索分数的相关性判断"""
+    
+    @pytest.fixture
+    def assistant_service(self):
+        """创建使用模拟运行时的助手服务"""
+        runtime = Mock()
+        runtime.llm = Mock()
+        return AssistantService(Mock(), runtime=runtime)
+    
+    def test_reranked_results_above_threshold_are_valid(self, assistant_service):
+        """测试重排分数高于阈值时使用知识库结果"""
+        sources = [{"content": "相关内容", "rerank_score": 3.2, "relevance": 0.96}]
+        
+        with patch('services.assistant_service.settings') as mock_settings:
+            mock_settings.ASSISTANT_LLM_RELEVANCE_CHECK = False
+            mock_settings.KB_RERANK_RELEVANCE_THRESHOLD = 0.3
+            assert assistant_service._is_knowledge_base_result_invalid(sources, "问题") is False
+        
+        assistant_service.llm.invoke.assert_not_called()
+    
+    def test_low_scores_fall_back_to_online_search(self, assistant_service):
+        """测试分数低于阈值时回退到在线搜索"""
+        sources = [
+            {"content": "无关内容", "rerank_score": -8.0, "relevance": 0.0003},
+            {"content": "无关内容2", "distance": 1.8, "relevance": 0.1},
+        ]
+        
+        with patch('services.assistant_service.settings') as mock_settings:
+            mock_settings.ASSISTANT_LLM_RELEVANCE_CHECK = False
+            mock_settings.KB_RERANK_RELEVANCE_THRESHOLD = 0.3
+            mock_settings.KB_VECTOR_SIMILARITY_THRESHOLD = 0.3
+            assert assistant_service._is_knowledge_base_result_invalid(sources, "问题") is True
+        
+        assistant_service.llm.invoke.assert_not_called()
+    
+    def test_llm_check_is_opt_in(self, assistant_service):
+        """测试开启后才使用LLM判断相关性"""
+        assistant_service.llm.invoke.return_value = "不相关"
+        sources = [{"content": "内容", "relevance": 0.9}]
+        
+        with patch('services.assistant_service.settings') as mock_settings:
+            mock_settings.ASSISTANT_LLM_RELEVANCE_CHECK = True
+            assert assistant_service._is_knowledge_base_result_invalid(sources, "问题") is True
+        
+        assistant_service.llm.invoke.assert_called_once()
+
+
+class TestOnlineSearchFallback:
+    """测试在线搜索只在知识库结果不可用时调用"""
+    
+    @pytest.fixture
+    def assistant_service(self):
+        """创建使用模拟运行时与真实线程池的助手服务"""
+        from concurrent.futures import ThreadPoolExecutor
+        runtime = Mock()
+        runtime.executor = ThreadPoolExecutor(max_workers=4)
+        yield AssistantService(Mock(), runtime=runtime)
+        runtime.executor.shutdown(wait=True)
+    
+    def run_sources(self, assistant_service, kb_results):
+        # 显式传入替身，避免patch检查原对象时触发懒加载服务的模型加载
+        mock_store, mock_online = Mock(), Mock()
+        with patch('services.assistant_service.vector_store_service', new=mock_store), \
+                patch('services.assistant_service.online_search_service', new=mock_online), \
+                patch('services.assistant_service.settings') as mock_settings:
+            mock_store.search.return_value = kb_results
+            mock_online.search.return_value = [{"content": "在线结果"}]
+            mock_settings.ASSISTANT_SPECULATIVE_ONLINE_SEARCH = False
+            mock_settings.ASSISTANT_TIME_WINDOW_FILTER = False
+            mock_settings.ASSISTANT_LLM_RELEVANCE_CHECK = False
+            mock_settings.KB_RERANK_RELEVANCE_THRESHOLD = 0.3
+            mock_settings.KB_VECTOR_SIMILARITY_THRESHOLD = 0.3
+            sources = assistant_service._build_query_pipeline().run({"query": "问题"}, ["sources"])["sources"]
+        return sources, mock_online.search
+    
+    def test_relevant_knowledge_base_skips_online_search(self, assistant_service):
+        """测试知识库结果通过相关性判断时不调用在线搜索"""
+        sources, online_search = self.run_sources(
+            assistant_service, [{"content": "相关内容", "rerank_score": 3.2, "relevance": 0.96}]
+        )
+        
+        assert sources["origin"] == "knowledge_base"
+        online_search.assert_not_called()
+    
+    def test_irrelevant_knowledge_base_falls_back(self, assistant_service):
+        """测试知识库结果不相关时才调用在线搜索"""
+        sources, online_search = self.run_sources(
+            assistant_service, [{"content": "无关内容", "rerank_score": -8.0, "relevance": 0.0003}]
+        )
+        
+        assert sources["origin"] == "online_search"
+        online_search.assert_called_once()
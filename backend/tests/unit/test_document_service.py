@@ -251,3 +251,23 @@ class TestDocumentService:
         
         # 验证
         assert result is False
+    
+    @pytest.mark.parametrize("delete", [
+        lambda service: service.delete_document(1, service.session),
+        lambda service: service.batch_delete_documents([1]),
+    ], ids=["single", "batch"])
+    def test_delete_removes_vectors_before_database_row(self, mock_database_session, mock_document, delete):
+        """测试单条删除与批量删除顺序一致：先删除知识库向量，再删除数据库记录"""
+        calls = []
+        mock_database_session.get.return_value = mock_document
+        mock_database_session.delete.side_effect = lambda document: calls.append("row")
+        mock_queue = Mock()
+        mock_queue.submit_delete.side_effect = lambda ids: calls.append("vectors") or Mock()
+        
+        # 删除经由入库队列排在已排队的写入之后
+        with patch('services.document_service.ingestion_queue', new=mock_queue):
+            delete(DocumentService(mock_database_session))
+        
+        assert calls == ["vectors", "row"]
+        mock_queue.submit_delete.assert_called_once_with([1])
+        mock_database_session.commit.assert_called_once()
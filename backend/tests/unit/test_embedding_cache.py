@@ -0,0 +1,44 @@
+"""
+embedding_cache.py 单元测试
+"""
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from services.knowledge_base.embedding_cache import EmbeddingCache
+
+
+class TestEmbeddingCache:
+    """测试持久化嵌入缓存"""
+    
+    def test_round_trip_and_persistence(self, tmp_path):
+        """测试写入后可读取且重启后仍然有效"""
+        path = str(tmp_path / "cache.db")
+        cache = EmbeddingCache(path)
+        cache.put_many("model-a", ["新闻一", "新闻二"], [[0.5, 0.25], [1.0, 0.0]])
+        cache.close()
+        
+        reopened = EmbeddingCache(path)
+        assert reopened.get_many("model-a", ["新闻二", "新闻三", "新闻一"]) == [[1.0, 0.0], None, [0.5, 0.25]]
+        assert reopened.get_stats()["hits"] == 2
+        assert reopened.get_stats()["misses"] == 1
+    
+    def test_keyed_by_model(self, tmp_path):
+        """测试不同模型的向量互不混用"""
+        cache = EmbeddingCache(str(tmp_path / "cache.db"))
+        cache.put_many("model-a", ["新闻"], [[1.0]])
+        
+        assert cache.get_many("model-b", ["新闻"]) == [None]
+    
+    def test_lru_eviction(self, tmp_path):
+        """测试超过上限时淘汰最久未访问的条目"""
+        cache = EmbeddingCache(str(tmp_path / "cache.db"), max_entries=2)
+        cache.put_many("m", ["a"], [[1.0]])
+        cache.put_many("m", ["b"], [[2.0]])
+        cache.get_many("m", ["a"])
+        cache.put_many("m", ["c"], [[3.0]])
+        
+        assert cache.get_many("m", ["a", "b", "c"]) == [[1.0], None, [3.0]]
+        assert cache.get_stats()["entries"] == 2
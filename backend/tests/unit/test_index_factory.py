@@ -0,0 +1,145 @@
+"""
+index_factory.py 单元测试
+"""
+import os
+import sys
+import numpy as np
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from services.knowledge_base.index_factory import (
+    build_index, build_trained_index, code_size_of, compact, export_vectors, index_type_of, new_flat_index,
+    quantization_recall, recall_at_k, remove_ids, rescore, search_live, search_parameters, storage_of, tombstone_rows
+)
+import faiss
+
+
+@pytest.fixture
+def vectors():
+    """聚簇分布的测试向量"""
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(20, 32))
+    return (centers[rng.integers(0, 20, 2000)] + rng.normal(0, 0.1, size=(2000, 32))).astype(np.float32)
+
+
+class TestIndexFactory:
+    """测试FAISS索引工厂"""
+
+    @pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "ivf_pq", "hnsw"])
+    def test_build_each_type(self, vectors, index_type):
+        """测试各类型索引可训练、添加并保持向量顺序"""
+        index = build_trained_index(index_type, vectors)
+
+        assert index.ntotal == len(vectors)
+        assert index_type_of(index) == index_type
+        if index_type != "ivf_pq":
+            # 非有损索引中每个向量的最近邻是其自身
+            _, ids = index.search(vectors[:5], 1, params=search_parameters(index, nprobe=8, ef_search=32))
+            assert list(ids[:, 0]) == [0, 1, 2, 3, 4]
+        assert index_type_of(build_index(index_type, 32)) == index_type
+
+    @pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "hnsw"])
+    def test_export_by_id(self, vectors, index_type):
+        """测试按ID导出的向量与原始向量对应"""
+        ids = np.arange(len(vectors), dtype=np.int64) * 100000 + 3
+        index = build_trained_index(index_type, vectors, ids)
+
+        exported_ids, exported = export_vectors(index)
+        order = np.argsort(exported_ids)
+        np.testing.assert_array_equal(exported_ids[order], ids)
+        np.testing.assert_allclose(exported[order], vectors, rtol=1e-6)
+
+    @pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "hnsw"])
+    def test_remove_ids(self, vectors, index_type):
+        """测试按ID删除向量后不再被检索到"""
+        ids = np.arange(len(vectors), dtype=np.int64) * 100000
+        index = build_trained_index(index_type, vectors, ids)
+
+        index = remove_ids(index, ids[:10])
+        assert index.ntotal == len(vectors) - 10
+        _, found = index.search(vectors[:10], 5, params=search_parameters(index, nprobe=16, ef_search=64))
+        assert not set(found.ravel()) & set(ids[:10])
+
+    def test_tombstoned_rows_skipped(self, vectors):
+        """测试HNSW标记删除的行不被检索到，调用方过滤条件仍生效，重新添加的同ID向量可检索"""
+        ids = np.arange(len(vectors), dtype=np.int64) * 100000
+        index = build_trained_index("hnsw", vectors, ids)
+        dead = set(tombstone_rows(index, ids[:10], set()))
+        index.add_with_ids(vectors[:1], ids[:1])
+
+        assert dead == set(range(10))
+        assert tombstone_rows(index, ids[:1], dead) == [len(vectors)]
+        _, found = search_live(index, vectors[:10], 5, search_parameters(index, ef_search=64), dead)
+        assert not set(found.ravel()) & set(ids[1:10])
+        assert found[0, 0] == ids[0]
+
+        selector = faiss.IDSelectorBatch(ids[5:20])
+        _, found = search_live(index, vectors[:10], 5, search_parameters(index, ef_search=64, selector=selector), dead)
+        assert set(found.ravel()) - {-1} <= set(ids[10:20])
+
+        compacted = compact(index, dead)
+        assert compacted.ntotal == len(vectors) - 9
+        assert index_type_of(compacted) == "hnsw"
+
+    def test_recall_improves_with_nprobe(self, vectors):
+        """测试nprobe增大时召回率不下降，且全量探测时与精确检索一致"""
+        reference = build_trained_index("flat", vectors)
+        candidate = build_trained_index("ivf_flat", vectors)
+        queries = vectors[:50]
+
+        low = recall_at_k(reference, candidate, queries, k=10, nprobe=1)
+        full = recall_at_k(reference, candidate, queries, k=10, nprobe=candidate.nlist)
+
+        assert low["recall"] <= full["recall"]
+        assert full["recall"] == 1.0
+
+    def test_unknown_type_rejected(self):
+        """测试未知索引类型报错"""
+        with pytest.raises(ValueError):
+            build_index("lsh", 32)
+
+    @pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "hnsw"])
+    @pytest.mark.parametrize("storage,code_size", [("fp16", 64), ("sq8", 32)])
+    def test_quantised_storage(self, vectors, index_type, storage, code_size):
+        """测试半精度与8位量化存储的类型识别、每向量字节数与删除"""
+        ids = np.arange(len(vectors), dtype=np.int64) * 100000
+        index = build_trained_index(index_type, vectors, ids, storage=storage)
+
+        assert index_type_of(index) == index_type
+        assert storage_of(index) == storage
+        assert code_size_of(index) == code_size
+        index = remove_ids(index, ids[:10], storage=storage)
+        assert index.ntotal == len(vectors) - 10
+        assert storage_of(index) == storage
+
+    def test_new_sq8_index_accepts_adds(self, vectors):
+        """测试空的8位量化索引无需训练数据即可逐批添加单位向量"""
+        unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        index = new_flat_index(32, "sq8")
+        index.add_with_ids(unit[:3], np.arange(3, dtype=np.int64))
+
+        _, found = index.search(unit[:1], 1)
+        assert found[0, 0] == 0
+
+    def test_rescore_uses_full_precision_distance(self):
+        """测试重打分按全精度距离重新排序，缺少全精度向量的候选保留原距离"""
+        query = np.zeros(2, dtype=np.float32)
+        vectors = {1: np.asarray([1.0, 0.0], dtype=np.float32), 2: np.asarray([0.1, 0.0], dtype=np.float32)}
+
+        assert rescore(query, [(0.5, 1), (0.6, 2), (0.3, 3)], vectors, k=2) == [(pytest.approx(0.01), 2), (0.3, 3)]
+
+    def test_rescoring_restores_sq8_recall(self, vectors):
+        """测试8位量化索引经重打分后召回率不低于未重打分"""
+        unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        ids = np.arange(len(unit), dtype=np.int64)
+        index = build_trained_index("flat", unit, ids, storage="sq8")
+
+        report = quantization_recall(index, ids, unit, k=10, num_queries=50)
+        sample = quantization_recall(index, ids[:500], unit[:500], k=10, num_queries=50)
+
+        assert report["storage"] == "sq8"
+        assert report["rescored_recall"] >= report["recall"]
+        assert report["rescored_recall"] >= 0.99
+        assert sample["rescored_recall"] >= 0.99
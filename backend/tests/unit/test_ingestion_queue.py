@@ -0,0 +1,149 @@
+"""
+ingestion_queue.py 单元测试
+"""
+import threading
+import pytest
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from services.knowledge_base.ingestion_queue import IngestionQueue
+
+
+def make_documents(*ids):
+    return [{"id": doc_id, "title": f"新闻{doc_id}"} for doc_id in ids]
+
+
+class TestIngestionQueue:
+    """测试单写入线程入库队列"""
+
+    def test_pending_batches_coalesced(self):
+        """测试排队中的多个批次合并为一次写入，且同一文档只写入最新版本"""
+        writes = []
+        release = threading.Event()
+
+        def write(documents):
+            release.wait(timeout=2)
+            writes.append(documents)
+            return f"stored {len(documents)}"
+
+        queue = IngestionQueue(write, coalesce_ms=0)
+        first = queue.submit(make_documents(1))
+        while queue.get_stats()["pending_documents"]:
+            pass
+        # 第一次写入阻塞期间，后续批次在队列中等待
+        later = [queue.submit(make_documents(2, 3)), queue.submit([{"id": 3, "title": "更新"}])]
+        release.set()
+
+        assert first.result(timeout=2) == "stored 1"
+        assert [future.result(timeout=2) for future in later] == ["stored 2", "stored 2"]
+        assert [[doc["id"] for doc in documents] for documents in writes] == [[1], [2, 3]]
+        assert writes[1][1]["title"] == "更新"
+        queue.shutdown(timeout=2)
+
+    def test_backpressure_blocks_producers(self):
+        """测试队列满时提交被阻塞，超时报错"""
+        release = threading.Event()
+        queue = IngestionQueue(lambda documents: release.wait(timeout=2), max_pending_documents=2, coalesce_ms=0)
+        queue.submit(make_documents(1))
+        # 等待写入线程取走第一批
+        while queue.get_stats()["pending_documents"]:
+            pass
+        queue.submit(make_documents(2, 3))
+
+        with pytest.raises(TimeoutError):
+            queue.submit(make_documents(4), timeout=0.05)
+        release.set()
+        assert queue.flush(timeout=2)
+
+    def test_shutdown_flushes_queue(self):
+        """测试关闭时写完已排队的文档并拒绝新的提交"""
+        written = []
+        queue = IngestionQueue(lambda documents: written.extend(documents), coalesce_ms=50)
+        queue.submit(make_documents(1, 2))
+        queue.submit(make_documents(3))
+
+        queue.shutdown(timeout=2)
+
+        assert sorted(doc["id"] for doc in written) == [1, 2, 3]
+        with pytest.raises(RuntimeError):
+            queue.submit(make_documents(4))
+
+    def test_write_failure_reaches_producers(self):
+        """测试写入失败时异常传递给对应的提交者"""
+        def write(documents):
+            raise ValueError("embedding failed")
+
+        queue = IngestionQueue(write, coalesce_ms=0)
+        future = queue.submit(make_documents(1))
+
+        with pytest.raises(ValueError):
+            future.result(timeout=2)
+        assert queue.get_stats()["failed_writes"] == 1
+        queue.shutdown(timeout=2)
+
+    def test_failed_merged_write_retries_batches_separately(self):
+        """测试合并写入失败后逐批重试，只有出错批次的提交者收到异常"""
+        writes = []
+        release = threading.Event()
+
+        def write(documents):
+            release.wait(timeout=2)
+            ids = [doc["id"] for doc in documents]
+            writes.append(ids)
+            if 4 in ids:
+                raise ValueError("bad document")
+            return f"stored {len(documents)}"
+
+        queue = IngestionQueue(write, coalesce_ms=0)
+        first = queue.submit(make_documents(1))
+        while queue.get_stats()["pending_documents"]:
+            pass
+        # 第一次写入阻塞期间，后续三个批次排队并合并为一次写入
+        good = queue.submit(make_documents(2, 3))
+        bad = queue.submit(make_documents(4))
+        last = queue.submit(make_documents(5))
+        release.set()
+
+        assert first.result(timeout=2) == "stored 1"
+        assert good.result(timeout=2) == "stored 2"
+        assert last.result(timeout=2) == "stored 1"
+        with pytest.raises(ValueError):
+            bad.result(timeout=2)
+        assert writes == [[1], [2, 3, 4, 5], [2, 3], [4], [5]]
+        assert queue.get_stats()["failed_writes"] == 1
+        queue.shutdown(timeout=2)
+
+    def test_delete_applied_after_queued_add(self):
+        """测试文档的写入仍在排队时删除它，删除排在写入之后执行，索引中不留下该文档"""
+        stored = {}
+        operations = []
+        release = threading.Event()
+
+        def write(documents):
+            release.wait(timeout=2)
+            operations.append(("add", [doc["id"] for doc in documents]))
+            stored.update((doc["id"], doc) for doc in documents)
+            return f"stored {len(documents)}"
+
+        def delete(document_ids):
+            operations.append(("delete", document_ids))
+            return sum(stored.pop(document_id, None) is not None for document_id in document_ids)
+
+        queue = IngestionQueue(write, delete, coalesce_ms=0)
+        queue.submit(make_documents(1))
+        while queue.get_stats()["pending_documents"]:
+            pass
+        # 第一次写入阻塞期间：文档2、3排队写入，随后删除文档2，再写入文档4
+        queue.submit(make_documents(2, 3))
+        deleted = [queue.submit_delete([2]), queue.submit_delete([3])]
+        queue.submit(make_documents(4))
+        release.set()
+
+        assert [future.result(timeout=2) for future in deleted] == [2, 2]
+        assert queue.flush(timeout=2)
+        assert sorted(stored) == [1, 4]
+        assert operations == [("add", [1]), ("add", [2, 3]), ("delete", [2, 3]), ("add", [4])]
+        queue.shutdown(timeout=2)
@@ -0,0 +1,44 @@
+"""
+lexical.py 单元测试
+"""
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from services.knowledge_base.lexical import match_expression, reciprocal_rank_fusion, tokenize
+
+
+class TestTokenize:
+    """测试分词"""
+
+    def test_cjk_bigrams_and_words(self):
+        """测试中日韩文字切分为二元组，拉丁文字按词切分并转小写"""
+        assert tokenize("苹果发布iPhone 16") == ["苹果", "果发", "发布", "iphone", "16"]
+        assert tokenize("日本の経済") == ["日本", "本の", "の経", "経済"]
+
+    def test_single_character_and_punctuation(self):
+        """测试单个汉字保留，标点与空白不成词"""
+        assert tokenize("「涨」, GDP_增长!") == ["涨", "gdp", "增长"]
+        assert tokenize("") == []
+
+    def test_match_expression_quotes_terms(self):
+        """测试检索表达式对每个词加引号并以OR连接，去除重复词"""
+        assert match_expression('降息 "AND" 降息') == '"降息" OR "and"'
+        assert match_expression("？！") == ""
+
+
+class TestReciprocalRankFusion:
+    """测试倒数排名融合"""
+
+    def test_items_in_both_rankings_first(self):
+        """测试两个排名中都靠前的条目排在最前"""
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60)
+
+        assert [item for item, _ in fused] == ["a", "c", "b"]
+        assert fused[0][1] == 1 / 61 + 1 / 62
+
+    def test_ties_keep_first_ranking_order(self):
+        """测试分数相同时保持先出现的顺序"""
+        assert [item for item, _ in reciprocal_rank_fusion([["a"], ["b"]])] == ["a", "b"]
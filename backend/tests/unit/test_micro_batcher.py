@@ -0,0 +1,102 @@
+"""
+micro_batcher.py 单元测试
+"""
+import threading
+import pytest
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from services.knowledge_base.micro_batcher import MicroBatcher
+
+
+class TestMicroBatcher:
+    """测试微批处理"""
+    
+    def test_concurrent_calls_share_one_batch(self):
+        """测试并发调用被合并为一次批处理"""
+        batches = []
+        
+        def process(items):
+            batches.append(list(items))
+            return [item * 2 for item in items]
+        
+        batcher = MicroBatcher(process, max_batch_size=64, max_wait_ms=200)
+        start = threading.Barrier(8)
+        results = {}
+        
+        def call(value):
+            start.wait()
+            results[value] = batcher.submit_one(value).result(timeout=2)
+        
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        batcher.shutdown(timeout=2)
+        
+        assert results == {i: i * 2 for i in range(8)}
+        assert sum(len(batch) for batch in batches) == 8
+        assert len(batches) < 8
+    
+    def test_batch_size_limit(self):
+        """测试单批不超过最大批大小"""
+        batches = []
+        
+        def process(items):
+            batches.append(len(items))
+            return items
+        
+        batcher = MicroBatcher(process, max_batch_size=4, max_wait_ms=50)
+        futures = [batcher.submit([i, i]) for i in range(5)]
+        
+        assert [future.result(timeout=2) for future in futures] == [[i, i] for i in range(5)]
+        batcher.shutdown(timeout=2)
+        assert max(batches) <= 4
+    
+    def test_query_not_held_up_by_large_request(self):
+        """测试大请求按批大小分片处理，期间提交的单条查询先于大请求完成"""
+        batches = []
+        first_started = threading.Event()
+        release = threading.Event()
+        
+        def process(items):
+            batches.append(list(items))
+            if len(batches) == 1:
+                first_started.set()
+                release.wait(timeout=2)
+            return [item * 2 for item in items]
+        
+        batcher = MicroBatcher(process, max_batch_size=4, max_wait_ms=1)
+        finished = []
+        large = batcher.submit(list(range(12)))
+        large.add_done_callback(lambda _: finished.append("large"))
+        assert first_started.wait(timeout=2)
+        query = batcher.submit_one(100)
+        query.add_done_callback(lambda _: finished.append("query"))
+        release.set()
+        
+        assert query.result(timeout=2) == 200
+        assert large.result(timeout=2) == [i * 2 for i in range(12)]
+        batcher.shutdown(timeout=2)
+        assert finished == ["query", "large"]
+        assert batches == [[0, 1, 2, 3], [100], [4, 5, 6, 7], [8, 9, 10, 11]]
+    
+    def test_errors_reach_every_caller(self):
+        """测试批处理异常传递给所有调用方"""
+        def process(items):
+            raise RuntimeError("model failed")
+        
+        batcher = MicroBatcher(process, max_wait_ms=1)
+        
+        with pytest.raises(RuntimeError):
+            batcher.submit(["a", "b"]).result(timeout=2)
+        batcher.shutdown(timeout=2)
+    
+    def test_empty_submit(self):
+        """测试空请求直接返回"""
+        batcher = MicroBatcher(lambda items: items)
+        assert batcher.submit([]).result(timeout=1) == []
@@ -0,0 +1,50 @@
+"""
+model_metadata.py 单元测试
+"""
+import os
+import sys
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from services.knowledge_base.model_metadata import (
+    ModelMetadata, ModelMetadataMismatchError, validate_index_metadata
+)
+
+
+class TestModelMetadata:
+    """测试嵌入模型元数据的持久化与校验"""
+
+    def test_save_and_load(self, tmp_path):
+        """测试元数据写入后可完整读回"""
+        path = str(tmp_path / "index_meta.json")
+        metadata = ModelMetadata("model-a", 384, max_seq_length=256, normalize=True, model_hash="abc")
+        metadata.save(path)
+
+        loaded = ModelMetadata.load(path)
+        assert loaded.to_dict() == metadata.to_dict()
+        assert ModelMetadata.load(str(tmp_path / "missing.json")) is None
+
+    def test_backend_does_not_affect_compatibility(self):
+        """测试同一模型的ONNX与PyTorch后端可共用索引"""
+        torch_meta = ModelMetadata("model-a", 384, normalize=True, model_hash="abc", backend="torch")
+        onnx_meta = ModelMetadata("model-a", 384, normalize=True, model_hash="abc", backend="onnx-int8")
+
+        assert torch_meta.mismatches(onnx_meta) == []
+
+    def test_model_mismatch_fails_fast(self):
+        """测试索引由其他模型构建时直接报错"""
+        model_meta = ModelMetadata("model-b", 384, model_hash="def")
+        index_meta = ModelMetadata("model-a", 384, model_hash="abc")
+
+        with pytest.raises(ModelMetadataMismatchError):
+            validate_index_metadata(index_meta, model_meta, 384, "./data")
+
+    def test_legacy_index_checked_on_dimension(self):
+        """测试没有元数据的旧索引按维度校验"""
+        model_meta = ModelMetadata("model-a", 768)
+
+        validate_index_metadata(None, model_meta, 768, "./data")
+        with pytest.raises(ModelMetadataMismatchError):
+            validate_index_metadata(None, model_meta, 384, "./data")
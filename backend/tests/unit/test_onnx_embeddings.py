@@ -0,0 +1,197 @@
+"""
+onnx_embeddings.py 单元测试（使用替身会话与分词器，不依赖onnxruntime）
+"""
+import json
+import os
+import sys
+from unittest.mock import patch
+import numpy as np
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from services.knowledge_base import onnx_embeddings as onnx_module
+from services.knowledge_base import embedding_service as embedding_module
+from services.knowledge_base.onnx_embeddings import OnnxEmbeddings
+from services.knowledge_base.embedding_service import EmbeddingService
+
+MODEL_NAME = "test/model"
+
+
+class FakeTokenizer:
+    """按空格分词，填充到批内最长长度"""
+
+    def __call__(self, texts, padding=True, truncation=True, max_length=None, return_tensors="np"):
+        lengths = [len(text.split()) for text in texts]
+        width = max(lengths)
+        mask = np.asarray([[1] * n + [0] * (width - n) for n in lengths], dtype=np.int64)
+        return {"input_ids": mask.copy(), "attention_mask": mask, "token_type_ids": np.zeros_like(mask)}
+
+
+class FakeSession:
+    """返回预设隐藏状态的推理会话，记录输入名称"""
+
+    def __init__(self, hidden):
+        self.hidden = hidden
+        self.inputs = None
+
+    def run(self, outputs, inputs):
+        self.inputs = inputs
+        return [self.hidden]
+
+
+def make_backend(hidden, pooling_mode="mean", normalize=True, model_dir=None):
+    """不经过 __init__ 构造后端，注入替身会话与分词器"""
+    backend = OnnxEmbeddings.__new__(OnnxEmbeddings)
+    backend.config = {"model_name": MODEL_NAME, "pooling_mode": pooling_mode, "normalize": normalize, "model_hash": None}
+    backend.model_dir = model_dir
+    backend.quantized = True
+    backend.model_path = os.path.join(model_dir, OnnxEmbeddings.QUANTIZED_MODEL_FILE) if model_dir else None
+    backend.tokenizer = FakeTokenizer()
+    backend.session = FakeSession(hidden)
+    backend.input_names = {"input_ids", "attention_mask"}
+    backend.max_seq_length = 16
+    backend.batch_size = 32
+    return backend
+
+
+def write_export(tmp_path, parity):
+    """写入导出的模型文件与一致性记录"""
+    model_dir = OnnxEmbeddings.model_dir_for(str(tmp_path), MODEL_NAME)
+    os.makedirs(model_dir, exist_ok=True)
+    model_path = os.path.join(model_dir, OnnxEmbeddings.QUANTIZED_MODEL_FILE)
+    with open(model_path, "wb") as f:
+        f.write(b"onnx" * 10)
+    if parity is not None:
+        with open(os.path.join(model_dir, OnnxEmbeddings.PARITY_FILE), "w", encoding="utf-8") as f:
+            json.dump({"model_size": os.path.getsize(model_path), **parity}, f)
+    return model_dir
+
+
+class TestEncode:
+    """测试池化与归一化"""
+
+    def test_mean_pooling_ignores_padding_then_normalises(self):
+        """测试平均池化只计入注意力掩码内的词元，结果归一化为单位向量"""
+        hidden = np.asarray([
+            [[1.0, 0.0], [3.0, 0.0], [100.0, 100.0]],  # 第三个词元是填充
+            [[0.0, 2.0], [0.0, 4.0], [0.0, 6.0]],
+        ], dtype=np.float32)
+        backend = make_backend(hidden)
+
+        vectors = backend._encode(["a b", "a b c"])
+
+        assert np.allclose(vectors, [[1.0, 0.0], [0.0, 1.0]])
+        assert set(backend.session.inputs) == {"input_ids", "attention_mask"}
+        assert backend.session.inputs["input_ids"].dtype == np.int64
+
+    def test_without_normalisation(self):
+        """测试模型不含归一化层时保留池化后的长度"""
+        hidden = np.asarray([[[2.0, 0.0], [4.0, 0.0]]], dtype=np.float32)
+        backend = make_backend(hidden, normalize=False)
+
+        assert np.allclose(backend._encode(["a b"]), [[3.0, 0.0]])
+
+
+class TestLoad:
+    """测试按一致性记录决定是否加载已导出的模型"""
+
+    @pytest.fixture(autouse=True)
+    def onnx_available(self):
+        with patch.object(onnx_module, "ONNX_AVAILABLE", True), \
+                patch.object(OnnxEmbeddings, "__init__", lambda self, model_dir, quantized=True: None):
+            yield
+
+    def load(self, tmp_path, quantized=True, min_cosine=0.99):
+        return OnnxEmbeddings.load(str(tmp_path), MODEL_NAME, quantized=quantized, min_cosine=min_cosine)
+
+    def test_passing_record_loads(self, tmp_path):
+        """测试一致性检查通过且模型未变化时加载"""
+        write_export(tmp_path, {"min_cosine": 0.995, "quantized": True})
+
+        assert isinstance(self.load(tmp_path), OnnxEmbeddings)
+
+    def test_record_gates(self, tmp_path):
+        """测试缺少记录、量化方式不同、相似度低于阈值时不加载"""
+        assert self.load(tmp_path) is None
+        write_export(tmp_path, {"min_cosine": 0.995, "quantized": True})
+        assert self.load(tmp_path, quantized=False) is None
+        assert self.load(tmp_path, min_cosine=0.999) is None
+
+    def test_changed_model_file_not_loaded(self, tmp_path):
+        """测试模型文件大小与记录不符时不加载"""
+        model_dir = write_export(tmp_path, {"min_cosine": 0.995, "quantized": True})
+        with open(os.path.join(model_dir, OnnxEmbeddings.QUANTIZED_MODEL_FILE), "ab") as f:
+            f.write(b"changed")
+
+        assert self.load(tmp_path) is None
+
+
+class FakeTorchEmbeddings:
+    """代替PyTorch模型的嵌入"""
+
+    def embed_documents(self, texts):
+        return [[1.0, 0.0] for _ in texts]
+
+    def embed_query(self, text):
+        return [1.0, 0.0]
+
+
+@pytest.fixture
+def onnx_settings(tmp_path):
+    """配置为ONNX后端，PyTorch模型以替身代替"""
+    values = {"EMBEDDING_BACKEND": "onnx", "EMBEDDING_ONNX_DIR": str(tmp_path), "EMBEDDING_ONNX_QUANTIZE": True,
+              "EMBEDDING_ONNX_PARITY_THRESHOLD": 0.99, "EMBEDDING_CACHE_ENABLED": False,
+              "EMBEDDING_MICRO_BATCHING": False}
+
+    def load_torch(service):
+        service.embeddings = FakeTorchEmbeddings()
+
+    with patch.multiple(embedding_module.settings, **values), \
+            patch.object(embedding_module, "ONNX_AVAILABLE", True), \
+            patch.object(EmbeddingService, "_initialize_torch_embeddings", load_torch), \
+            patch.object(EmbeddingService, "_record_metadata", lambda service: None):
+        yield embedding_module.settings
+
+
+class TestTorchFallback:
+    """测试ONNX不可用或一致性不足时回退到PyTorch"""
+
+    def test_failed_parity_keeps_torch_and_is_not_retried(self, onnx_settings, tmp_path):
+        """测试一致性检查失败时保留PyTorch，记录结果后下次启动不再重复导出"""
+        model_dir = write_export(tmp_path, None)
+        exported = make_backend(np.zeros((1, 1, 2), dtype=np.float32), model_dir=model_dir)
+        exported.embed_documents = lambda texts: [[0.0, 1.0] for _ in texts]
+
+        with patch.object(OnnxEmbeddings, "export", return_value=exported) as export:
+            first = EmbeddingService(MODEL_NAME)
+            second = EmbeddingService(MODEL_NAME)
+            with patch.object(onnx_settings, "EMBEDDING_ONNX_PARITY_THRESHOLD", 0.5):
+                EmbeddingService(MODEL_NAME)
+
+        assert first.backend == "torch"
+        assert isinstance(first.embeddings, FakeTorchEmbeddings)
+        assert second.backend == "torch"
+        # 第二次启动跳过导出；阈值变化后重新导出
+        assert export.call_count == 2
+
+    def test_passing_parity_switches_to_onnx(self, onnx_settings, tmp_path):
+        """测试一致性检查通过时切换到ONNX后端"""
+        model_dir = write_export(tmp_path, None)
+        exported = make_backend(np.zeros((1, 1, 2), dtype=np.float32), model_dir=model_dir)
+        exported.embed_documents = lambda texts: [[1.0, 0.0] for _ in texts]
+
+        with patch.object(OnnxEmbeddings, "export", return_value=exported):
+            service = EmbeddingService(MODEL_NAME)
+
+        assert service.backend == "onnx-int8"
+        assert service.embeddings is exported
+
+    def test_export_error_keeps_torch(self, onnx_settings):
+        """测试导出出错时保留PyTorch"""
+        with patch.object(OnnxEmbeddings, "export", side_effect=RuntimeError("export failed")):
+            service = EmbeddingService(MODEL_NAME)
+
+        assert service.backend == "torch"
+        assert isinstance(service.embeddings, FakeTorchEmbeddings)
@@ -0,0 +1,116 @@
+"""
+query_pipeline.py 单元测试
+"""
+import threading
+import time
+import pytest
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from services.assistant.query_pipeline import PipelineStage, QueryPipeline
+
+
+class TestQueryPipeline:
+    """测试依赖感知的查询流水线"""
+    
+    def test_only_consumed_stages_run(self):
+        """测试没有被消费的阶段不会执行"""
+        calls = []
+        
+        def stage(name, value):
+            def func(run):
+                calls.append(name)
+                return value
+            return func
+        
+        pipeline = QueryPipeline([
+            PipelineStage("keywords", stage("keywords", ["k"])),
+            PipelineStage("search", stage("search", [1, 2])),
+            PipelineStage("answer", lambda run: calls.append("answer") or len(run.get("search")), requires=("search",)),
+        ])
+        
+        result = pipeline.run({"query": "q"}, ["answer"])
+        
+        assert result == {"answer": 2}
+        assert "keywords" not in calls
+        assert calls.count("search") == 1
+    
+    def test_independent_stages_run_concurrently(self):
+        """测试互不依赖的阶段并行执行"""
+        barrier = threading.Barrier(2, timeout=2)
+        
+        def wait_for_peer(run):
+            barrier.wait()
+            return True
+        
+        pipeline = QueryPipeline([
+            PipelineStage("left", wait_for_peer),
+            PipelineStage("right", wait_for_peer),
+            PipelineStage("join", lambda run: run.get("left") and run.get("right"), requires=("left", "right")),
+        ])
+        
+        assert pipeline.run({}, ["join"]) == {"join": True}
+    
+    def test_speculative_stage_cancelled_when_unused(self):
+        """测试推测执行的分支在未被使用时被取消"""
+        started = threading.Event()
+        
+        def slow_online(run):
+            started.set()
+            while not run.is_cancelled("online"):
+                time.sleep(0.01)
+            return "cancelled"
+        
+        pipeline = QueryPipeline([
+            PipelineStage("kb", lambda run: ["hit"]),
+            PipelineStage("online", slow_online, speculative=True),
+            PipelineStage("sources", lambda run: run.get("kb") or run.get("online"),
+                          requires=("kb",), optional=("online",)),
+        ])
+        
+        result = pipeline.run({}, ["sources"])
+        
+        assert result == {"sources": ["hit"]}
+        assert started.wait(1)
+    
+    def test_speculative_stage_used_as_fallback(self):
+        """测试推测执行的分支在需要时提供结果"""
+        calls = []
+        
+        def online(run):
+            calls.append("online")
+            return ["online"]
+        
+        pipeline = QueryPipeline([
+            PipelineStage("kb", lambda run: []),
+            PipelineStage("online", online, speculative=True),
+            PipelineStage("sources", lambda run: run.get("kb") or run.get("online"),
+                          requires=("kb",), optional=("online",)),
+        ])
+        
+        assert pipeline.run({}, ["sources"]) == {"sources": ["online"]}
+        assert calls == ["online"]
+    
+    def test_stage_error_propagates(self):
+        """测试阶段异常向调用方传播"""
+        def fail(run):
+            raise RuntimeError("boom")
+        
+        pipeline = QueryPipeline([
+            PipelineStage("search", fail),
+            PipelineStage("answer", lambda run: run.get("search"), requires=("search",)),
+        ])
+        
+        with pytest.raises(RuntimeError):
+            pipeline.run({}, ["answer"])
+    
+    def test_cycle_rejected(self):
+        """测试循环依赖被拒绝"""
+        with pytest.raises(ValueError):
+            QueryPipeline([
+                PipelineStage("a", lambda run: 1, requires=("b",)),
+                PipelineStage("b", lambda run: 2, requires=("a",)),
+            ])
@@ -0,0 +1,187 @@
+"""
+reindex_service.py 单元测试
+"""
+import os
+import sys
+import hashlib
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+import numpy as np
+import pytest
+from sqlmodel import Session, SQLModel, create_engine
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from models.document import Document
+from models.source import Source
+from services.knowledge_base.model_metadata import ModelMetadata
+from services.knowledge_base import vector_store_service as vector_store_module
+from services.knowledge_base.vector_store_service import VectorStoreService, CURRENT_STORE_FILE
+from services.knowledge_base.reindex_service import ReindexService
+
+DIMENSION = 16
+
+
+class FakeEmbeddingService:
+    """按文本哈希生成确定性向量的嵌入服务"""
+
+    model_name = "fake-model"
+    backend = "torch"
+
+    def __init__(self):
+        self.metadata = ModelMetadata(self.model_name, DIMENSION, normalize=True)
+        self.langchain_embeddings = MagicMock()
+
+    def get_embedding_dimension(self):
+        return DIMENSION
+
+    def embed_texts(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_queries(self, queries):
+        return [self.embed_query(query) for query in queries]
+
+    def embed_query(self, text):
+        seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+        vector = np.random.default_rng(seed).normal(size=DIMENSION)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+TEXTS = {1: "央行宣布降息", 2: "球队签下新前锋", 3: "新款手机发布", 4: "暴雨导致航班延误", 5: "股市全线上涨"}
+
+
+@pytest.fixture
+def setup(tmp_path):
+    """临时向量库与写入了文档表的临时数据库"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    SQLModel.metadata.create_all(engine, tables=[Source.__table__, Document.__table__])
+    with Session(engine) as session:
+        for doc_id, text in TEXTS.items():
+            session.add(Document(id=doc_id, title=f"新闻{doc_id}", link="", description=text,
+                                 pub_date=datetime(2024, 5, doc_id), source_id=1))
+        session.commit()
+
+    rerank = MagicMock()
+    rerank.is_available.return_value = False
+    with patch.object(vector_store_module, "embedding_service", FakeEmbeddingService()), \
+            patch.object(vector_store_module, "rerank_service", rerank), \
+            patch.object(vector_store_module.settings, "FAISS_INDEX_PATH", str(tmp_path / "index.faiss")):
+        store = VectorStoreService()
+        # 旧索引只有文档1，且内容已过时
+        store.add_documents([{"id": 1, "title": "新闻1", "description": "旧的内容", "pub_date": ""}])
+        yield store, engine, ReindexService(store=store, session_factory=lambda: Session(engine))
+
+
+def found_ids(store, query):
+    return [result["metadata"]["document_id"] for result in store.search(query, k=1, rerank=False)]
+
+
+class NewModelEmbeddingService(FakeEmbeddingService):
+    """模拟换用另一个模型：同一文本得到不同的向量"""
+
+    model_name = "new-model"
+
+    def embed_query(self, text):
+        return super().embed_query(f"new:{text}")
+
+
+class TestReindexService:
+    """测试从文档表全量重建索引"""
+
+    def test_rebuilds_and_swaps_store(self, setup, tmp_path):
+        """测试分页重建后原子切换到新存储，重启后仍加载新存储"""
+        store, _, service = setup
+        original_path = store.store_path
+
+        service.start(page_size=2, workers=2)
+        assert service.wait(timeout=30)
+        status = service.get_status()
+
+        assert status["state"] == "completed"
+        assert status["processed_documents"] == status["total_documents"] == 5
+        assert status["progress"] == 1.0
+        assert store.store_path != original_path
+        assert store.docstore.count() == 5
+        assert found_ids(store, "球队签下新前锋") == [2]
+        assert store.search("旧的内容", k=5, rerank=False)[0]["content"] != "旧的内容"
+        assert os.path.exists(tmp_path / CURRENT_STORE_FILE)
+
+        reopened = VectorStoreService()
+        assert reopened.store_path == store.store_path
+        assert found_ids(reopened, "股市全线上涨") == [5]
+
+    def test_writes_during_reindex_replayed(self, setup):
+        """测试重建期间对线上索引的写入与删除在切换前补到新存储"""
+        store, engine, service = setup
+        pages = service._document_pages
+
+        def changed_after_first_page(page_size):
+            for number, page in enumerate(pages(page_size)):
+                yield page
+                if number == 0:
+                    # 第一页读出之后：文档1被更新，文档2被删除
+                    with Session(engine) as session:
+                        session.get(Document, 1).description = "油价大幅下跌"
+                        session.delete(session.get(Document, 2))
+                        session.commit()
+                    store.add_documents([{"id": 1, "title": "新闻1", "description": "油价大幅下跌", "pub_date": ""}])
+                    store.delete_documents([2])
+
+        with patch.object(service, "_document_pages", changed_after_first_page):
+            service.start(page_size=2, workers=1)
+            assert service.wait(timeout=30)
+
+        assert service.get_status()["state"] == "completed"
+        assert found_ids(store, "油价大幅下跌") == [1]
+        assert store.docstore.chunk_ids_for_documents([2]) == []
+        assert store.docstore.count() == 4
+
+    def test_failed_reindex_keeps_live_store(self, setup):
+        """测试重建失败时线上存储不变，未完成的新存储被删除"""
+        store, _, service = setup
+        original_path = store.store_path
+
+        with patch.object(service, "_index_page", side_effect=RuntimeError("embedding failed")):
+            service.start(page_size=2)
+            assert service.wait(timeout=30)
+
+        status = service.get_status()
+        assert status["state"] == "failed"
+        assert "embedding failed" in status["error"]
+        assert store.store_path == original_path
+        assert not os.path.exists(status["store_path"])
+        assert store.search("旧的内容", k=1, rerank=False)[0]["content"] == "旧的内容"
+        # 失败后可以重新开始
+        service.start(page_size=2)
+        assert service.wait(timeout=30)
+        assert service.get_status()["state"] == "completed"
+
+    def test_store_swapped_between_embedding_and_write(self, setup):
+        """测试写入在嵌入之后、加锁之前遇到存储切换时，用新模型重新嵌入并写入新存储"""
+        store, _, _ = setup
+        store.begin_reindex()
+        shadow = VectorStoreService(store_path=store.new_store_path(), embedding=NewModelEmbeddingService(),
+                                    mode="standalone")
+        old_embedding = store.embedding
+        embed_texts = old_embedding.embed_texts
+        replayed = []
+
+        def embed_then_swap(texts):
+            vectors = embed_texts(texts)
+            # 嵌入完成后、写入加锁前，重建索引切换到新存储
+            store.swap_store(shadow, replayed.append)
+            return vectors
+
+        with patch.object(old_embedding, "embed_texts", side_effect=embed_then_swap):
+            store.add_documents([{"id": 3, "title": "新闻3", "description": TEXTS[3], "pub_date": ""}])
+
+        assert store.embedding is shadow.embedding
+        chunk_ids = store.docstore.chunk_ids_for_documents([3])
+        chunks = store.docstore.get_chunks(chunk_ids)
+        vectors = store.docstore.get_vectors(chunk_ids)
+        for chunk_id in chunk_ids:
+            expected = shadow.embedding.embed_query(chunks[chunk_id].page_content)
+            assert np.allclose(vectors[chunk_id], expected, atol=1e-6)
+        # 切换后写入的文档直接进入新存储，不需要补写
+        assert replayed == []
@@ -0,0 +1,119 @@
+"""
+rerank_service.py 单元测试
+"""
+import os
+import sys
+import threading
+from unittest.mock import patch
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from services.knowledge_base import rerank_service as rerank_module
+from services.knowledge_base.rerank_service import RerankService
+
+
+class FakeCrossEncoder:
+    """以文本中查询词出现次数为分数的交叉编码器，记录每次调用的句对"""
+
+    max_length = 8
+
+    def __init__(self):
+        self.calls = []
+        self.batch_sizes = []
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.calls.append([tuple(pair) for pair in pairs])
+        self.batch_sizes.append(batch_size)
+        return [float(text.count(query)) for query, text in pairs]
+
+
+def make_service(**overrides):
+    """使用假交叉编码器创建重排序服务"""
+    settings = rerank_module.settings
+    values = {"RERANK_MICRO_BATCHING": False, "RERANK_CACHE_MAX_ENTRIES": 100, "RERANK_CHARS_PER_TOKEN": 4, **overrides}
+    with patch.object(RerankService, "_initialize_reranker", lambda self: setattr(self, "reranker", FakeCrossEncoder())), \
+            patch.multiple(settings, **values):
+        return RerankService()
+
+
+def make_result(document_id, content):
+    return {"content": content, "metadata": {"document_id": document_id, "chunk": 0}}
+
+
+class TestRerankService:
+    """测试交叉编码器重排序"""
+
+    def test_rerank_orders_by_score(self):
+        """测试按分数排序并返回分数与校准后的相关度"""
+        service = make_service()
+        results = [make_result(1, "降息"), make_result(2, "降息 降息"), make_result(3, "足球")]
+
+        reranked = service.rerank_results("降息", results, top_k=2)
+
+        assert [r["metadata"]["document_id"] for r in reranked] == [2, 1]
+        assert [r["rerank_score"] for r in reranked] == [2.0, 1.0]
+        assert 0.5 < reranked[1]["relevance"] < reranked[0]["relevance"] < 1.0
+
+    def test_cached_pairs_not_rescored(self):
+        """测试相同的查询与分块只计算一次，分块内容变化后重新计算"""
+        service = make_service()
+        results = [make_result(1, "降息"), make_result(2, "足球")]
+
+        service.rerank_results("降息", results)
+        service.rerank_results("降息", results + [make_result(3, "降息")])
+        service.rerank_results("降息", [make_result(1, "降息 降息")])
+
+        assert [len(call) for call in service.reranker.calls] == [2, 1, 1]
+        assert service.get_stats()["cache"]["hits"] == 2
+
+    def test_many_queries_scored_together(self):
+        """测试多个查询的句对在一次模型调用中打分，结果按查询分组"""
+        service = make_service()
+
+        scored = service.score_results_many(
+            ["降息", "足球"],
+            [[make_result(1, "降息"), make_result(2, "足球")], [make_result(3, "足球 足球")]]
+        )
+
+        assert [[r["rerank_score"] for r in results] for results in scored] == [[1.0, 0.0], [2.0]]
+        assert len(service.reranker.calls) == 1
+
+    def test_forward_pass_size_capped(self):
+        """测试一次打分的句对再多，每次前向计算也不超过批量上限"""
+        service = make_service()
+
+        with patch.object(rerank_module.settings, "RERANK_BATCH_MAX_SIZE", 2):
+            service.rerank_results("降息", [make_result(i, "降息") for i in range(5)])
+
+        assert [len(call) for call in service.reranker.calls] == [5]
+        assert service.reranker.batch_sizes == [2]
+
+    def test_long_text_truncated(self):
+        """测试超过模型最大长度的文本在分词前被截断"""
+        service = make_service()
+
+        service.score("查询", ["字" * 100])
+
+        assert service.reranker.calls[0][0][1] == "字" * 32
+
+    def test_concurrent_queries_share_forward_pass(self):
+        """测试并发请求的句对合并为一次模型调用"""
+        service = make_service(RERANK_MICRO_BATCHING=True, RERANK_BATCH_MAX_WAIT_MS=200, RERANK_CACHE_MAX_ENTRIES=0)
+        barrier = threading.Barrier(3)
+        scores = {}
+
+        def query(name):
+            barrier.wait()
+            scores[name] = service.score(name, [f"{name}", "无关"])
+
+        threads = [threading.Thread(target=query, args=(name,)) for name in ("甲", "乙", "丙")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert scores == {"甲": [1.0, 0.0], "乙": [1.0, 0.0], "丙": [1.0, 0.0]}
+        assert len(service.reranker.calls) == 1
+        assert service.get_stats()["batching"]["items"] == 6
@@ -0,0 +1,114 @@
+"""
+segment_store.py 单元测试
+"""
+import os
+import sys
+import threading
+import numpy as np
+import faiss
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from services.knowledge_base.segment_store import SegmentStore
+
+DIMENSION = 8
+
+
+def make_batch(start, count):
+    """生成一批分块ID和向量"""
+    ids = np.arange(start, start + count, dtype=np.int64)
+    vectors = np.random.default_rng(start).normal(size=(count, DIMENSION)).astype(np.float32)
+    return ids, vectors
+
+
+def new_store(directory, **kwargs):
+    """创建空存储并写入初始基线"""
+    store = SegmentStore(str(directory), **kwargs)
+    store.initialize()
+    store.checkpoint(faiss.IndexIDMap2(faiss.IndexFlatL2(DIMENSION)))
+    return store
+
+
+def stored_ids(index):
+    return sorted(faiss.vector_to_array(faiss.downcast_index(index).id_map).tolist())
+
+
+class TestSegmentStore:
+    """测试向量索引的基线快照与追加日志"""
+
+    def test_log_replay_round_trip(self, tmp_path):
+        """测试追加的新增与删除记录在重新加载时被重放"""
+        store = new_store(tmp_path)
+        store.append_add(*make_batch(0, 5))
+        store.append_add(*make_batch(5, 5))
+        store.append_delete(np.asarray([1, 6], dtype=np.int64))
+        store.close()
+
+        index, legacy = SegmentStore(str(tmp_path)).load(DIMENSION)
+
+        assert stored_ids(index) == [0, 2, 3, 4, 5, 7, 8, 9]
+        assert legacy == {}
+
+    def test_torn_tail_discarded(self, tmp_path):
+        """测试日志末尾不完整的记录被丢弃，之前的记录保留"""
+        store = new_store(tmp_path)
+        store.append_add(*make_batch(0, 3))
+        store.close()
+        wal_path = os.path.join(str(tmp_path), "log-00000001.wal")
+        with open(wal_path, "ab") as f:
+            f.write(b"\x10\x00\x00\x00partial")
+
+        reopened = SegmentStore(str(tmp_path))
+        index, _ = reopened.load(DIMENSION)
+
+        assert stored_ids(index) == [0, 1, 2]
+        # 截断后可继续追加
+        reopened.append_add(*make_batch(3, 1))
+        reopened.close()
+        assert SegmentStore(str(tmp_path)).load(DIMENSION)[0].ntotal == 4
+
+    def test_segments_merged_in_background(self, tmp_path):
+        """测试日志封存为分段并在后台合并为新基线"""
+        store = new_store(tmp_path, wal_max_bytes=1, merge_min_segments=2)
+        index = faiss.IndexIDMap2(faiss.IndexFlatL2(DIMENSION))
+        for start in (0, 4):
+            ids, vectors = make_batch(start, 4)
+            store.append_add(ids, vectors)
+            index.add_with_ids(vectors, ids)
+
+        assert store.needs_merge()
+        assert store.merge_in_background(lambda: index, threading.RLock())
+        store.wait_for_merge()
+
+        stats = store.get_stats()
+        assert stats["segments"] == 0 and stats["merges"] == 2
+        assert not [name for name in os.listdir(str(tmp_path)) if name.endswith(".wal")]
+        assert SegmentStore(str(tmp_path)).load(DIMENSION)[0].ntotal == 8
+
+    def test_checkpoint_drops_covered_logs(self, tmp_path):
+        """测试检查点写入的基线不会被旧日志重复应用"""
+        store = new_store(tmp_path)
+        ids, vectors = make_batch(0, 3)
+        store.append_add(ids, vectors)
+        index = faiss.IndexIDMap2(faiss.IndexFlatL2(DIMENSION))
+        index.add_with_ids(vectors, ids)
+        store.checkpoint(index)
+        store.close()
+
+        assert SegmentStore(str(tmp_path)).load(DIMENSION)[0].ntotal == 3
+
+    def test_records_with_texts_returned_for_import(self, tmp_path):
+        """测试旧格式日志中携带的分块文本在加载时返回以便导入"""
+        store = new_store(tmp_path)
+        ids, vectors = make_batch(0, 2)
+        store._append({
+            "op": "add", "ids": ids, "vectors": vectors,
+            "docstore_ids": ["a", "b"], "docs": [("文本A", {"chunk": 0}), ("文本B", {"chunk": 1})]
+        })
+        store.append_delete(np.asarray([1], dtype=np.int64))
+        store.close()
+
+        _, legacy = SegmentStore(str(tmp_path)).load(DIMENSION)
+
+        assert legacy == {0: ("a", "文本A", {"chunk": 0})}
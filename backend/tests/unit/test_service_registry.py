@@ -0,0 +1,98 @@
+"""
+service_registry.py 单元测试
+"""
+import os
+import sys
+import threading
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from core.service_registry import ServiceRegistry
+
+
+class DummyService:
+    """测试用服务"""
+
+    def __init__(self):
+        self.value = 1
+
+    def ping(self):
+        return "pong"
+
+
+class TestServiceRegistry:
+    """测试延迟加载服务注册表"""
+
+    def test_service_built_on_first_use(self):
+        """测试服务在首次访问属性时才创建"""
+        created = []
+
+        def factory():
+            created.append(True)
+            return DummyService()
+
+        registry = ServiceRegistry()
+        service = registry.register("dummy", factory)
+
+        assert created == []
+        assert service.ping() == "pong"
+        assert service.value == 1
+        assert created == [True]
+
+    def test_attribute_writes_forwarded(self):
+        """测试属性赋值作用于真实实例"""
+        registry = ServiceRegistry()
+        service = registry.register("dummy", DummyService)
+
+        service.value = 5
+        assert registry.get("dummy").value == 5
+
+    def test_concurrent_access_builds_once(self):
+        """测试并发访问只创建一次实例"""
+        created = []
+        gate = threading.Event()
+
+        def factory():
+            gate.wait(1)
+            created.append(True)
+            return DummyService()
+
+        registry = ServiceRegistry()
+        service = registry.register("dummy", factory)
+        threads = [threading.Thread(target=service.ping) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        gate.set()
+        for thread in threads:
+            thread.join()
+
+        assert len(created) == 1
+
+    def test_readiness_after_warm_up(self):
+        """测试预热完成后就绪，非预热服务不影响就绪状态"""
+        registry = ServiceRegistry()
+        registry.register("warm", DummyService)
+        cold = registry.register("cold", DummyService, warm=False)
+
+        assert registry.is_ready() is False
+        registry.start_warm_up().join(5)
+
+        assert registry.is_ready() is True
+        assert cold.is_loaded() is False
+
+    def test_failed_load_reported(self):
+        """测试加载失败时记录错误且未就绪"""
+        def factory():
+            raise RuntimeError("model missing")
+
+        registry = ServiceRegistry()
+        service = registry.register("broken", factory)
+        registry.warm_up()
+
+        status = registry.get_status()
+        assert status["ready"] is False
+        assert status["services"]["broken"]["error"] == "model missing"
+        with pytest.raises(RuntimeError):
+            service.ping()
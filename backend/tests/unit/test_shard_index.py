@@ -0,0 +1,197 @@
+"""
+shard_index.py 单元测试
+"""
+import os
+import sys
+from datetime import datetime
+from unittest.mock import patch
+import numpy as np
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from services.knowledge_base import index_factory
+from services.knowledge_base.index_factory import build_trained_index
+from services.knowledge_base.shard_index import (
+    ReadOnlyIndexError, ShardedIndex, shard_key_for, shard_range, UNDATED_SHARD
+)
+
+DIMENSION = 8
+
+
+def make_batch(start, count):
+    """生成一批分块ID和向量"""
+    ids = np.arange(start, start + count, dtype=np.int64)
+    vectors = np.random.default_rng(start).normal(size=(count, DIMENSION)).astype(np.float32)
+    return ids, vectors
+
+
+def new_index(directory, **kwargs):
+    """创建按月分片的索引并写入三个月份的数据"""
+    index = ShardedIndex(str(directory), DIMENSION, **kwargs)
+    index.open()
+    for start, key in ((0, "2024-03"), (10, "2024-04"), (20, "2024-05")):
+        index.add(key, *make_batch(start, 10))
+    return index
+
+
+def no_params(index):
+    return None
+
+
+class TestShardKeys:
+    """测试分片键与时间范围"""
+
+    def test_month_and_week_keys(self):
+        """测试按月、按周与无日期的分片键"""
+        moment = datetime(2024, 5, 15, 12).timestamp()
+
+        assert shard_key_for(moment, "month") == "2024-05"
+        assert shard_key_for(moment, "week") == "2024-W20"
+        assert shard_key_for(None, "month") == UNDATED_SHARD
+        assert shard_key_for(moment, "none") == "all"
+
+    def test_ranges(self):
+        """测试分片键还原为发布时间范围"""
+        assert shard_range("2024-12") == (datetime(2024, 12, 1), datetime(2025, 1, 1))
+        assert shard_range("2024-W20") == (datetime(2024, 5, 13), datetime(2024, 5, 20))
+        assert shard_range(UNDATED_SHARD) is None
+
+
+class TestShardedIndex:
+    """测试按时间分片的向量索引"""
+
+    def test_newest_shard_first_with_early_stop(self, tmp_path):
+        """测试最新分片的结果足够接近时不再检索更早的分片"""
+        index = new_index(tmp_path)
+        _, vectors = make_batch(20, 10)
+
+        hits = index.search(vectors[:1], 1, no_params, stop_distance=1e-3)
+
+        assert hits[0][1] == 20
+        assert index.get_stats()["early_stops"] == 1
+        assert index.get_stats()["average_shards_searched"] == 1.0
+
+    def test_results_merged_across_shards(self, tmp_path):
+        """测试未提前停止时合并各分片的结果"""
+        index = new_index(tmp_path)
+        _, vectors = make_batch(0, 10)
+
+        hits = index.search(vectors[:1], 5, no_params)
+
+        assert hits[0] == (0.0, 0)
+        assert [distance for distance, _ in hits] == sorted(distance for distance, _ in hits)
+        assert index.get_stats()["average_shards_searched"] == 3.0
+
+    def test_batch_search_matches_single_queries(self, tmp_path):
+        """测试多个查询一次检索的结果与逐个检索一致，且所有查询都足够接近时才提前停止"""
+        index = new_index(tmp_path)
+        _, newest = make_batch(20, 10)
+        _, oldest = make_batch(0, 10)
+        queries = np.vstack([newest[:1], oldest[:1]])
+
+        batch = index.search_batch(queries, 3, no_params)
+        # 第一个查询在最新分片即可停止，第二个查询仍需检索最早的分片
+        stopped = index.search_batch(queries, 1, no_params, stop_distance=1e-3)
+
+        assert batch == [index.search(query[None], 3, no_params) for query in queries]
+        assert stopped == [[(0.0, 20)], [(0.0, 0)]]
+        assert index.get_stats()["early_stops"] == 0
+
+    def test_window_skips_shards(self, tmp_path):
+        """测试日期窗口之外的分片与无日期分片不被检索"""
+        index = new_index(tmp_path)
+        index.add(UNDATED_SHARD, *make_batch(30, 2))
+        _, vectors = make_batch(0, 10)
+
+        hits = index.search(vectors[:1], 30, no_params, window=(datetime(2024, 4, 1), datetime(2024, 5, 1)))
+
+        assert sorted(chunk_id for _, chunk_id in hits) == list(range(10, 20))
+
+    def test_cold_shard_mapped_then_reloaded_for_writes(self, tmp_path):
+        """测试冷分片以内存映射只读加载，写入前重新读入内存"""
+        new_index(tmp_path).checkpoint()
+        reopened = ShardedIndex(str(tmp_path), DIMENSION, hot_shards=1)
+        reopened.open()
+
+        assert reopened.index_for("2024-03").ntotal == 10
+        assert reopened.get_stats()["mapped_shards"] == 1
+
+        reopened.remove("2024-03", np.asarray([0, 1], dtype=np.int64))
+        reopened.add("2024-03", *make_batch(40, 1))
+
+        assert reopened.get_stats()["mapped_shards"] == 0
+        assert reopened.index_for("2024-03").ntotal == 9
+
+    def test_reopen_and_evict(self, tmp_path):
+        """测试重新打开后分片数据仍在，且超出上限的冷分片被卸载"""
+        index = new_index(tmp_path)
+        index.remove("2024-04", np.asarray([10], dtype=np.int64))
+        index.close()
+
+        reopened = ShardedIndex(str(tmp_path), DIMENSION, hot_shards=1, max_loaded_shards=2)
+        reopened.open()
+        sizes = {key: reopened.index_for(key).ntotal for key in reopened.keys()}
+
+        assert sizes == {"2024-05": 10, "2024-04": 9, "2024-03": 10}
+        assert reopened.get_stats()["loaded_shards"] == 2
+
+    def test_publication_served_read_only(self, tmp_path):
+        """测试只读索引加载已发布的基线，并在新发布后原子切换"""
+        writer = new_index(tmp_path)
+        writer.publish()
+        reader = ShardedIndex(str(tmp_path), DIMENSION, read_only=True)
+        reader.open()
+        _, vectors = make_batch(40, 1)
+
+        assert reader.get_stats()["published_generation"] == 1
+        assert reader.get_stats()["mapped_shards"] == 3
+        assert reader.search(vectors, 1, no_params)[0][1] != 40
+        with pytest.raises(ReadOnlyIndexError):
+            reader.add("2024-05", *make_batch(40, 1))
+
+        writer.add("2024-05", *make_batch(40, 1))
+        assert not reader.refresh()
+        writer.publish()
+
+        assert reader.refresh()
+        assert reader.search(vectors, 1, no_params)[0][1] == 40
+
+    def test_hnsw_deletes_tombstoned_until_checkpoint(self, tmp_path):
+        """测试HNSW分片删除时仅标记、检索时跳过，检查点时才重建图"""
+        index = new_index(tmp_path)
+        index.replace("2024-05", build_trained_index("hnsw", *reversed(make_batch(20, 10))))
+        graph = index.index_for("2024-05")
+        _, vectors = make_batch(20, 10)
+
+        index.remove("2024-05", np.asarray([20, 21], dtype=np.int64))
+
+        assert index.index_for("2024-05") is graph
+        assert index.get_stats()["per_shard"][0]["tombstones"] == 2
+        assert index.ntotal == 28
+        hits = index.search(vectors[:2], 10, no_params, window=(datetime(2024, 5, 1), None))
+        assert {chunk_id for _, chunk_id in hits} == set(range(22, 30))
+
+        index.add("2024-05", make_batch(20, 1)[0], vectors[:1])
+        assert index.search(vectors[:1], 1, no_params)[0][1] == 20
+
+        index.checkpoint()
+        assert index.index_for("2024-05") is not graph
+        assert index.index_for("2024-05").ntotal == 9
+        assert index.get_stats()["per_shard"][0]["tombstones"] == 0
+
+    def test_hnsw_deletes_replayed_with_one_rebuild(self, tmp_path):
+        """测试重放日志中的多条HNSW删除记录只重建一次图"""
+        index = new_index(tmp_path)
+        index.replace("2024-05", build_trained_index("hnsw", *reversed(make_batch(20, 10))))
+        for chunk_id in (20, 21, 22):
+            index.remove("2024-05", np.asarray([chunk_id], dtype=np.int64))
+        index.close()
+
+        reopened = ShardedIndex(str(tmp_path), DIMENSION)
+        with patch("services.knowledge_base.segment_store.compact", wraps=index_factory.compact) as compact:
+            reopened.open()
+
+        assert compact.call_count == 1
+        assert reopened.index_for("2024-05").ntotal == 7
@@ -0,0 +1,150 @@
+"""
+sqlite_docstore.py 单元测试
+"""
+import os
+import sys
+from langchain_core.documents import Document
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from services.knowledge_base.sqlite_docstore import SQLiteDocstore
+
+
+def make_chunk(document_id, chunk_no):
+    return Document(page_content=f"文档{document_id}第{chunk_no}段", metadata={"document_id": document_id, "chunk": chunk_no})
+
+
+def fill(docstore):
+    """写入两篇文档的分块"""
+    refs = [(1, 0), (1, 1), (2, 0)]
+    docstore.add_chunks(
+        [document_id * 100 + chunk_no for document_id, chunk_no in refs],
+        [f"doc-{document_id}-chunk-{chunk_no}" for document_id, chunk_no in refs],
+        [make_chunk(document_id, chunk_no) for document_id, chunk_no in refs]
+    )
+
+
+class TestSQLiteDocstore:
+    """测试SQLite文档存储"""
+
+    def test_get_chunks_and_search(self, tmp_path):
+        """测试按分块ID批量读取与按docstore ID查找"""
+        docstore = SQLiteDocstore(str(tmp_path / "docstore.db"))
+        fill(docstore)
+
+        found = docstore.get_chunks([101, 200, 999])
+
+        assert sorted(found) == [101, 200]
+        assert found[101].page_content == "文档1第1段"
+        assert found[200].metadata == {"document_id": 2, "chunk": 0}
+        assert docstore.search("doc-1-chunk-0").page_content == "文档1第0段"
+        assert docstore.search("missing") == "ID missing not found."
+
+    def test_chunks_by_document_and_delete(self, tmp_path):
+        """测试按文档ID查找分块并删除"""
+        docstore = SQLiteDocstore(str(tmp_path / "docstore.db"))
+        fill(docstore)
+
+        chunk_ids = docstore.chunk_ids_for_documents([1])
+        docstore.delete_chunks(chunk_ids)
+
+        assert sorted(chunk_ids) == [100, 101]
+        assert docstore.all_chunk_ids() == [200]
+        assert dict(docstore.id_map()) == {200: "doc-2-chunk-0"}
+
+    def test_reopen_and_iterate(self, tmp_path):
+        """测试重新打开后数据仍在，且可分批遍历全部分块"""
+        path = str(tmp_path / "docstore.db")
+        docstore = SQLiteDocstore(path)
+        fill(docstore)
+        docstore.close()
+
+        reopened = SQLiteDocstore(path)
+
+        assert len(reopened) == 3
+        assert [chunk_id for chunk_id, _ in reopened.iter_chunks(batch_size=2)] == [100, 101, 200]
+
+    def test_vectors_round_trip(self, tmp_path):
+        """测试全精度向量随分块保存，缺失时可补写"""
+        import numpy as np
+
+        docstore = SQLiteDocstore(str(tmp_path / "docstore.db"))
+        docstore.add_chunks([1], ["doc-0-chunk-1"], [make_chunk(0, 1)], np.asarray([[0.5, -0.25]], dtype=np.float32))
+        docstore.add_chunks([2], ["doc-0-chunk-2"], [make_chunk(0, 2)])
+        docstore.set_missing_vectors([1, 2], np.asarray([[9.0, 9.0], [1.0, 2.0]], dtype=np.float32))
+
+        vectors = docstore.get_vectors([1, 2, 3])
+
+        assert sorted(vectors) == [1, 2]
+        assert vectors[1].tolist() == [0.5, -0.25]
+        assert vectors[2].tolist() == [1.0, 2.0]
+
+    def test_filter_columns_added_to_old_database(self, tmp_path):
+        """测试旧版文档库打开时补齐过滤列并回填"""
+        import json
+        import sqlite3
+        from services.knowledge_base.search_filter import SearchFilter
+
+        path = str(tmp_path / "docstore.db")
+        connection = sqlite3.connect(path)
+        connection.execute(
+            "CREATE TABLE chunks (chunk_id INTEGER PRIMARY KEY, docstore_id TEXT NOT NULL UNIQUE, "
+            "document_id INTEGER, content TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        connection.execute(
+            "INSERT INTO chunks VALUES (100, 'doc-1-chunk-0', 1, '内容', ?)",
+            (json.dumps({"document_id": 1, "source_id": 5, "tags": "财经", "pub_date": "2024-05-01T00:00:00"}),)
+        )
+        connection.commit()
+        connection.close()
+
+        docstore = SQLiteDocstore(path)
+
+        assert docstore.select_chunk_ids(SearchFilter(source_ids=[5], tags=["财经"])).tolist() == [100]
+
+    def test_lexical_search_ranks_and_follows_deletes(self, tmp_path):
+        """测试全文索引按BM25排序、支持过滤，且随分块更新与删除同步"""
+        from services.knowledge_base.search_filter import SearchFilter
+
+        docstore = SQLiteDocstore(str(tmp_path / "docstore.db"))
+        texts = {100: "华为发布新款手机，华为股价上涨", 200: "华为与车企合作", 300: "央行宣布降息"}
+        docstore.add_chunks(
+            list(texts),
+            [f"doc-{chunk_id // 100}-chunk-0" for chunk_id in texts],
+            [Document(page_content=text, metadata={"document_id": chunk_id // 100, "chunk": 0, "source_id": chunk_id // 100})
+             for chunk_id, text in texts.items()]
+        )
+
+        hits = docstore.lexical_search("华为", k=5)
+
+        assert [chunk_id for chunk_id, _ in hits] == [100, 200]
+        assert hits[0][1] > hits[1][1] > 0
+        assert [chunk_id for chunk_id, _ in docstore.lexical_search("华为", k=5, search_filter=SearchFilter(source_ids=[2]))] == [200]
+        assert docstore.lexical_search("足球", k=5) == []
+
+        docstore.add_chunks([200], ["doc-2-chunk-0"], [Document(page_content="车企降价", metadata={"document_id": 2, "chunk": 0})])
+        docstore.delete_chunks([100])
+        docstore.delete(["doc-3-chunk-0"])
+
+        assert docstore.lexical_search("华为", k=5) == []
+        assert docstore.lexical_search("降息", k=5) == []
+        assert [chunk_id for chunk_id, _ in docstore.lexical_search("降价", k=5)] == [200]
+
+    def test_lexical_index_built_for_old_database(self, tmp_path):
+        """测试没有全文索引的旧文档库打开时建立索引并回填标题与内容"""
+        import sqlite3
+
+        path = str(tmp_path / "docstore.db")
+        docstore = SQLiteDocstore(path)
+        docstore.add_chunks([100], ["doc-1-chunk-0"], [Document(page_content="内容", metadata={"document_id": 1, "title": "特斯拉财报"})])
+        docstore.close()
+        connection = sqlite3.connect(path)
+        connection.execute("DROP TABLE chunks_fts")
+        connection.commit()
+        connection.close()
+
+        reopened = SQLiteDocstore(path)
+
+        assert reopened.has_lexical_index()
+        assert [chunk_id for chunk_id, _ in reopened.lexical_search("特斯拉", k=3)] == [100]
@@ -0,0 +1,38 @@
+"""
+time_window.py 单元测试
+"""
+import os
+import sys
+from datetime import datetime
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from services.assistant.time_window import parse_time_window
+
+# 2024-05-15 是星期三
+NOW = datetime(2024, 5, 15, 14, 30)
+
+
+class TestTimeWindow:
+    """测试从查询中解析发布时间窗口"""
+
+    @pytest.mark.parametrize("query,start,end", [
+        ("今天有什么新闻", datetime(2024, 5, 15), datetime(2024, 5, 16)),
+        ("昨天的股市", datetime(2024, 5, 14), datetime(2024, 5, 15)),
+        ("本周关于AI的新闻", datetime(2024, 5, 13), datetime(2024, 5, 16)),
+        ("上周的体育新闻", datetime(2024, 5, 6), datetime(2024, 5, 13)),
+        ("最近三天的科技动态", datetime(2024, 5, 13), datetime(2024, 5, 16)),
+        ("近2周", datetime(2024, 5, 2), datetime(2024, 5, 16)),
+        ("上个月的新闻", datetime(2024, 4, 1), datetime(2024, 5, 1)),
+        ("news from the past 7 days", datetime(2024, 5, 9), datetime(2024, 5, 16)),
+        ("What happened this week?", datetime(2024, 5, 13), datetime(2024, 5, 16)),
+    ])
+    def test_relative_windows(self, query, start, end):
+        """测试常见的相对时间表达"""
+        assert parse_time_window(query, now=NOW) == (start, end)
+
+    def test_no_window(self):
+        """测试未提及时间的查询不加过滤"""
+        assert parse_time_window("人工智能的发展趋势", now=NOW) is None
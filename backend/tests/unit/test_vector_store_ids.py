@@ -0,0 +1,496 @@
+"""
+vector_store_service.py 文档ID映射单元测试
+"""
+import os
+import sys
+import hashlib
+import time
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+import numpy as np
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from services.knowledge_base.model_metadata import ModelMetadata
+from services.knowledge_base.search_filter import SearchFilter
+from services.knowledge_base import vector_store_service as vector_store_module
+from services.knowledge_base.vector_store_service import (
+    VectorStoreService, chunk_id_for, document_id_of, CHUNK_ID_STRIDE
+)
+
+DIMENSION = 16
+
+
+class FakeEmbeddingService:
+    """按文本哈希生成确定性向量的嵌入服务"""
+
+    model_name = "fake-model"
+    backend = "torch"
+
+    def __init__(self):
+        self.metadata = ModelMetadata(self.model_name, DIMENSION, normalize=True)
+        self.langchain_embeddings = MagicMock()
+
+    def get_embedding_dimension(self):
+        return DIMENSION
+
+    def embed_texts(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_queries(self, queries):
+        return [self.embed_query(query) for query in queries]
+
+    def embed_query(self, text):
+        seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+        vector = np.random.default_rng(seed).normal(size=DIMENSION)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+class UnnormalizedEmbeddingService(FakeEmbeddingService):
+    """模拟不含Normalize层的模型：向量长度不为1"""
+
+    def __init__(self):
+        super().__init__()
+        self.metadata = ModelMetadata(self.model_name, DIMENSION, normalize=False)
+
+    def embed_query(self, text):
+        return (np.asarray(super().embed_query(text)) * (2.0 + len(text))).tolist()
+
+
+def cosine(a, b):
+    a, b = np.asarray(a), np.asarray(b)
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+@pytest.fixture
+def store(tmp_path):
+    """使用临时目录和假嵌入服务的向量库"""
+    rerank = MagicMock()
+    rerank.is_available.return_value = False
+    with patch.object(vector_store_module, "embedding_service", FakeEmbeddingService()), \
+            patch.object(vector_store_module, "rerank_service", rerank), \
+            patch.object(vector_store_module.settings, "FAISS_INDEX_PATH", str(tmp_path / "index.faiss")):
+        yield VectorStoreService()
+
+
+def make_document(doc_id, text, source_id=None, pub_date="", tags=""):
+    return {"id": doc_id, "title": f"新闻{doc_id}", "description": text, "tags": tags,
+            "pub_date": pub_date, "author": "", "source_id": source_id}
+
+
+class TestVectorStoreIds:
+    """测试向量与文档ID的稳定映射"""
+
+    def test_chunk_id_round_trip(self):
+        """测试分块ID可还原文档ID"""
+        assert document_id_of(chunk_id_for(42, 3)) == 42
+        with pytest.raises(ValueError):
+            chunk_id_for(1, CHUNK_ID_STRIDE)
+
+    def test_new_store_is_empty(self, store):
+        """测试新建的向量库不含占位文本"""
+        assert store.index.ntotal == 0
+        assert store.search("任何问题", k=3, rerank=False) == []
+
+    def test_search_returns_document_ids(self, store):
+        """测试检索结果携带数据库文档ID"""
+        store.add_documents([make_document(7, "央行宣布降息"), make_document(9, "球队签下新前锋")])
+
+        results = store.search("央行宣布降息", k=1, rerank=False)
+        assert results[0]["metadata"]["document_id"] == 7
+        assert results[0]["metadata"]["source"] == "document_7"
+
+    def test_delete_documents_removes_all_chunks(self, store):
+        """测试删除文档会移除其全部分块"""
+        long_text = "。".join(f"第{i}段新闻内容" * 20 for i in range(10))
+        store.add_documents([make_document(1, long_text), make_document(2, "另一篇新闻")])
+        chunks_of_first = len(store._chunk_ids_for_documents([1]))
+        assert chunks_of_first > 1
+
+        removed = store.delete_documents([1])
+
+        assert removed == chunks_of_first
+        assert store.index.ntotal == 1
+        assert all(r["metadata"]["document_id"] == 2 for r in store.search(long_text, k=5, rerank=False))
+
+    def test_re_adding_replaces_chunks(self, store):
+        """测试重复入库同一文档不会产生重复向量"""
+        store.add_documents([make_document(5, "原始内容")])
+        store.add_documents([make_document(5, "更新后的内容")])
+
+        assert store.index.ntotal == 1
+        assert store.search("更新后的内容", k=1, rerank=False)[0]["content"] == "更新后的内容"
+
+    def test_re_adding_without_content_removes_chunks(self, store):
+        """测试重新入库的文档内容为空时移除其原有分块"""
+        store.add_documents([make_document(5, "原始内容"), make_document(6, "另一篇新闻")])
+
+        assert store.add_documents([make_document(5, "")]) == "No document content to store"
+        assert store._chunk_ids_for_documents([5]) == []
+        assert store.index.ntotal == 1
+
+        store.add_documents([make_document(6, ""), make_document(7, "第三篇新闻")])
+        assert store._chunk_ids_for_documents([6]) == []
+        assert store.index.ntotal == 1
+
+    def test_persisted_ids_survive_reload(self, store, tmp_path):
+        """测试保存后重新加载仍可按文档删除"""
+        store.add_documents([make_document(3, "持久化测试")])
+        with patch.object(vector_store_module, "embedding_service", FakeEmbeddingService()), \
+                patch.object(vector_store_module.settings, "FAISS_INDEX_PATH", str(tmp_path / "index.faiss")):
+            reloaded = VectorStoreService()
+
+        assert reloaded.delete_documents([3]) == 1
+
+    def test_legacy_index_migrated(self, tmp_path):
+        """测试旧版按位置编号的索引迁移为分块ID并移除占位文本"""
+        from langchain_community.vectorstores import FAISS
+        from langchain_core.embeddings import Embeddings
+
+        fake = FakeEmbeddingService()
+
+        class LegacyEmbeddings(Embeddings):
+            def embed_documents(self, texts):
+                return fake.embed_texts(texts)
+
+            def embed_query(self, text):
+                return fake.embed_query(text)
+
+        FAISS.from_texts(["Placeholder text", "旧新闻"], LegacyEmbeddings()).save_local(str(tmp_path))
+        with patch.object(vector_store_module, "embedding_service", fake), \
+                patch.object(vector_store_module.settings, "FAISS_INDEX_PATH", str(tmp_path / "index.faiss")):
+            migrated = VectorStoreService()
+            results = migrated.search("旧新闻", k=1, rerank=False)
+
+        assert migrated.index.ntotal == 1
+        assert [document_id_of(chunk_id) for chunk_id in migrated.docstore.all_chunk_ids()] == [None]
+        assert results[0]["content"] == "旧新闻"
+
+    def test_filtered_search(self, store):
+        """测试按来源、发布时间和标签过滤的检索只返回匹配的文档"""
+        store.add_documents([
+            make_document(1, "央行宣布降息", source_id=1, pub_date="2024-05-14T08:00:00", tags="财经,央行"),
+            make_document(2, "央行宣布降息后股市上涨", source_id=2, pub_date="2024-05-01T08:00:00", tags="财经"),
+            make_document(3, "央行宣布降息的影响", source_id=1, pub_date="2024-04-01T08:00:00", tags="评论"),
+        ])
+
+        def found(filters):
+            return sorted(r["metadata"]["document_id"] for r in store.search("央行宣布降息", k=3, rerank=False, filters=filters))
+
+        assert found(SearchFilter(source_ids=[1])) == [1, 3]
+        assert found(SearchFilter(start=datetime(2024, 5, 1), end=datetime(2024, 5, 15))) == [1, 2]
+        assert found(SearchFilter(tags=["央行", "评论"])) == [1, 3]
+        assert found(SearchFilter(source_ids=[2], tags=["评论"])) == []
+        # 删除后过滤结果随之更新
+        store.delete_documents([1])
+        assert found(SearchFilter(source_ids=[1])) == [3]
+
+    def test_quantised_storage_rescored(self, tmp_path):
+        """测试8位量化存储下检索经全精度重打分，统计中给出内存与召回率"""
+        fake = FakeEmbeddingService()
+        with patch.object(vector_store_module, "embedding_service", fake), \
+                patch.object(vector_store_module.settings, "FAISS_INDEX_PATH", str(tmp_path / "index.faiss")), \
+                patch.object(vector_store_module.settings, "FAISS_VECTOR_STORAGE", "sq8"):
+            store = VectorStoreService()
+            store.add_documents([make_document(i, f"第{i}条新闻") for i in range(1, 41)])
+            results = store.search("第7条新闻", k=3, rerank=False)
+            report = store._storage_report(store.index.get_stats())
+
+        assert results[0]["metadata"]["document_id"] == 7
+        assert results[0]["distance"] == pytest.approx(0.0, abs=1e-5)
+        assert report["memory_ratio"] < 0.5
+        assert report["recall"]["storage"] == "sq8"
+        assert report["recall"]["rescored_recall"] == 1.0
+
+    def test_reader_serves_published_generations(self, tmp_path):
+        """测试只读进程加载写入进程发布的索引，写入请求转交写入进程"""
+        fake = FakeEmbeddingService()
+        settings = vector_store_module.settings
+        with patch.object(vector_store_module, "embedding_service", fake), \
+                patch.object(settings, "FAISS_INDEX_PATH", str(tmp_path / "index.faiss")), \
+                patch.object(settings, "VECTOR_STORE_PUBLISH_INTERVAL", 3600.0), \
+                patch.object(settings, "VECTOR_STORE_REFRESH_INTERVAL", 0.0):
+            with patch.object(settings, "VECTOR_STORE_MODE", "writer"):
+                writer = VectorStoreService()
+            writer.add_documents([make_document(1, "央行宣布降息", pub_date="2024-05-14T08:00:00")])
+            writer.publish()
+            with patch.object(settings, "VECTOR_STORE_MODE", "reader"):
+                reader = VectorStoreService()
+
+            first = reader.search("央行宣布降息", k=3, rerank=False)
+            writer.add_documents([make_document(2, "球队签下新前锋", pub_date="2024-05-15T08:00:00")])
+            before_publish = reader.search("球队签下新前锋", k=3, rerank=False)
+            writer.publish()
+            after_publish = reader.search("球队签下新前锋", k=3, rerank=False)
+
+            assert reader.delete_documents([1]) == 0
+            assert reader.spool.pending() == 1
+
+        assert [r["metadata"]["document_id"] for r in first] == [1]
+        assert [r["metadata"]["document_id"] for r in before_publish] == [1]
+        assert after_publish[0]["metadata"]["document_id"] == 2
+        assert reader.index.get_stats()["mapped_shards"] == 1
+
+    def test_failing_spooled_write_set_aside(self, tmp_path):
+        """测试反复失败的转交写入请求在达到重试上限后被移出队列，不阻塞后续请求"""
+        settings = vector_store_module.settings
+        applied = []
+
+        def apply(operation, payload):
+            if payload == [1]:
+                raise RuntimeError("磁盘已满")
+            applied.append((operation, payload))
+
+        with patch.object(vector_store_module, "embedding_service", FakeEmbeddingService()), \
+                patch.object(settings, "FAISS_INDEX_PATH", str(tmp_path / "index.faiss")), \
+                patch.object(settings, "VECTOR_STORE_PUBLISH_INTERVAL", 3600.0), \
+                patch.object(settings, "VECTOR_STORE_SPOOL_POLL_INTERVAL", 0.01), \
+                patch.object(settings, "VECTOR_STORE_SPOOL_MAX_ATTEMPTS", 3), \
+                patch.object(settings, "VECTOR_STORE_MODE", "writer"):
+            writer = VectorStoreService()
+            writer._apply_spooled = apply
+            writer.spool.put("delete", [1])
+            writer.spool.put("delete", [2])
+            deadline = time.monotonic() + 5
+            while writer.spool.pending() and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        assert writer.spool.pending() == 0
+        assert writer.spool.failed() == 1
+        assert applied == [("delete", [2])]
+
+    def test_search_modes(self, store):
+        """测试关键词与混合检索命中向量检索漏掉的实体名，且检索模式可按请求选择"""
+        texts = ["央行宣布降息", "球队签下新前锋", "新款手机发布", "暴雨导致航班延误", "宁德时代发布财报"]
+        store.add_documents([make_document(i + 1, text) for i, text in enumerate(texts)])
+
+        def found(mode):
+            return [r["metadata"]["document_id"] for r in store.search("宁德时代的最新消息", k=1, rerank=False, mode=mode)]
+
+        dense = found("dense")
+        hybrid = store.search("宁德时代的最新消息", k=5, rerank=False, mode="hybrid")
+
+        # 假嵌入按文本哈希生成向量，与实体名无关
+        assert dense != [5]
+        assert found("lexical") == [5]
+        assert 5 in [r["metadata"]["document_id"] for r in hybrid]
+        assert all(0.0 <= r["relevance"] <= 1.0 and r["distance"] is not None for r in hybrid)
+        with pytest.raises(ValueError):
+            store.search("宁德时代", mode="fuzzy")
+
+    def test_document_without_id_rejected(self, store):
+        """测试缺少ID的文档被拒绝"""
+        with pytest.raises(ValueError):
+            store.add_documents([{"title": "无ID", "description": "内容"}])
+
+
+class TestUnnormalizedModel:
+    """测试不含Normalize层的模型：距离仍换算为余弦相似度"""
+
+    @pytest.fixture
+    def settings(self, tmp_path):
+        rerank = MagicMock()
+        rerank.is_available.return_value = False
+        with patch.object(vector_store_module, "embedding_service", UnnormalizedEmbeddingService()), \
+                patch.object(vector_store_module, "rerank_service", rerank), \
+                patch.object(vector_store_module.settings, "FAISS_INDEX_PATH", str(tmp_path / "index.faiss")):
+            yield vector_store_module.settings
+
+    def check_relevance(self, store, query):
+        results = store.search(query, k=3, rerank=False)
+        embedding = store.embedding
+        for result in results:
+            expected = cosine(embedding.embed_query(query), embedding.embed_query(result["content"]))
+            assert result["relevance"] == pytest.approx(max(0.0, expected), abs=1e-4)
+        return results
+
+    def test_vectors_normalised_on_add_and_query(self, settings):
+        """测试写入与查询向量被归一化，相似度阈值与分片提前停止照常生效"""
+        store = VectorStoreService()
+        store.add_documents([make_document(i, text) for i, text in enumerate(["央行宣布降息", "球队签下新前锋", "新款手机发布"], 1)])
+
+        stored = store.docstore.sample_vectors(10)
+        assert store.unit_vectors
+        assert np.allclose(np.linalg.norm(np.stack(stored), axis=1), 1.0, atol=1e-5)
+        results = self.check_relevance(store, "央行宣布降息")
+        assert results[0]["metadata"]["document_id"] == 1
+
+    def test_store_with_unnormalised_vectors(self, settings):
+        """测试修复前写入的未归一化向量：检测后按存储的向量计算余弦相似度，并关闭分片提前停止"""
+        store = VectorStoreService()
+        # 模拟修复前的写入：向量按模型原样存储
+        store.unit_vectors = False
+        store.add_documents([make_document(i, text) for i, text in enumerate(["央行宣布降息", "球队签下新前锋", "新款手机发布"], 1)])
+
+        reopened = VectorStoreService()
+        assert not reopened.unit_vectors
+        with patch.object(reopened.index, "search_batch", wraps=reopened.index.search_batch) as search_batch:
+            results = self.check_relevance(reopened, "央行宣布降息")
+        assert search_batch.call_args.kwargs["stop_distance"] is None
+        assert results[0]["metadata"]["document_id"] == 1
+        assert results[0]["relevance"] == pytest.approx(1.0, abs=1e-4)
+
+
+class FakeRerankService:
+    """按内容查表打分的重排序服务，记录打分的句对数"""
+
+    def __init__(self, scores):
+        self.scores = scores
+        self.pairs = 0
+        self.calls = 0
+
+    def is_available(self):
+        return True
+
+    def score_results(self, query, results):
+        self.pairs += len(results)
+        return [{**result, "rerank_score": self.scores[result["content"]], "relevance": 0.5} for result in results]
+
+    def score_results_many(self, queries, results):
+        self.calls += 1
+        return [self.score_results(query, query_results) for query, query_results in zip(queries, results)]
+
+
+class TestAdaptiveRerank:
+    """测试按需加深的级联重排序"""
+
+    TEXTS = [f"第{i}条新闻内容" for i in range(8)]
+
+    def rerank_search(self, store, scores, k=2, gap=0.0):
+        """以给定分数表重排序检索，返回结果内容与打分句对数"""
+        fake = FakeRerankService(scores)
+        with patch.object(vector_store_module, "rerank_service", fake), \
+                patch.multiple(vector_store_module.settings, RERANK_CANDIDATE_FACTOR=4, RERANK_CASCADE_BATCH_SIZE=2,
+                               RERANK_STABLE_MARGIN=3.0, RERANK_SKIP_SIMILARITY_GAP=gap):
+            results = store.search(self.TEXTS[0], k=k)
+        return [result["content"] for result in results], fake.pairs
+
+    def ann_order(self, store):
+        store.add_documents([make_document(i + 1, text) for i, text in enumerate(self.TEXTS)])
+        return [result["content"] for result in store.search(self.TEXTS[0], k=8, rerank=False)]
+
+    def test_stops_once_top_k_stable(self, store):
+        """测试后续批次分数远低于当前第k名时提前停止"""
+        order = self.ann_order(store)
+        scores = {content: 0.0 for content in order}
+        scores[order[0]], scores[order[1]] = 9.0, 10.0
+
+        contents, pairs = self.rerank_search(store, scores)
+
+        assert contents == [order[1], order[0]]
+        assert pairs == 4
+        depth = store.get_rerank_depth_stats()
+        assert depth["early_exit"] == 1
+        assert depth["pairs_histogram"] == {"4": 1}
+
+    def test_hard_query_scored_to_full_depth(self, store):
+        """测试靠后的候选持续得高分时对全部候选打分"""
+        order = self.ann_order(store)
+
+        contents, pairs = self.rerank_search(store, {content: float(i) for i, content in enumerate(order)})
+
+        assert contents == [order[7], order[6]]
+        assert pairs == 8
+        assert store.get_rerank_depth_stats()["full"] == 1
+
+    def test_skipped_when_ann_gap_large(self, store):
+        """测试第k名与下一候选的相似度差距足够大时不重排序"""
+        order = self.ann_order(store)
+
+        contents, pairs = self.rerank_search(store, {content: 0.0 for content in order}, k=1, gap=0.2)
+
+        assert contents == [self.TEXTS[0]]
+        assert pairs == 0
+        assert store.get_rerank_depth_stats()["skipped"] == 1
+
+
+class TestSearchMany:
+    """测试多个查询的批量检索"""
+
+    TEXTS = ["央行宣布降息", "球队签下新前锋", "新款手机发布", "暴雨导致航班延误", "股市全线上涨"]
+
+    def test_matches_single_searches_in_one_pass(self, store):
+        """测试批量检索结果与逐个检索一致，且查询只嵌入一次、索引只检索一次"""
+        store.add_documents([make_document(i + 1, text) for i, text in enumerate(self.TEXTS)])
+        queries = ["股市全线上涨", "球队签下新前锋", "股市全线上涨"]
+
+        with patch.object(store.embedding, "embed_queries", wraps=store.embedding.embed_queries) as embedded, \
+                patch.object(store.index, "search_batch", wraps=store.index.search_batch) as searched:
+            batch = store.search_many(queries, k=2, rerank=False, mode="dense")
+
+        assert embedded.call_count == 1
+        assert embedded.call_args[0][0] == ["股市全线上涨", "球队签下新前锋"]
+        assert searched.call_count == 1
+        assert [results[0]["metadata"]["document_id"] for results in batch] == [5, 2, 5]
+        store._result_cache.clear()
+        assert batch == [store.search(query, k=2, rerank=False, mode="dense") for query in queries]
+
+    def test_rerank_rounds_shared_across_queries(self, store):
+        """测试各查询的重排序批次合并为同一次打分调用"""
+        store.add_documents([make_document(i + 1, text) for i, text in enumerate(self.TEXTS)])
+        fake = FakeRerankService({text: float(i) for i, text in enumerate(self.TEXTS)})
+
+        with patch.object(vector_store_module, "rerank_service", fake), \
+                patch.multiple(vector_store_module.settings, RERANK_CANDIDATE_FACTOR=5, RERANK_CASCADE_BATCH_SIZE=5,
+                               RERANK_SKIP_SIMILARITY_GAP=0.0):
+            batch = store.search_many(["央行宣布降息", "暴雨导致航班延误"], k=1)
+
+        assert [results[0]["content"] for results in batch] == ["股市全线上涨", "股市全线上涨"]
+        assert fake.calls == 1
+        assert store.get_rerank_depth_stats()["queries"] == 2
+
+    def test_empty_and_invalid(self, store):
+        """测试空查询列表与无效检索模式"""
+        assert store.search_many([]) == []
+        with pytest.raises(ValueError):
+            store.search_many(["降息"], mode="fuzzy")
+
+
+class TestSearchCache:
+    """测试查询向量与检索结果缓存"""
+
+    def test_repeated_query_served_from_cache(self, store):
+        """测试重复查询不再嵌入和检索，返回的结果为副本"""
+        store.add_documents([make_document(1, "央行宣布降息"), make_document(2, "球队签下新前锋")])
+
+        with patch.object(store, "_similarity_search_many", wraps=store._similarity_search_many) as searched, \
+                patch.object(store.embedding, "embed_queries", wraps=store.embedding.embed_queries) as embedded:
+            first = store.search("央行宣布降息", k=1, rerank=False)
+            first[0]["metadata"]["document_id"] = 99
+            second = store.search("央行宣布降息", k=1, rerank=False)
+            store.search("央行宣布降息", k=2, rerank=False)
+
+        assert second[0]["metadata"]["document_id"] == 1
+        # k不同时重新检索，但复用查询向量
+        assert searched.call_count == 2
+        assert embedded.call_count == 1
+        assert store._result_cache.get_stats()["hits"] == 1
+
+    def test_write_invalidates_results(self, store):
+        """测试写入使索引代数变化后不再返回旧结果"""
+        store.add_documents([make_document(1, "央行宣布降息")])
+        before = store.search("球队签下新前锋", k=1, rerank=False)
+
+        store.add_documents([make_document(2, "球队签下新前锋")])
+        after = store.search("球队签下新前锋", k=1, rerank=False)
+
+        assert [r["metadata"]["document_id"] for r in before] == [1]
+        assert [r["metadata"]["document_id"] for r in after] == [2]
+
+    def test_caches_disabled(self, tmp_path):
+        """测试缓存大小为0时每次查询都重新嵌入"""
+        fake = FakeEmbeddingService()
+        settings = vector_store_module.settings
+        with patch.object(vector_store_module, "embedding_service", fake), \
+                patch.multiple(settings, FAISS_INDEX_PATH=str(tmp_path / "index.faiss"),
+                               SEARCH_EMBEDDING_CACHE_SIZE=0, SEARCH_RESULT_CACHE_SIZE=0):
+            store = VectorStoreService()
+            store.add_documents([make_document(1, "央行宣布降息")])
+            with patch.object(fake, "embed_queries", wraps=fake.embed_queries) as embedded:
+                store.search("央行宣布降息", k=1, rerank=False, mode="dense")
+                store.search("央行宣布降息", k=1, rerank=False, mode="dense")
+
+        assert embedded.call_count == 2
+        assert store._embedding_cache is None and store._result_cache is None
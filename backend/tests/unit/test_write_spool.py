@@ -0,0 +1,49 @@
+"""
+write_spool.py 单元测试
+"""
+import os
+import sys
+from datetime import datetime
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from services.knowledge_base.write_spool import WriteSpool
+
+
+class TestWriteSpool:
+    """测试跨进程写入请求队列"""
+
+    def test_requests_taken_in_order_until_acked(self, tmp_path):
+        """测试请求按顺序取出，确认前不会被删除，日期以ISO字符串保存"""
+        spool = WriteSpool(str(tmp_path / "spool.db"))
+        spool.put("add", [{"id": 1, "pub_date": datetime(2024, 5, 1, 8, 0)}])
+        spool.put("delete", [1, 2])
+
+        # 另一个进程打开同一文件也能看到请求
+        other = WriteSpool(str(tmp_path / "spool.db"))
+        requests = other.take()
+
+        assert [operation for _, operation, _ in requests] == ["add", "delete"]
+        assert requests[0][2] == [{"id": 1, "pub_date": "2024-05-01T08:00:00"}]
+        assert spool.pending() == 2
+        other.ack([requests[0][0]])
+        assert [payload for _, _, payload in spool.take()] == [[1, 2]]
+
+    def test_unknown_operation_rejected(self, tmp_path):
+        """测试未知操作类型报错"""
+        with pytest.raises(ValueError):
+            WriteSpool(str(tmp_path / "spool.db")).put("update", [])
+
+    def test_failed_request_moved_out_of_queue(self, tmp_path):
+        """测试无法应用的请求连同错误信息移出队列，后续请求可继续取出"""
+        spool = WriteSpool(str(tmp_path / "spool.db"))
+        first = spool.put("delete", [1])
+        spool.put("delete", [2])
+
+        spool.fail(first, "磁盘已满")
+
+        assert spool.pending() == 1
+        assert spool.failed() == 1
+        assert [payload for _, _, payload in spool.take()] == [[2]]
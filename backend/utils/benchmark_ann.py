@@ -0,0 +1,68 @@
+"""
+Recall@k benchmark of approximate FAISS index types against the flat index.
+
+Runs on the vectors of the stored knowledge base index, without loading any model:
+
+    python -m utils.benchmark_ann --k 10 --queries 200 --types ivf_flat ivf_pq hnsw
+    python -m utils.benchmark_ann --storage sq8 --types flat ivf_flat hnsw
+"""
+import argparse
+import os
+import faiss
+import numpy as np
+from services.knowledge_base.index_factory import INDEX_TYPES, VECTOR_STORAGES, benchmark, export_vectors
+from services.knowledge_base.shard_index import ShardedIndex
+from services.knowledge_base.vector_store_service import current_store_path
+from config.settings import settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark recall@k of ANN index types on the knowledge base vectors")
+    parser.add_argument("--shards-dir",
+                        default=os.path.join(current_store_path(os.path.dirname(settings.FAISS_INDEX_PATH)), "faiss_shards"),
+                        help="Vector store shard directory (vectors of all shards are benchmarked together)")
+    parser.add_argument("--index-path", default=settings.FAISS_INDEX_PATH,
+                        help="FAISS index file, used when the shard directory does not exist")
+    parser.add_argument("--k", type=int, default=10, help="Number of neighbours")
+    parser.add_argument("--queries", type=int, default=200, help="Number of sampled queries")
+    parser.add_argument("--types", nargs="+", default=["ivf_flat", "ivf_pq", "hnsw"], choices=INDEX_TYPES)
+    parser.add_argument("--nprobe", type=int, nargs="+", help="nprobe values to sweep (IVF)")
+    parser.add_argument("--ef-search", type=int, nargs="+", help="efSearch values to sweep (HNSW)")
+    parser.add_argument("--storage", default=settings.FAISS_VECTOR_STORAGE, choices=VECTOR_STORAGES,
+                        help="Vector storage of the benchmarked indexes (flat is then benchmarked too)")
+    args = parser.parse_args()
+
+    shards = ShardedIndex(args.shards_dir, dimension=0, max_loaded_shards=0, mmap_cold=False)
+    if shards.exists():
+        shards.open()
+        vectors = np.vstack([export_vectors(shards.index_for(key))[1] for key in shards.keys()])
+        source = args.shards_dir
+    else:
+        _, vectors = export_vectors(faiss.read_index(args.index_path))
+        source = args.index_path
+    print(f"Loaded {len(vectors)} vectors of dimension {vectors.shape[1]} from {source}")
+
+    reports = benchmark(
+        vectors,
+        args.types,
+        k=args.k,
+        num_queries=args.queries,
+        nprobe_values=args.nprobe,
+        ef_search_values=args.ef_search,
+        nlist=settings.FAISS_IVF_NLIST,
+        pq_m=settings.FAISS_PQ_M,
+        hnsw_m=settings.FAISS_HNSW_M,
+        ef_construction=settings.FAISS_HNSW_EF_CONSTRUCTION,
+        storage=args.storage
+    )
+
+    print(f"{'index':<10} {'storage':>8} {'nprobe':>7} {'efSearch':>9} {'recall@' + str(args.k):>10} {'ms/query':>10}")
+    for report in reports:
+        print(
+            f"{report['index_type']:<10} {report['storage']:>8} {str(report['nprobe'] or '-'):>7} {str(report['ef_search'] or '-'):>9} "
+            f"{report['recall']:>10.4f} {report['latency_ms']:>10.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
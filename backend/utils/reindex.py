@@ -0,0 +1,88 @@
+"""
+Full re-index of the knowledge base from the documents table.
+
+Builds a new store (new chunking settings, optionally another embedding
+model) and swaps it in when complete:
+
+    python -m utils.reindex --server http://localhost:5001      # in the running server, no downtime
+    python -m utils.reindex --model BAAI/bge-small-zh-v1.5      # in this process, with the server stopped
+
+After changing the model, set EMBEDDING_MODEL_NAME to it before the next restart.
+"""
+import argparse
+import json
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, Optional
+
+
+def _print_status(status: Dict[str, Any]):
+    processed = status.get("processed_documents", 0)
+    total = status.get("total_documents")
+    line = f"[{status['state']}] {processed}/{total if total is not None else '?'} documents"
+    if status.get("progress") is not None:
+        line += f" ({status['progress'] * 100:.1f}%)"
+    line += f", {status.get('documents_per_second', 0)} docs/s"
+    if status.get("eta_seconds") is not None:
+        line += f", ETA {status['eta_seconds']}s"
+    if status.get("error"):
+        line += f", error: {status['error']}"
+    print(line, flush=True)
+
+
+def _request(url: str, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return json.loads(response.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        return json.loads(e.read().decode("utf-8"))
+
+
+def run_on_server(server: str, options: Dict[str, Any], interval: float) -> int:
+    """Start the re-index in a running server and follow its progress."""
+    base = f"{server.rstrip('/')}/api/knowledge_base/reindex"
+    started = _request(base, options)
+    if not started.get("success"):
+        print(f"Re-index not started: {started.get('message')}", file=sys.stderr)
+        return 1
+    while True:
+        status = _request(f"{base}/status")["data"]
+        _print_status(status)
+        if status["state"] != "running":
+            return 0 if status["state"] == "completed" else 1
+        time.sleep(interval)
+
+
+def run_in_process(options: Dict[str, Any], interval: float) -> int:
+    """Re-index the store of this process."""
+    from services.knowledge_base.reindex_service import reindex_service
+
+    reindex_service.start(**options)
+    while not reindex_service.wait(interval):
+        _print_status(reindex_service.get_status())
+    status = reindex_service.get_status()
+    _print_status(status)
+    return 0 if status["state"] == "completed" else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the knowledge base index from the documents table")
+    parser.add_argument("--server", help="Base URL of a running server to re-index (default: re-index in this process)")
+    parser.add_argument("--model", help="Embedding model of the new index (default: the current one)")
+    parser.add_argument("--page-size", type=int, help="Documents read per page (default: REINDEX_PAGE_SIZE)")
+    parser.add_argument("--workers", type=int, help="Pages chunked and embedded concurrently (default: REINDEX_WORKERS)")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between progress lines")
+    args = parser.parse_args()
+
+    options = {"model_name": args.model, "page_size": args.page_size, "workers": args.workers}
+    if args.server:
+        sys.exit(run_on_server(args.server, options, args.interval))
+    sys.exit(run_in_process(options, args.interval))
+
+
+if __name__ == "__main__":
+    main()